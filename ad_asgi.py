@@ -0,0 +1,126 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+from flask import jsonify, request, session
+from ldap3.utils.conv import escape_filter_chars
+from werkzeug.exceptions import HTTPException
+from ad_async import AsyncActiveDirectoryManager
+from app import app, start_background_threads
+
+# Threads serving the requests handed on to the Flask (WSGI) app
+AD_ASGI_WSGI_THREADS = int(os.environ.get('AD_ASGI_WSGI_THREADS', 32))
+
+
+class FlaskInstance(WsgiToAsgiInstance):
+    """WsgiToAsgi runs every request on one shared thread; spread them over a bounded pool instead."""
+
+    run_wsgi_app = sync_to_async(vars(WsgiToAsgiInstance)['run_wsgi_app'].func, thread_sensitive=False,
+                                 executor=ThreadPoolExecutor(AD_ASGI_WSGI_THREADS, thread_name_prefix='wsgi'))
+
+
+async def get_ad_user(username):
+    """GET /api/ad/user/<username> as a coroutine"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+
+    app.logger.info("User API call for: %s, method: %s", username, request.method)
+    ad_manager = AsyncActiveDirectoryManager()
+    try:
+        users = await ad_manager.get_users(custom_filter=f"(sAMAccountName={escape_filter_chars(username)})")
+        app.logger.debug("Fetched %s users for %s", len(users), username)
+    except Exception as e:
+        app.logger.error("Error fetching user: %s", e, exc_info=True)
+        return jsonify({'success': False, 'message': f'Error fetching user: {str(e)}'}), 500
+    finally:
+        ad_manager.disconnect()
+
+    if users:
+        return jsonify({'success': True, 'user': users[0]})
+    return jsonify({'success': False, 'message': 'User not found'}), 404
+
+
+async def get_ad_group_members(group_name):
+    """GET /api/ad/group/<group_name>/members as a coroutine"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+
+    app.logger.info("Fetching members for group: %s", group_name)
+    ad_manager = AsyncActiveDirectoryManager()
+    try:
+        # Read only this group, with ranged member retrieval
+        members = await ad_manager.get_group_members(group_name)
+    except Exception as e:
+        app.logger.error("Error fetching group members: %s", e, exc_info=True)
+        return jsonify({'success': False, 'message': f'Error fetching group members: {str(e)}'}), 500
+    finally:
+        ad_manager.disconnect()
+
+    if members is None:
+        app.logger.warning("Group not found: %s", group_name)
+        return jsonify({'success': False, 'message': f'Group {group_name} not found'}), 404
+    app.logger.info("Found %s members for group %s", len(members), group_name)
+    return jsonify({'success': True, 'members': members})
+
+
+# Flask endpoint -> coroutine serving its GET requests on the event loop.
+# These wait on the DC for every request; everything else goes to Flask.
+NATIVE_VIEWS = {
+    'manage_ad_user': get_ad_user,
+    'manage_ad_group_members': get_ad_group_members,
+}
+
+
+async def dispatch(view, environ, view_args):
+    """Run ``view`` like Flask would, with the app's request hooks, and return the response."""
+    environ['ad.coroutine'] = True
+    with app.request_context(environ):
+        try:
+            rv = app.preprocess_request()
+            if rv is None:
+                rv = await view(**view_args)
+            return app.process_response(app.make_response(rv))
+        except Exception as e:
+            return app.make_response(app.handle_exception(e))
+
+
+async def lifespan(receive, send):
+    """Start the background collector with the server, as ``python app.py`` does."""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            start_background_threads()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI entry point: directory lookups as coroutines, the rest of the app on threads.
+
+    Serve with an ASGI server, e.g. ``uvicorn ad_asgi:application``.
+    """
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    instance = FlaskInstance(app)
+    if scope['type'] != 'http' or scope['method'] != 'GET':
+        return await instance(scope, receive, send)
+    instance.scope = scope
+    environ = instance.build_environ(scope, io.BytesIO())
+    try:
+        rule, view_args = app.url_map.bind_to_environ(environ).match(return_rule=True)
+    except HTTPException:
+        rule = None
+    if rule is None or rule.endpoint not in NATIVE_VIEWS:
+        return await instance(scope, receive, send)
+
+    response = await dispatch(NATIVE_VIEWS[rule.endpoint], environ, view_args)
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(name.lower().encode('latin1'), value.encode('latin1'))
+                    for name, value in response.headers.to_wsgi_list()],
+    })
+    await send({'type': 'http.response.body', 'body': response.get_data()})
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, g, has_request_context
+from ad_conn import ActiveDirectoryManager
+from ad_profiling import capture_scope, current_capture
+from ad_tracing import current_span, span_scope
+
+# Threads running blocking ldap3 calls for coroutines. Each holds at most one
+# pooled connection, so the default (the pool size) never waits on the pool.
+AD_ASYNC_WORKERS = int(os.environ.get('AD_ASYNC_WORKERS', os.environ.get('AD_POOL_SIZE', 5)))
+
+# ActiveDirectoryManager methods exposed as coroutines
+ASYNC_METHODS = (
+    'connect', 'count_search', 'get_users', 'get_groups', 'get_computers', 'get_domain_controllers',
+    'get_dashboard_data', 'get_group_members', 'create_user', 'enable_user', 'disable_user',
+    'reset_password', 'add_user_to_group', 'remove_user_from_group', 'run_user_operation',
+    'batch_user_operations', 'refresh_domain_controllers',
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process-wide thread pool shared by all async managers."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=AD_ASYNC_WORKERS, thread_name_prefix='ad-async')
+        return _executor
+
+
+class AsyncActiveDirectoryManager:
+    """asyncio front end for ActiveDirectoryManager.
+
+    ldap3 has no asyncio strategy, so every call runs the blocking code on
+    a shared, bounded thread pool (AD_ASYNC_WORKERS) and is awaited.
+    Coroutines waiting on the directory hold no thread of their own: any
+    number of them can be in flight while at most AD_ASYNC_WORKERS calls
+    hold a pooled connection. Return values and exceptions are those of
+    the synchronous manager.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.sync = ActiveDirectoryManager(*args, **kwargs)
+        self._app = current_app._get_current_object()
+
+    @property
+    def active_dc(self):
+        return self.sync.active_dc
+
+    async def run(self, func, *args, **kwargs):
+        """Run any blocking callable on the AD thread pool inside an app context."""
+        app, capture, parent = self._app, current_capture(), current_span()
+
+        def call():
+            with app.app_context(), capture_scope(capture), span_scope(parent):
+                return func(*args, **kwargs)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(get_executor(), call)
+        finally:
+            # The worker thread has no request context to record the DC in
+            if has_request_context() and self.sync.active_dc:
+                g.ad_server = self.sync.active_dc
+
+    def disconnect(self):
+        self.sync.disconnect()
+
+
+def _delegate(name):
+    async def method(self, *args, **kwargs):
+        return await self.run(getattr(self.sync, name), *args, **kwargs)
+    method.__name__ = name
+    method.__qualname__ = f'AsyncActiveDirectoryManager.{name}'
+    method.__doc__ = f"Coroutine version of ActiveDirectoryManager.{name}()."
+    return method
+
+
+for _name in ASYNC_METHODS:
+    setattr(AsyncActiveDirectoryManager, _name, _delegate(_name))
@@ -0,0 +1,339 @@
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import ldap3
+from flask import Flask
+from ldap3 import MOCK_SYNC, SIMPLE, Connection
+
+from ad_conn import ActiveDirectoryManager, LDAPConnectionPool, dn_cache, register_connection_pool
+from generate_test_data import SyntheticDirectory
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_BASELINE = os.path.join('benchmarks', 'baseline.json')
+BENCH_DOMAIN = 'bench.local'
+BENCH_BASE_DN = 'DC=bench,DC=local'
+BENCH_ADMIN = f'CN=Administrator,CN=Users,{BENCH_BASE_DN}'
+BENCH_PASSWORD = 'Bench-Passw0rd'
+# Fixed, so every run reads the same directory down to the timestamps
+BENCH_REFERENCE_DATE = '2026-01-01'
+# Groups whose members are resolved by the get_group_members benchmark. The
+# mock evaluates every filter term against every entry, so resolving a
+# member costs O(directory size) there; typical small groups keep the 100k
+# run practical.
+MEMBER_LOOKUP_SIZES = range(5, 21)
+# Per-branch timeout of get_dashboard_data; the mock takes minutes for 100k users on one core
+DASHBOARD_TIMEOUT = 900
+
+
+class BenchmarkError(Exception):
+    """Raised when an operation returns something other than what the directory holds.
+
+    ActiveDirectoryManager falls back to canned data when a search fails,
+    which would otherwise be timed as if it were a real result.
+    """
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of ``values`` (0 < q <= 100)."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def synthetic_directory(users, seed=1):
+    """The benchmark domain with ``users`` users, streamed by generate_test_data.SyntheticDirectory.
+
+    Its default proportions apply: one group per 20 users with skewed,
+    partly nested memberships, one computer per three users, two DCs.
+    """
+    return SyntheticDirectory(users, seed, BENCH_DOMAIN, reference=BENCH_REFERENCE_DATE,
+                              admin_password=BENCH_PASSWORD)
+
+
+def mock_manager(entries, host, domain=BENCH_DOMAIN, admin=BENCH_ADMIN, password=BENCH_PASSWORD):
+    """``(manager, pool)``: an ActiveDirectoryManager served by a MOCK_SYNC pool holding ``entries``.
+
+    ``entries`` is any iterable of (dn, attributes) and is consumed as it
+    is loaded, e.g. SyntheticDirectory.entries() or a fixture file's.
+    """
+    pool = LDAPConnectionPool(host, admin, password, size=int(os.environ.get('AD_POOL_SIZE', 5)),
+                              use_ssl=False, authentication=SIMPLE, client_strategy=MOCK_SYNC)
+    # Entries live in the server object, so every pooled connection sees them
+    loader = Connection(pool.server, user=admin, password=password, client_strategy=MOCK_SYNC)
+    for dn, attributes in entries:
+        loader.strategy.add_entry(dn, attributes)
+    register_connection_pool(pool)
+    dn_cache.clear()
+    return ActiveDirectoryManager(host, domain, admin, password), pool
+
+
+def expect(condition, message):
+    if not condition:
+        raise BenchmarkError(message)
+
+
+def operations(manager, directory, group_sizes, seed):
+    """(name, 'read' or 'write', callable) of every benchmarked operation.
+
+    Each callable returns the number of records it handled. Reads come
+    first because the writes add users and change memberships.
+    """
+    rng = random.Random(seed)
+    users, groups, computers = (directory.counts()[key] for key in ('users', 'groups', 'computers'))
+    lookup_groups = [cn for cn, size in group_sizes.items() if size in MEMBER_LOOKUP_SIZES]
+    created = iter(range(10 ** 9))
+
+    def get_users():
+        records = manager.get_users()
+        expect(len(records) == users, f"get_users returned {len(records)} users, expected {users}")
+        return len(records)
+
+    def get_groups():
+        records = manager.get_groups()
+        expect(len(records) == groups, f"get_groups returned {len(records)} groups, expected {groups}")
+        return len(records)
+
+    def get_computers():
+        records = manager.get_computers()
+        expect(len(records) == computers, f"get_computers returned {len(records)} computers, expected {computers}")
+        return len(records)
+
+    def get_dashboard_data():
+        data = manager.get_dashboard_data(timeout=DASHBOARD_TIMEOUT)
+        expect('sections' in data and data['users'] == users,
+               f"get_dashboard_data counted {data['users']} users, expected {users}")
+        return data['users'] + data['groups'] + data['computers']
+
+    def get_group_members():
+        expect(lookup_groups, "No group of a typical size to resolve")
+        cn = rng.choice(lookup_groups)
+        members = manager.get_group_members(cn)
+        expect(members is not None and len(members) == group_sizes[cn],
+               f"get_group_members({cn!r}) returned {members and len(members)} members")
+        return len(members)
+
+    def checked(result, name):
+        success, message = result
+        expect(success, f"{name} failed: {message}")
+        return 1
+
+    def create_user():
+        i = next(created)
+        return checked(manager.create_user(f'bench{i:07d}', 'Bench', f'User {i:07d}', 'Initial-Passw0rd!',
+                                           email=f'bench{i:07d}@{BENCH_DOMAIN}',
+                                           ou_path=directory.user_ou(0)), 'create_user')
+
+    def disable_user():
+        return checked(manager.disable_user(directory.username(rng.randrange(users))), 'disable_user')
+
+    def enable_user():
+        return checked(manager.enable_user(directory.username(rng.randrange(users))), 'enable_user')
+
+    def reset_password():
+        return checked(manager.reset_password(directory.username(rng.randrange(users)), 'Changed-Passw0rd!'),
+                       'reset_password')
+
+    def add_and_remove_member():
+        index = rng.randrange(users)
+        cn = rng.choice(list(group_sizes))
+        checked(manager.add_user_to_group(directory.username(index), cn), 'add_user_to_group')
+        return checked(manager.remove_user_from_group(directory.user_dn(index), cn), 'remove_user_from_group')
+
+    return [
+        ('get_users', 'read', get_users),
+        ('get_groups', 'read', get_groups),
+        ('get_computers', 'read', get_computers),
+        ('get_dashboard_data', 'read', get_dashboard_data),
+        ('get_group_members', 'read', get_group_members),
+        ('create_user', 'write', create_user),
+        ('disable_user', 'write', disable_user),
+        ('enable_user', 'write', enable_user),
+        ('reset_password', 'write', reset_password),
+        ('add_and_remove_member', 'write', add_and_remove_member),
+    ]
+
+
+def measure(func, calls):
+    """Time ``calls`` calls after one warm-up, then trace the peak allocation of one more."""
+    func()
+    timings, records = [], 0
+    for _ in range(calls):
+        started = time.perf_counter()
+        records += func()
+        timings.append(time.perf_counter() - started)
+    # Separate call: tracemalloc slows allocation down too much to time with it on
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    total = sum(timings)
+    return {
+        'calls': calls,
+        'p50Ms': round(percentile(timings, 50) * 1000, 2),
+        'p99Ms': round(percentile(timings, 99) * 1000, 2),
+        'meanMs': round(total / calls * 1000, 2),
+        'opsPerSecond': round(calls / total, 2) if total else None,
+        'recordsPerSecond': round(records / total) if total else None,
+        'peakMemoryBytes': peak
+    }
+
+
+def max_rss():
+    """Peak resident set size of this process in bytes, or None where unknown."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def run_size(app, users, seed, repeat, write_repeat, only=None):
+    started = time.perf_counter()
+    directory = synthetic_directory(users, seed)
+    manager, pool = mock_manager(directory.entries('mock'), f'bench-{users}.{BENCH_DOMAIN}')
+    group_sizes = directory.group_sizes()
+    counts = directory.counts()
+    result = {
+        'directory': dict({key: counts[key] for key in ('users', 'groups', 'computers')},
+                          memberships=sum(group_sizes.values())),
+        'populateSeconds': round(time.perf_counter() - started, 2),
+        'repeat': repeat,
+        'writeRepeat': write_repeat,
+        'operations': {}
+    }
+    with app.app_context():
+        for name, kind, func in operations(manager, directory, group_sizes, seed):
+            if only and name not in only:
+                continue
+            try:
+                result['operations'][name] = stats = measure(func, repeat if kind == 'read' else write_repeat)
+            except BenchmarkError as e:
+                # Keep going; the other operations are still worth having
+                result['operations'][name] = {'error': str(e)}
+                print(f"{users:>8} {name:<24} FAILED: {e}", flush=True)
+                continue
+            print(f"{users:>8} {name:<24}{stats['p50Ms']:>11.2f}{stats['p99Ms']:>11.2f}"
+                  f"{stats['opsPerSecond'] or 0:>10.2f}{stats['peakMemoryBytes'] / 2 ** 20:>11.1f}", flush=True)
+    pool.close()
+    result['maxRssBytes'] = max_rss()
+    return result
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'ldap3': ldap3.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+
+def compare(baseline, results, tolerance):
+    """Print p50 latency and peak memory against ``baseline``; returns the regressions found.
+
+    A change counts as a regression when it exceeds ``tolerance`` (a
+    fraction) and, for latency, is more than a millisecond, so noise in
+    sub-millisecond operations does not trip it.
+    """
+    regressions = []
+    print(f"\n{'users':>8} {'operation':<24}{'p50 base':>11}{'p50 now':>11}{'change':>9}{'mem change':>12}")
+    for size, current in sorted(results['sizes'].items(), key=lambda item: int(item[0])):
+        base_ops = baseline.get('sizes', {}).get(size, {}).get('operations', {})
+        for name, now in current['operations'].items():
+            base = base_ops.get(name)
+            if base is None or 'error' in base or 'error' in now:
+                continue
+            latency = now['p50Ms'] / base['p50Ms'] - 1 if base['p50Ms'] else 0
+            memory = now['peakMemoryBytes'] / base['peakMemoryBytes'] - 1 if base['peakMemoryBytes'] else 0
+            flags = []
+            if latency > tolerance and now['p50Ms'] - base['p50Ms'] > 1:
+                flags.append('latency')
+            if memory > tolerance:
+                flags.append('memory')
+            if flags:
+                regressions.append((size, name, flags))
+            print(f"{size:>8} {name:<24}{base['p50Ms']:>11.2f}{now['p50Ms']:>11.2f}{latency:>+9.0%}{memory:>+12.0%}"
+                  f"{'  REGRESSION (' + ', '.join(flags) + ')' if flags else ''}")
+    return regressions
+
+
+def save(path, results):
+    """Write ``results`` to ``path``, keeping the sizes of an existing file that were not re-run."""
+    document = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            document = json.load(f)
+    document.update({key: value for key, value in results.items() if key != 'sizes'})
+    document.setdefault('sizes', {}).update(results['sizes'])
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        # Stable layout so a baseline update reads as a diff
+        json.dump(document, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark ActiveDirectoryManager against synthetic directories on ldap3's MOCK_SYNC "
+                    "strategy. Latencies include the mock's own search cost, which grows with the "
+                    "directory size faster than a DC's; compare runs made on the same machine.")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated user counts (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=1, help="Seed of the synthetic directories")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed calls per read operation")
+    parser.add_argument('--write-repeat', type=int, default=20, help="Timed calls per write operation")
+    parser.add_argument('--only', help="Comma-separated operation names to run")
+    parser.add_argument('--save', metavar='PATH', nargs='?', const=DEFAULT_BASELINE,
+                        help="Store the results as baseline (default path: %(const)s)")
+    parser.add_argument('--compare', metavar='PATH', nargs='?', const=DEFAULT_BASELINE,
+                        help="Compare with a stored baseline; exits with 1 on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Relative slowdown or memory growth reported as regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    # The mock has no rootDSE or schema to load
+    logging.getLogger('ad_conn').setLevel(logging.ERROR)
+    app = Flask(__name__)
+    only = set(args.only.split(',')) if args.only else None
+    results = {'environment': environment(), 'seed': args.seed,
+               'created': datetime.now().isoformat(timespec='seconds'), 'sizes': {}}
+
+    print(f"{'users':>8} {'operation':<24}{'p50 ms':>11}{'p99 ms':>11}{'ops/s':>10}{'peak MiB':>11}")
+    for users in (int(size) for size in args.sizes.split(',') if size.strip()):
+        results['sizes'][str(users)] = run_size(app, users, args.seed, args.repeat, args.write_repeat, only)
+
+    failed = [name for size in results['sizes'].values() for name, stats in size['operations'].items()
+              if 'error' in stats]
+    status = 1 if failed else 0
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}")
+            status = 1
+    if args.save:
+        save(args.save, results)
+        print(f"\nResults saved to {args.save}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
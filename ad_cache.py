@@ -0,0 +1,295 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from ad_metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+# 'memory' keeps entries per process, 'sqlite' shares them between workers through a local file
+AD_CACHE_BACKEND = os.environ.get('AD_CACHE_BACKEND', 'memory')
+AD_CACHE_PATH = os.environ.get('AD_CACHE_PATH', 'ad_cache.db')
+# Entries kept before the least recently used one is evicted
+AD_CACHE_SIZE = int(os.environ.get('AD_CACHE_SIZE', 512))
+# Seconds an entry is served as fresh, per resource (AD_CACHE_TTL_<RESOURCE> overrides)
+AD_CACHE_TTL = float(os.environ.get('AD_CACHE_TTL', 30))
+# Seconds past its TTL an entry may still be served while it is reloaded in the background
+AD_CACHE_STALE = float(os.environ.get('AD_CACHE_STALE', 120))
+# Seconds the SQLite backend collects cache hits before writing their recency in one transaction
+AD_CACHE_TOUCH_INTERVAL = float(os.environ.get('AD_CACHE_TOUCH_INTERVAL', 5))
+
+
+class MemoryCacheBackend:
+    """Size-bounded LRU dict; entries are ``(value, fresh_until, stale_until)``."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()    # (resource, key) -> entry
+        self.generations = {}           # resource -> int, bumped on invalidation
+
+    def get(self, resource, key):
+        with self.lock:
+            entry = self.entries.get((resource, key))
+            if entry is not None:
+                self.entries.move_to_end((resource, key))
+            return entry
+
+    def generation(self, resource):
+        with self.lock:
+            return self.generations.get(resource, 0)
+
+    def set(self, resource, key, entry, generation):
+        with self.lock:
+            if self.generations.get(resource, 0) != generation:
+                return  # invalidated while loading
+            self.entries[(resource, key)] = entry
+            self.entries.move_to_end((resource, key))
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, resource):
+        with self.lock:
+            self.generations[resource] = self.generations.get(resource, 0) + 1
+            for cache_key in [cache_key for cache_key in self.entries if cache_key[0] == resource]:
+                del self.entries[cache_key]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SQLiteCacheBackend:
+    """The same LRU on a local SQLite file, so several worker processes share entries and invalidations.
+
+    A hit is a plain read. Its recency is kept in memory and written for
+    all hits since the last write at once, with the next set() or after
+    ``touch_interval`` seconds, so hits do not queue up on the database
+    write lock. Entries past their ``stale_until`` are dropped on set().
+    """
+
+    def __init__(self, path, maxsize, touch_interval=5):
+        self.path = path
+        self.maxsize = maxsize
+        self.touch_interval = touch_interval
+        self._touch_lock = threading.Lock()
+        self._touched = {}  # (resource, key) -> time of the last hit not yet written
+        self._last_touch_write = time.monotonic()
+        db = self._connect()
+        try:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript('''
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    resource TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    fresh_until REAL NOT NULL,
+                    stale_until REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (resource, key)
+                );
+                CREATE INDEX IF NOT EXISTS response_cache_last_used ON response_cache (last_used);
+                CREATE TABLE IF NOT EXISTS response_cache_generations (
+                    resource TEXT PRIMARY KEY,
+                    generation INTEGER NOT NULL
+                );
+            ''')
+            db.commit()
+        finally:
+            db.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, resource, key):
+        db = self._connect()
+        try:
+            row = db.execute(
+                'SELECT value, fresh_until, stale_until FROM response_cache WHERE resource = ? AND key = ?',
+                (resource, key)
+            ).fetchone()
+        finally:
+            db.close()
+        if row is None:
+            return None
+        self._touch(resource, key)
+        return json.loads(row[0]), row[1], row[2]
+
+    def _touch(self, resource, key):
+        with self._touch_lock:
+            self._touched[(resource, key)] = time.time()
+            due = time.monotonic() - self._last_touch_write >= self.touch_interval
+        if due:
+            db = self._connect()
+            try:
+                self._write_touched(db)
+                db.commit()
+            finally:
+                db.close()
+
+    def _write_touched(self, db):
+        """Write the recency of the hits collected so far (the caller commits)."""
+        with self._touch_lock:
+            touched, self._touched = self._touched, {}
+            self._last_touch_write = time.monotonic()
+        if touched:
+            db.executemany('UPDATE response_cache SET last_used = MAX(last_used, ?) WHERE resource = ? AND key = ?',
+                           [(last_used, resource, key) for (resource, key), last_used in touched.items()])
+
+    def generation(self, resource):
+        db = self._connect()
+        try:
+            row = db.execute('SELECT generation FROM response_cache_generations WHERE resource = ?',
+                             (resource,)).fetchone()
+            return row[0] if row else 0
+        finally:
+            db.close()
+
+    def set(self, resource, key, entry, generation):
+        value, fresh_until, stale_until = entry
+        now = time.time()
+        db = self._connect()
+        try:
+            self._write_touched(db)
+            # Only store if no invalidation happened while the value was loaded
+            db.execute(
+                'INSERT OR REPLACE INTO response_cache (resource, key, value, fresh_until, stale_until, last_used) '
+                'SELECT ?, ?, ?, ?, ?, ? WHERE COALESCE((SELECT generation FROM response_cache_generations '
+                'WHERE resource = ?), 0) = ?',
+                (resource, key, json.dumps(value), fresh_until, stale_until, now, resource, generation)
+            )
+            db.execute('DELETE FROM response_cache WHERE stale_until < ?', (now,))
+            db.execute(
+                'DELETE FROM response_cache WHERE rowid IN (SELECT rowid FROM response_cache '
+                'ORDER BY last_used DESC LIMIT -1 OFFSET ?)', (self.maxsize,)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def invalidate(self, resource):
+        db = self._connect()
+        try:
+            db.execute(
+                'INSERT INTO response_cache_generations (resource, generation) VALUES (?, 1) '
+                'ON CONFLICT(resource) DO UPDATE SET generation = generation + 1', (resource,)
+            )
+            db.execute('DELETE FROM response_cache WHERE resource = ?', (resource,))
+            db.commit()
+        finally:
+            db.close()
+
+    def __len__(self):
+        db = self._connect()
+        try:
+            return db.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0]
+        finally:
+            db.close()
+
+
+class ResponseCache:
+    """Read-through cache for API payloads with stale-while-revalidate.
+
+    Each entry belongs to a resource ('users', 'groups', ...) with its own
+    TTL. Within the TTL the cached payload is served; for AD_CACHE_STALE
+    seconds after that it is still served while one background thread
+    reloads it; later it is loaded in the request. invalidate() drops a
+    resource at once (and across workers with the SQLite backend) and
+    tells the registered listeners.
+    """
+
+    def __init__(self, backend, ttl=30, stale=120, ttls=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale = stale
+        self.ttls = ttls or {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def ttl_for(self, resource):
+        if resource not in self.ttls:
+            self.ttls[resource] = float(os.environ.get(f'AD_CACHE_TTL_{resource.upper()}', self.ttl))
+        return self.ttls[resource]
+
+    def _load(self, resource, key, loader):
+        generation = self.backend.generation(resource)
+        value = loader()
+        now = time.time()
+        fresh_until = now + self.ttl_for(resource)
+        self.backend.set(resource, key, (value, fresh_until, fresh_until + self.stale), generation)
+        return value
+
+    def _refresh(self, app, resource, key, loader):
+        try:
+            with app.app_context():
+                self._load(resource, key, loader)
+        except Exception as e:
+            with app.app_context():
+                logger.warning("Background refresh of %s cache failed: %s", resource, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard((resource, key))
+
+    def get_or_load(self, resource, key, loader):
+        """Return the cached payload for ``key`` or load it with ``loader()``.
+
+        Exceptions from the loader propagate and nothing is cached.
+        """
+        if self.ttl_for(resource) <= 0:
+            return loader()
+        entry = self.backend.get(resource, key)
+        now = time.time()
+        if entry is not None:
+            value, fresh_until, stale_until = entry
+            if now < fresh_until:
+                self.hits += 1
+                return value
+            if now < stale_until and has_app_context():
+                self.stale_hits += 1
+                with self._lock:
+                    start = (resource, key) not in self._refreshing
+                    self._refreshing.add((resource, key))
+                if start:
+                    threading.Thread(target=self._refresh, daemon=True,
+                                     args=(current_app._get_current_object(), resource, key, loader)).start()
+                return value
+        self.misses += 1
+        return self._load(resource, key, loader)
+
+    def add_listener(self, callback):
+        """Call ``callback(resources)`` after every invalidation."""
+        self._listeners.append(callback)
+
+    def invalidate(self, *resources):
+        for resource in resources:
+            self.backend.invalidate(resource)
+        for callback in self._listeners:
+            callback(resources)
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'staleHits': self.stale_hits,
+            'misses': self.misses
+        }
+
+
+def _create_backend():
+    if AD_CACHE_BACKEND == 'sqlite':
+        return SQLiteCacheBackend(AD_CACHE_PATH, AD_CACHE_SIZE, AD_CACHE_TOUCH_INTERVAL)
+    return MemoryCacheBackend(AD_CACHE_SIZE)
+
+
+# Process-wide cache for the list endpoints
+response_cache = ResponseCache(_create_backend(), ttl=AD_CACHE_TTL, stale=AD_CACHE_STALE)
+register_cache('response', lambda: {'hit': response_cache.hits, 'stale': response_cache.stale_hits,
+                                   'miss': response_cache.misses})
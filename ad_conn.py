@@ -1,277 +1,1167 @@
 import os
 import json
+import logging
 import ssl
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
 from datetime import datetime
-from flask import current_app
-from ldap3 import Server, Connection, Tls, NTLM, ALL, MODIFY_REPLACE, SUBTREE
-from ldap3.core.exceptions import LDAPException, LDAPBindError, LDAPEntryAlreadyExistsResult, LDAPOperationResult
+from flask import current_app, g, has_request_context
+from ldap3 import Server, Connection, Tls, NTLM, NONE, BASE, NO_ATTRIBUTES, MODIFY_ADD, MODIFY_DELETE, MODIFY_REPLACE, SUBTREE, RESTARTABLE
+from ldap3.protocol.rfc4512 import DsaInfo, SchemaInfo
+from ldap3.core.results import RESULT_ATTRIBUTE_OR_VALUE_EXISTS, RESULT_ENTRY_ALREADY_EXISTS, RESULT_NO_SUCH_OBJECT
+from ldap3.utils.conv import escape_filter_chars
+from ldap3.utils.dn import escape_rdn
+from ldap3.core.exceptions import LDAPException, LDAPBindError, LDAPCommunicationError, LDAPEntryAlreadyExistsResult, LDAPExceptionError, LDAPMaximumRetriesError, LDAPNoSuchObjectResult, LDAPOperationResult
+from ad_cache import response_cache
+from ad_logging import log_sampled
+from ad_profiling import capture_scope, current_capture
+from ad_tracing import current_span, end_span, span_scope, start_span
+from ad_metrics import LDAP_OPERATIONS, LDAP_OPERATION_SECONDS, LDAP_SEARCH_ENTRIES, calling_method, register_cache, register_methods
+
+logger = logging.getLogger(__name__)
+
+
+# Simple paged results control (RFC 2696)
+PAGED_RESULTS_OID = '1.2.840.113556.1.4.319'
+# LDAP_SERVER_SHOW_DELETED_OID, makes tombstones visible to searches
+SHOW_DELETED_OID = '1.2.840.113556.1.4.417'
+
+# Actions accepted by ActiveDirectoryManager.run_user_operation()
+USER_ACTIONS = ('enable', 'disable', 'reset_password')
+# Attribute dn_cache names are looked up by, per cached object kind
+NAMING_ATTRIBUTES = {'user': 'sAMAccountName', 'group': 'cn'}
+
+USER_FILTER = '(&(objectClass=user)(objectCategory=person))'
+USER_ATTRIBUTES = ['sAMAccountName', 'cn', 'givenName', 'sn', 'mail', 'userAccountControl']
+GROUP_FILTER = '(objectClass=group)'
+GROUP_ATTRIBUTES = ['cn', 'description', 'member']
+COMPUTER_FILTER = '(objectClass=computer)'
+COMPUTER_ATTRIBUTES = ['name', 'dNSHostName', 'operatingSystem', 'userAccountControl']
+DC_FILTER = '(&(objectCategory=computer)(userAccountControl:1.2.840.113556.1.4.803:=8192))'
+DC_ATTRIBUTES = ['name', 'dNSHostName', 'operatingSystem']
+# Record field -> LDAP attributes it is built from, for attributes= projections
+RECORD_FIELDS = {
+    'users': {'sAMAccountName': ['sAMAccountName'], 'cn': ['cn'], 'givenName': ['givenName'],
+              'sn': ['sn'], 'mail': ['mail'], 'enabled': ['userAccountControl']},
+    'groups': {'cn': ['cn'], 'description': ['description'], 'member_count': ['member'], 'members': ['member']},
+    'computers': {'name': ['name'], 'dnsHostName': ['dNSHostName'], 'status': ['userAccountControl']},
+}
+# Fields shown in the dashboard preview tables
+PREVIEW_FIELDS = {
+    'users': ['cn', 'sAMAccountName', 'mail', 'enabled'],
+    'groups': ['cn', 'description', 'member_count'],
+    'computers': ['name', 'dnsHostName', 'status'],
+}
+# Rows per dashboard preview table
+PREVIEW_ROWS = 10
+
+
+# Directory holding the cached DSA and schema info per domain controller
+SERVER_INFO_CACHE_DIR = os.environ.get('AD_SERVER_INFO_CACHE_DIR', 'ad_cache')
+
+
+def _server_info_path(host):
+    return os.path.join(SERVER_INFO_CACHE_DIR, f"server_info_{host.replace(':', '_')}.json")
+
+
+def read_cached_server_info(server):
+    """Attach cached DSA and schema info to a server without contacting it.
+
+    Returns the cache record (with its ``schemaUSN``) or None if there is
+    no usable cache file for this host.
+    """
+    try:
+        with open(_server_info_path(server.host)) as f:
+            cached = json.load(f)
+        server.attach_dsa_info(DsaInfo.from_json(cached['dsa']))
+        server.attach_schema_info(SchemaInfo.from_json(cached['schema']))
+        return cached
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Ignoring unreadable server info cache for %s: %s", server.host, e)
+        return None
+
+
+def _schema_usn(conn, schema_nc):
+    """uSNChanged of the schema partition head; it moves with every schema update."""
+    conn.search(schema_nc, '(objectClass=*)', BASE, attributes=['uSNChanged'])
+    if not conn.entries:
+        return None
+    return int(conn.entries[0].entry_attributes_as_dict.get('uSNChanged', [0])[0])
+
+
+def load_server_info(server, conn, cached=None, refresh=False):
+    """Make sure ``server`` carries current DSA and schema info.
+
+    Servers are created with ``get_info=NONE`` so binding never pulls
+    the schema. Instead the info is cached on disk keyed by DC host and
+    schema USN: if the DC's schema USN still matches the cache, only that
+    one attribute is read. Otherwise, or with ``refresh``, the full info is
+    fetched once and the cache file rewritten. Returns True if it was
+    fetched from the DC.
+    """
+    if cached is None and not refresh:
+        cached = read_cached_server_info(server)
+    schema_nc = cached.get('schemaNamingContext') if cached else None
+    if cached and schema_nc and not refresh:
+        if _schema_usn(conn, schema_nc) == cached.get('schemaUSN'):
+            return False
+
+    server._get_dsa_info(conn)
+    if server.info is None:
+        return False  # e.g. mock strategies, nothing worth caching
+    schema_nc = server.info.other.get('schemaNamingContext', [None])[0]
+    # Read the USN before the schema so a concurrent update is refetched next time
+    schema_usn = _schema_usn(conn, schema_nc) if schema_nc else None
+    server._get_schema_info(conn)
+    if server.schema is None:
+        return False
+
+    os.makedirs(SERVER_INFO_CACHE_DIR, exist_ok=True)
+    path = _server_info_path(server.host)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({
+            'host': server.host,
+            'schemaNamingContext': schema_nc,
+            'schemaUSN': schema_usn,
+            'fetched': datetime.now().isoformat(),
+            'dsa': server.info.to_json(),
+            'schema': server.schema.to_json()
+        }, f)
+    os.replace(path + '.tmp', path)
+    logger.info("Fetched server info for %s (schema USN %s)", server.host, schema_usn)
+    return True
+
+
+# Weight of the newest sample in the per-DC latency and error rate averages
+HEALTH_ALPHA = 0.3
+# Errors meaning the DC or the socket is gone (RESTARTABLE gives up with LDAPMaximumRetriesError)
+CONNECTION_ERRORS = (LDAPCommunicationError, LDAPMaximumRetriesError)
+
+
+class ConnectionPoolTimeout(LDAPException):
+    """Raised when no pooled LDAP connection becomes available in time."""
+
+
+class InstrumentedConnection(Connection):
+    """ldap3 Connection recording count, latency and result of every bind, search, add and modify.
+
+    Operations are labelled with the ActiveDirectoryManager method that
+    issued them (see ad_metrics.calling_method), searches also with the
+    number of entries they returned. While a request is being captured
+    (ad_profiling) each operation is also added to its timeline, and
+    inside a trace (ad_tracing) it gets a span of its own.
+    """
+
+    def _timed(self, operation, call, *args, **kwargs):
+        method = calling_method()
+        span = start_span(f'ldap.{operation}', method=method, server=self.server.host)
+        started = time.perf_counter()
+        succeeded = False
+        try:
+            result = call(*args, **kwargs)
+            # A search without matches returns False but is not an error
+            succeeded = bool(result) or (self.result or {}).get('result') == 0
+            return result
+        finally:
+            duration = time.perf_counter() - started
+            LDAP_OPERATION_SECONDS.observe(duration, operation, method)
+            LDAP_OPERATIONS.inc(operation, method, 'success' if succeeded else 'error')
+            entries = None
+            if operation == 'search':
+                entries = sum(1 for item in self.response or () if item.get('type') == 'searchResEntry')
+                LDAP_SEARCH_ENTRIES.observe(entries, method)
+            capture = current_capture()
+            if capture is not None or span is not None:
+                # DNs and filters only; attribute values may hold passwords
+                target = args[0] if args else kwargs.get('search_base', kwargs.get('dn', self.user))
+                details = {'method': method, 'success': succeeded, 'target': str(target)[:500]}
+                if operation == 'search':
+                    details['filter'] = str(args[1] if len(args) > 1 else kwargs.get('search_filter'))[:500]
+                    details['entries'] = entries
+                if capture is not None:
+                    capture.add_event('ldap', operation, started, duration, **details)
+                if span is not None:
+                    result_code = (self.result or {}).get('result')
+                    end_span(span, None if succeeded else f'LDAP result {result_code}',
+                             target=details['target'], filter=details.get('filter'),
+                             entries=entries, result=result_code)
+
+    def bind(self, *args, **kwargs):
+        return self._timed('bind', super().bind, *args, **kwargs)
+
+    def search(self, *args, **kwargs):
+        return self._timed('search', super().search, *args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        return self._timed('add', super().add, *args, **kwargs)
+
+    def modify(self, *args, **kwargs):
+        return self._timed('modify', super().modify, *args, **kwargs)
+
+
+class LDAPConnectionPool:
+    """Thread-safe pool of bound LDAPS connections to one domain controller.
+
+    Connections are handed out LIFO so the most recently used (and therefore
+    most likely still alive) socket is reused first. Idle connections older
+    than ``idle_timeout`` are unbound, and connections idle for longer than
+    ``check_interval`` get a cheap rootDSE probe before being handed out.
+    The RESTARTABLE client strategy reopens and rebinds dropped sockets
+    transparently while an operation is in flight, at most ``restart_tries``
+    times ``restart_sleep`` seconds apart; with ``connect_timeout`` and
+    ``receive_timeout`` that bounds how long a dead DC can block a caller
+    (ldap3's defaults retry for a minute).
+
+    The pool also keeps the DC's health for DomainControllerPool: moving
+    averages of bind/probe round trips and of failures, and a back-off
+    after a failure during which the DC is not preferred.
+    """
+
+    def __init__(self, host, username, password, size=5, idle_timeout=300,
+                 borrow_timeout=10, check_interval=30, port=636, use_ssl=True,
+                 authentication=NTLM, client_strategy=RESTARTABLE, retry_after=30,
+                 connect_timeout=5, receive_timeout=60, restart_tries=2, restart_sleep=1):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.borrow_timeout = borrow_timeout
+        self.check_interval = check_interval
+        self.authentication = authentication
+        self.client_strategy = client_strategy
+        self.retry_after = retry_after
+        self.receive_timeout = receive_timeout
+        self.restart_tries = restart_tries
+        self.restart_sleep = restart_sleep
+
+        tls = Tls(validate=ssl.CERT_NONE, version=ssl.PROTOCOL_TLSv1_2) if use_ssl else None
+        # Schema and rootDSE info come from the local cache, see load_server_info()
+        self.server = Server(host=host, port=port, use_ssl=use_ssl, tls=tls, get_info=NONE,
+                             connect_timeout=connect_timeout)
+        self._cached_info = read_cached_server_info(self.server)
+        self._info_checked = False
+        self._info_lock = threading.Lock()
+
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []  # list of (connection, last_used) tuples, most recent last
+        self._created = 0
+        self._closed = False
+
+        self.latency = None         # seconds, moving average of binds and probes
+        self.error_rate = 0.0       # moving average of failed operations
+        self.down_until = 0.0       # monotonic time before which the DC is avoided
+        self.last_error = None
+
+    def _open(self):
+        """Open and bind a new connection."""
+        conn = InstrumentedConnection(
+            self.server,
+            user=self.username,
+            password=self.password,
+            authentication=self.authentication,
+            client_strategy=self.client_strategy,
+            receive_timeout=self.receive_timeout
+        )
+        if hasattr(conn.strategy, 'restartable_tries'):
+            # Set per connection; ldap3 only offers process-wide defaults for these
+            conn.strategy.restartable_tries = self.restart_tries
+            conn.strategy.restartable_sleep_time = self.restart_sleep
+        started = time.monotonic()
+        if not conn.bind():
+            raise LDAPBindError(f"Failed to bind to the server: {conn.result}")
+        self._observe_latency(time.monotonic() - started)
+        if not self._info_checked:
+            self._check_server_info(conn)
+        with self._lock:
+            self._created += 1
+        logger.info("Opened pooled LDAP connection to %s", self.host)
+        return conn
+
+    def _check_server_info(self, conn):
+        """Validate (or fetch) the server info once, on the pool's first bind."""
+        with self._info_lock:
+            if self._info_checked:
+                return
+            try:
+                load_server_info(self.server, conn, cached=self._cached_info)
+            except CONNECTION_ERRORS:
+                raise
+            except Exception as e:
+                # Searches still work without schema, values are just not typed
+                logger.warning("Could not load server info for %s: %s", self.host, e)
+            self._info_checked = True
+
+    @staticmethod
+    def _close(conn):
+        try:
+            if conn.bound:
+                conn.unbind()
+        except Exception:
+            pass
+
+    def _is_alive(self, conn):
+        """Probe the rootDSE to make sure the socket is still usable."""
+        if conn.closed or not conn.bound:
+            return False
+        started = time.monotonic()
+        try:
+            # Any response at all (even noSuchObject) proves the socket works
+            conn.search('', '(objectClass=*)', BASE, attributes=['1.1'])
+        except CONNECTION_ERRORS:
+            return False
+        except LDAPException:
+            pass
+        self._observe_latency(time.monotonic() - started)
+        return True
+
+    def _observe_latency(self, elapsed):
+        with self._lock:
+            if self.latency is None:
+                self.latency = elapsed
+            else:
+                self.latency += HEALTH_ALPHA * (elapsed - self.latency)
+
+    @property
+    def available(self):
+        """False while the DC is backing off after a failure."""
+        return time.monotonic() >= self.down_until
+
+    def mark_success(self):
+        with self._lock:
+            self.error_rate -= HEALTH_ALPHA * self.error_rate
+            self.down_until = 0.0
+
+    def mark_failure(self, error):
+        with self._lock:
+            self.error_rate += HEALTH_ALPHA * (1 - self.error_rate)
+            self.down_until = time.monotonic() + self.retry_after
+            self.last_error = str(error)
+
+    def probe(self):
+        """Measure the DC's round trip with a rootDSE read on a pooled connection."""
+        try:
+            conn = self.acquire()
+        except LDAPExceptionError as e:
+            self.mark_failure(e)
+            raise
+        alive = False
+        try:
+            alive = self._is_alive(conn)
+        finally:
+            self.release(conn, discard=not alive)
+        if alive:
+            self.mark_success()
+        else:
+            self.mark_failure('rootDSE probe failed')
+        return alive
+
+    def acquire(self, timeout=None):
+        """Borrow a bound connection, waiting at most ``timeout`` seconds."""
+        if self._closed:
+            raise LDAPException("Connection pool is closed")
+        timeout = self.borrow_timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise ConnectionPoolTimeout(
+                f"No LDAP connection to {self.host} available within {timeout}s")
+
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    conn, last_used = self._idle.pop()
+                idle_for = time.monotonic() - last_used
+                if idle_for > self.idle_timeout:
+                    self._close(conn)
+                    continue
+                if idle_for > self.check_interval and not self._is_alive(conn):
+                    logger.warning("Discarding dead pooled LDAP connection to %s", self.host)
+                    self._close(conn)
+                    continue
+                return conn
+            return self._open()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        """Return a borrowed connection to the pool."""
+        try:
+            if discard or self._closed or conn.closed or not conn.bound:
+                self._close(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that borrows a connection and always returns it."""
+        conn = self.acquire(timeout)
+        discard = False
+        try:
+            yield conn
+        except LDAPExceptionError:
+            # Never hand a broken socket to the next borrower (LDAP result errors leave it usable)
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close(self):
+        """Unbind all idle connections and refuse further borrows."""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'host': self.host,
+                'size': self.size,
+                'idle': len(self._idle),
+                'created': self._created,
+                'latency': round(self.latency * 1000, 1) if self.latency is not None else None,
+                'errorRate': round(self.error_rate, 3),
+                'available': self.available,
+                'lastError': self.last_error
+            }
+
+
+class DomainControllerPool:
+    """Connection pools for several domain controllers of one domain.
+
+    Reads go to the fastest available DC (see LDAPConnectionPool health);
+    if borrowing from a DC fails it backs off for ``retry_after`` seconds
+    and the next DC is tried. Writes stick to one DC until it fails, and
+    reads issued within ``write_affinity`` seconds of a write go there too,
+    so callers see their own changes before replication catches up.
+    """
+
+    def __init__(self, pools, write_affinity=30):
+        self.pools = OrderedDict((pool.host.lower(), pool) for pool in pools)
+        self.write_affinity = write_affinity
+        self.write_host = None
+        self._last_write = None
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        """Connections available per DC."""
+        return min(pool.size for pool in self.pools.values())
+
+    @property
+    def hosts(self):
+        return list(self.pools)
+
+    def add(self, pool):
+        with self._lock:
+            self.pools.setdefault(pool.host.lower(), pool)
+
+    def candidates(self, write=False):
+        """Pools in the order they should be tried."""
+        now = time.monotonic()
+        with self._lock:
+            pools = list(self.pools.values())
+            pinned = self.pools.get(self.write_host) if self.write_host else None
+            recent_write = self._last_write is not None and now - self._last_write < self.write_affinity
+
+        def rank(item):
+            position, pool = item
+            if not pool.available:
+                # Everything is backing off: try the DC that failed longest ago first
+                return (1, pool.down_until, 0, position)
+            return (0, 0, pool.latency if pool.latency is not None else float('inf'), position)
+
+        ordered = [pool for _, pool in sorted(enumerate(pools), key=rank)]
+        if pinned is not None and pinned.available and (write or recent_write):
+            ordered.remove(pinned)
+            ordered.insert(0, pinned)
+        return ordered
+
+    @contextmanager
+    def connection(self, write=False, timeout=None):
+        """Borrow a connection from the best DC, failing over while none could be borrowed."""
+        errors = []
+        for pool in self.candidates(write):
+            try:
+                conn = pool.acquire(timeout)
+            except LDAPExceptionError as e:
+                # Bind, socket and timeout errors, and RESTARTABLE giving up (LDAPMaximumRetriesError)
+                pool.mark_failure(e)
+                errors.append(f"{pool.host}: {str(e)}")
+                logger.warning("Domain controller %s unavailable, failing over: %s", pool.host, e)
+                continue
+
+            if write:
+                with self._lock:
+                    self.write_host = pool.host.lower()
+                    self._last_write = time.monotonic()
+            discard = False
+            try:
+                yield conn
+            except LDAPExceptionError as e:
+                # Never hand a broken socket to the next borrower; only a lost DC counts against it
+                discard = True
+                if isinstance(e, CONNECTION_ERRORS):
+                    pool.mark_failure(e)
+                raise
+            else:
+                pool.mark_success()
+            finally:
+                pool.release(conn, discard=discard)
+            return
+        raise LDAPCommunicationError(f"No domain controller reachable: {'; '.join(errors)}")
+
+    def probe(self):
+        """Refresh the round trip of every DC; failures start their back-off."""
+        for pool in list(self.pools.values()):
+            try:
+                pool.probe()
+            except LDAPException as e:
+                logger.warning("Probe of domain controller %s failed: %s", pool.host, e)
+
+    def stats(self):
+        return {
+            'writeHost': self.write_host,
+            'servers': [pool.stats() for pool in self.candidates()]
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(host, username, password):
+    """Return the process-wide pool for the given DC and credentials."""
+    key = (host, username, password)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = LDAPConnectionPool(
+                host, username, password,
+                size=int(os.environ.get('AD_POOL_SIZE', 5)),
+                idle_timeout=float(os.environ.get('AD_POOL_IDLE_TIMEOUT', 300)),
+                borrow_timeout=float(os.environ.get('AD_POOL_BORROW_TIMEOUT', 10)),
+                check_interval=float(os.environ.get('AD_POOL_CHECK_INTERVAL', 30)),
+                retry_after=float(os.environ.get('AD_DC_RETRY_AFTER', 30)),
+                connect_timeout=float(os.environ.get('AD_LDAP_CONNECT_TIMEOUT', 5)),
+                receive_timeout=float(os.environ.get('AD_LDAP_RECEIVE_TIMEOUT', 60)),
+                restart_tries=int(os.environ.get('AD_LDAP_RESTART_TRIES', 2)),
+                restart_sleep=float(os.environ.get('AD_LDAP_RESTART_SLEEP', 1))
+            )
+            _pools[key] = pool
+        return pool
+
+
+_dc_pools = {}
+
+
+def get_domain_controller_pool(hosts, username, password):
+    """Return the process-wide multi-DC pool for the given DCs and credentials."""
+    key = (tuple(host.lower() for host in hosts), username, password)
+    with _pools_lock:
+        dc_pool = _dc_pools.get(key)
+    if dc_pool is None:
+        pools = [get_connection_pool(host, username, password) for host in hosts]
+        with _pools_lock:
+            dc_pool = _dc_pools.setdefault(key, DomainControllerPool(
+                pools, write_affinity=float(os.environ.get('AD_DC_WRITE_AFFINITY', 30))))
+    return dc_pool
+
+
+def register_connection_pool(pool):
+    """Serve the pool's DC and credentials from ``pool`` from now on.
+
+    For pools built by hand, e.g. on ldap3's MOCK_SYNC strategy in
+    ad_benchmark. Multi-DC pools already using the DC switch over too, and
+    the pool replaced is closed.
+    """
+    key = (pool.host, pool.username, pool.password)
+    with _pools_lock:
+        previous = _pools.get(key)
+        _pools[key] = pool
+        dc_pools = [dc_pool for (hosts, username, password), dc_pool in _dc_pools.items()
+                    if pool.host.lower() in hosts and (username, password) == key[1:]]
+    for dc_pool in dc_pools:
+        with dc_pool._lock:
+            dc_pool.pools[pool.host.lower()] = pool
+    if previous is not None and previous is not pool:
+        previous.close()
+
+
+class DNCache:
+    """Bounded LRU cache resolving sAMAccountName / group cn to (DN, objectGUID).
+
+    Entries expire after ``ttl`` seconds. Writes go straight to a cached
+    DN. If the DC answers noSuchObject, the object was renamed, moved or
+    deleted elsewhere: the entries for that DN are dropped and the object
+    is found again by objectGUID. The directory sync drops the entries of
+    objects it sees renamed, moved or deleted.
+    """
+
+    def __init__(self, maxsize=10000, ttl=900):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (kind, name) -> (dn, guid, expires)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind, name):
+        key = (kind, name.lower())
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[2] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[0], item[1]
+
+    def put(self, kind, name, dn, guid=None):
+        key = (kind, name.lower())
+        with self._lock:
+            self._entries[key] = (dn, guid, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, kind, name):
+        with self._lock:
+            self._entries.pop((kind, name.lower()), None)
+
+    def invalidate_dn(self, *dns):
+        """Drop every name resolving to one of ``dns`` (after a rename, move or delete)."""
+        dns = {dn.lower() for dn in dns}
+        if not dns:
+            return
+        with self._lock:
+            for key in [k for k, v in self._entries.items() if v[0].lower() in dns]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared across managers, like the connection pools
+dn_cache = DNCache(
+    maxsize=int(os.environ.get('AD_DN_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('AD_DN_CACHE_TTL', 900))
+)
+register_cache('dn', lambda: {'hit': dn_cache.hits, 'miss': dn_cache.misses})
+
+
+def ldap_attributes(kind, fields):
+    """Return the LDAP attributes needed to build the given record fields.
+
+    Raises ValueError for fields the record kind does not have.
+    """
+    unknown = [field for field in fields if field not in RECORD_FIELDS[kind]]
+    if unknown:
+        raise ValueError(f"Unknown {kind} attributes: {', '.join(unknown)}")
+    return sorted({attribute for field in fields for attribute in RECORD_FIELDS[kind][field]})
+
+
+def project(record, fields):
+    """Restrict a record to the requested fields (all of them if fields is empty)."""
+    if not fields:
+        return record
+    return {field: record.get(field) for field in fields}
+
+
+def build_dashboard_data(users, groups, computers, domain_controllers, counts=None):
+    """Format directory lists into the dashboard payload.
+
+    ``counts`` overrides the totals when the lists only hold preview rows.
+    """
+    counts = counts or {}
+    # Format user data for table display
+    user_details = []
+    for user in users[:PREVIEW_ROWS]:  # Limit to first 10 users for display
+        user_details.append({
+            'Name': user.get('cn', ''),
+            'Username': user.get('sAMAccountName', ''),
+            'Email': user.get('mail', ''),
+            'Status': 'Active' if user.get('enabled', False) else 'Disabled'
+        })
+
+    # Format group data for table display
+    group_details = []
+    for group in groups[:PREVIEW_ROWS]:  # Limit to first 10 groups
+        group_details.append({
+            'Group Name': group.get('cn', ''),
+            'Description': group.get('description', ''),
+            'Members': str(group.get('member_count', 0))
+        })
+
+    # Format computer data for table display
+    computer_details = []
+    for computer in computers[:PREVIEW_ROWS]:  # Limit to first 10 computers
+        computer_details.append({
+            'Computer Name': computer.get('name', ''),
+            'IP Address': computer.get('dnsHostName', ''),
+            'Status': computer.get('status', '')
+        })
+
+    return {
+        'users': counts.get('users', len(users)),
+        'groups': counts.get('groups', len(groups)),
+        'computers': counts.get('computers', len(computers)),
+        'domainControllers': counts.get('domainControllers', len(domain_controllers)),
+        'userDetails': user_details,
+        'groupDetails': group_details,
+        'computerDetails': computer_details
+    }
+
 
 class ActiveDirectoryManager:
-    def __init__(self, domain_controller=None, domain=None, username=None, password=None):
+    def __init__(self, domain_controller=None, domain=None, username=None, password=None, page_size=None):
         """Initialize AD connection manager with credentials"""
         self.domain_controller = domain_controller or os.environ.get('AD_DOMAIN_CONTROLLER', 'name.domain.domain')
         self.domain = domain or os.environ.get('AD_DOMAIN', 'domain.domain')
         self.username = username or os.environ.get('AD_USERNAME', 'domain\\Usernamen')
         self.password = password or os.environ.get('AD_PASSWORD', 'password')
-        self.conn = None
+        self.page_size = page_size or int(os.environ.get('AD_PAGE_SIZE', 500))
+        # AD_DOMAIN_CONTROLLER may list several DCs, separated by commas
+        self.domain_controllers = [host.strip() for host in self.domain_controller.split(',') if host.strip()]
+        self.pool = None
         self.server = None
+        self.active_dc = None
+        self._local = threading.local()
         
         # Convert domain to LDAP base DN format
         self.base_dn = ','.join([f'DC={part}' for part in self.domain.split('.')])
         
-    def connect(self):
-        """Connect to Active Directory via LDAPS"""
-        try:
-            if not self.domain_controller:
+    def _get_pool(self):
+        if self.pool is None:
+            if not self.domain_controllers:
                 raise ValueError("Domain controller address is not set")
+            self.pool = get_domain_controller_pool(self.domain_controllers, self.username, self.password)
+        return self.pool
 
-            # Configure TLS for LDAPS
-            tls = Tls(validate=ssl.CERT_NONE, version=ssl.PROTOCOL_TLSv1_2)
-
-            # Create Server object
-            self.server = Server(
-                host=self.domain_controller,
-                port=636,  # LDAPS port
-                use_ssl=True,
-                tls=tls,
-                get_info=ALL
-            )
-
-            if not self.server:
-                raise ValueError(f"Invalid server address: {self.domain_controller}")
-
-            # Create Connection object with NTLM authentication
-            self.conn = Connection(
-                self.server,
-                user=self.username,
-                password=self.password,
-                authentication=NTLM,
-                auto_bind=True
-            )
-
-            if not self.conn.bound:
-                raise LDAPBindError("Failed to bind to the server")
+    def connect(self):
+        """Attach to the shared LDAPS connection pools and verify a bind works"""
+        try:
+            # Borrowing opens (or revalidates) a bound connection
+            with self._connection():
+                pass
 
-            current_app.logger.info(f"Successfully connected to AD server {self.domain_controller} using LDAPS")
+            logger.info("Successfully connected to AD server %s using LDAPS", self.active_dc)
             return True
         except LDAPBindError as e:
-            current_app.logger.error(f"Failed to bind to AD server: {str(e)}")
-            self.conn = None
+            logger.error("Failed to bind to AD server: %s", e)
             return False
         except Exception as e:
-            current_app.logger.error(f"Failed to connect to AD: {str(e)}")
-            self.conn = None
+            logger.error("Failed to connect to AD: %s", e)
             return False
 
+    @contextmanager
+    def _connection(self, write=False):
+        """Borrow a bound connection from the shared pools.
+
+        Writes go to the DC writes are pinned to (see DomainControllerPool).
+        Inside pinned_connection() the thread's pinned connection is reused
+        instead of borrowing a new one.
+        """
+        pinned = getattr(self._local, 'conn', None)
+        if pinned is not None:
+            yield pinned
+            return
+        with self._get_pool().connection(write=write) as conn:
+            self.server = conn.server
+            self.active_dc = conn.server.host
+            if has_request_context():
+                g.ad_server = self.active_dc
+            yield conn
+
+    @contextmanager
+    def pinned_connection(self, write=False):
+        """Route every operation on this thread through one borrowed connection"""
+        if getattr(self._local, 'conn', None) is not None:
+            yield self._local.conn
+            return
+        with self._connection(write=write) as conn:
+            self._local.conn = conn
+            try:
+                yield conn
+            finally:
+                self._local.conn = None
+
+    def refresh_server_info(self):
+        """Re-read DSA and schema info from every DC and rewrite the local cache.
+
+        Returns the hosts that returned server info.
+        """
+        refreshed = []
+        for pool in self._get_pool().pools.values():
+            with pool.connection() as conn:
+                load_server_info(pool.server, conn, refresh=True)
+            if pool.server.info is not None:
+                refreshed.append(pool.host)
+        return refreshed
+
+    def refresh_domain_controllers(self, discover=False):
+        """Probe every known DC and optionally add DCs found in the directory.
+
+        Returns the health of all DCs, fastest first.
+        """
+        dc_pool = self._get_pool()
+        if discover:
+            for dc in self.iter_domain_controllers():
+                host = dc.get('dnsHostName')
+                if host and host.lower() not in dc_pool.pools:
+                    logger.info("Discovered domain controller %s", host)
+                    dc_pool.add(get_connection_pool(host, self.username, self.password))
+        dc_pool.probe()
+        return dc_pool.stats()
+
     def disconnect(self):
-        """Disconnect from LDAP server"""
-        if self.conn and self.conn.bound:
-            self.conn.unbind()
-            current_app.logger.info("Disconnected from AD server")
+        """Release this manager's reference to the pool.
+
+        Pooled connections stay bound for reuse by later requests; use
+        ``LDAPConnectionPool.close()`` to actually unbind them.
+        """
+        self.pool = None
+
+    def paged_search(self, ldap_filter, attributes, search_base=None, page_size=None, controls=None):
+        """Yield entries for a SUBTREE search one page at a time.
+
+        Uses the simple paged results control so directories larger than the
+        DC's MaxPageSize come back complete, while only one page of entries
+        is held in memory. The pooled connection is kept for as long as the
+        generator is being consumed.
+        """
+        page_size = page_size or self.page_size
+        with self._connection() as conn:
+            cookie = None
+            while True:
+                conn.search(search_base=search_base or self.base_dn, search_filter=ldap_filter,
+                            search_scope=SUBTREE, attributes=attributes, controls=controls,
+                            paged_size=page_size, paged_cookie=cookie)
+                if conn.result['result'] != 0:
+                    raise LDAPOperationResult(result=conn.result['result'],
+                                              description=conn.result['description'],
+                                              message=conn.result['message'])
+                for entry in conn.entries:
+                    yield entry
+                cookie = conn.result.get('controls', {}).get(PAGED_RESULTS_OID, {}).get('value', {}).get('cookie')
+                if not cookie:
+                    break
+
+    def count_search(self, ldap_filter, search_base=None, page_size=None):
+        """Count the entries matching a filter without transferring any attributes.
+
+        Pages through the result asking for the special attribute list
+        ``1.1`` (no attributes), so only DNs cross the wire.
+        """
+        return sum(1 for _ in self.paged_search(ldap_filter, [NO_ATTRIBUTES], search_base=search_base,
+                                                page_size=page_size))
+
+    @staticmethod
+    def _user_from_entry(entry):
+        user_data = entry.entry_attributes_as_dict
+
+        # Avoid list index errors by checking length
+        given_name_vals = user_data.get('givenName', [])
+        sn_vals = user_data.get('sn', [])
+        mail_vals = user_data.get('mail', [])
+        enabled = True
+        if 'userAccountControl' in user_data:
+            enabled = (int(user_data['userAccountControl'][0]) & 2) == 0
+
+        return {
+            'sAMAccountName': user_data.get('sAMAccountName', [''])[0],
+            'cn': user_data.get('cn', [''])[0],
+            'givenName': given_name_vals[0] if len(given_name_vals) > 0 else '',
+            'sn': sn_vals[0] if len(sn_vals) > 0 else '',
+            'mail': mail_vals[0] if len(mail_vals) > 0 else '',
+            'enabled': enabled
+        }
+
+    @staticmethod
+    def _group_from_entry(entry):
+        group_data = entry.entry_attributes_as_dict
+        desc_vals = group_data.get('description', [])
+        group_members = group_data.get('member', [])
+        if not isinstance(group_members, list):
+            group_members = [group_members]
+        # A DN listed in many groups is then held once instead of once per group
+        group_members = [sys.intern(member_dn) for member_dn in group_members]
+        return {
+            'cn': group_data.get('cn', [''])[0],
+            'description': desc_vals[0] if len(desc_vals) > 0 else '',
+            'member_count': len(group_members),
+            'members': group_members
+        }
+
+    @staticmethod
+    def _computer_from_entry(entry):
+        computer_data = entry.entry_attributes_as_dict
+        host_vals = computer_data.get('dNSHostName', [])
+        uac = int(computer_data['userAccountControl'][0]) if 'userAccountControl' in computer_data else 0
+        enabled = (uac & 2) == 0
+        return {
+            'name': computer_data.get('name', [''])[0],
+            'dnsHostName': host_vals[0] if len(host_vals) > 0 else '',
+            'status': 'Online' if enabled else 'Offline'
+        }
+
+    @staticmethod
+    def _domain_controller_from_entry(entry):
+        dc_data = entry.entry_attributes_as_dict
+        host_vals = dc_data.get('dNSHostName', [])
+        os_vals = dc_data.get('operatingSystem', [])
+        return {
+            'name': dc_data.get('name', [''])[0],
+            'dnsHostName': host_vals[0] if len(host_vals) > 0 else '',
+            'operatingSystem': os_vals[0] if len(os_vals) > 0 else ''
+        }
+
+    def iter_users(self, custom_filter=None, page_size=None, attributes=None):
+        """Yield AD users page by page using an optional custom LDAP filter.
+
+        ``attributes`` limits the records (and the LDAP attributes fetched)
+        to the given fields of RECORD_FIELDS['users'].
+        """
+        if custom_filter:
+            ldap_filter = f"(&{USER_FILTER}{custom_filter})"
         else:
-            current_app.logger.warning("Attempted to disconnect, but no active connection exists")
-    
-    def get_users(self, custom_filter=None):
+            ldap_filter = USER_FILTER
+
+        search_attributes = ldap_attributes('users', attributes) if attributes else USER_ATTRIBUTES
+        for entry in self.paged_search(ldap_filter, search_attributes, page_size=page_size):
+            yield project(self._user_from_entry(entry), attributes)
+
+    def get_users(self, custom_filter=None, attributes=None):
         """Get AD users using an optional custom LDAP filter."""
         try:
-            if not self.conn:
-                if not self.connect():
-                    return []
-            search_base = self.base_dn
-            if custom_filter:
-                ldap_filter = f"(&(objectClass=user)(objectCategory=person){custom_filter})"
-            else:
-                ldap_filter = '(&(objectClass=user)(objectCategory=person))'
-            attributes = ['sAMAccountName', 'cn', 'givenName', 'sn', 'mail', 'userAccountControl']
-
-            self.conn.search(search_base=search_base, search_filter=ldap_filter,
-                             search_scope=SUBTREE, attributes=attributes)
-
-            users = []
-            for entry in self.conn.entries:
-                user_data = entry.entry_attributes_as_dict
-
-                # Avoid list index errors by checking length
-                given_name_vals = user_data.get('givenName', [])
-                sn_vals = user_data.get('sn', [])
-                mail_vals = user_data.get('mail', [])
-                enabled = True
-                if 'userAccountControl' in user_data:
-                    enabled = (int(user_data['userAccountControl'][0]) & 2) == 0
-
-                users.append({
-                    'sAMAccountName': user_data.get('sAMAccountName', [''])[0],
-                    'cn': user_data.get('cn', [''])[0],
-                    'givenName': given_name_vals[0] if len(given_name_vals) > 0 else '',
-                    'sn': sn_vals[0] if len(sn_vals) > 0 else '',
-                    'mail': mail_vals[0] if len(mail_vals) > 0 else '',
-                    'enabled': enabled
-                })
-            return users
+            return list(self.iter_users(custom_filter, attributes=attributes))
+        except ValueError:
+            raise
         except Exception as e:
-            current_app.logger.error(f"Error fetching AD users: {str(e)}")
+            logger.error("Error fetching AD users: %s", e)
             # Return some mock data for testing when AD is not available
             return [
                 {'sAMAccountName': 'testuser1', 'cn': 'Test User 1', 'mail': 'testuser1@test.local', 'enabled': True},
                 {'sAMAccountName': 'testuser2', 'cn': 'Test User 2', 'mail': 'testuser2@test.local', 'enabled': False}
             ]
 
-    def get_groups(self):
+    def iter_groups(self, page_size=None, attributes=None):
+        """Yield AD groups page by page using SUBTREE search.
+
+        Leaving ``member_count`` and ``members`` out of ``attributes`` skips
+        transferring the member lists.
+        """
+        search_attributes = ldap_attributes('groups', attributes) if attributes else GROUP_ATTRIBUTES
+        for entry in self.paged_search(GROUP_FILTER, search_attributes, page_size=page_size):
+            group = self._group_from_entry(entry)
+            log_sampled(logger, logging.DEBUG, "Raw LDAP entry for group %s: %s", group['cn'], entry)
+            yield project(group, attributes)
+
+    def get_groups(self, attributes=None):
         """Get all AD groups using SUBTREE search."""
         try:
-            if not self.conn:
-                if not self.connect():
-                    return []
-            search_base = self.base_dn
-            ldap_filter = '(objectClass=group)'
-            attributes = ['cn', 'description', 'member']
-
-            self.conn.search(search_base=search_base, search_filter=ldap_filter,
-                             search_scope=SUBTREE, attributes=attributes)
-
-            groups = []
-            for entry in self.conn.entries:
-                group_data = entry.entry_attributes_as_dict
-                desc_vals = group_data.get('description', [])
-                group_members = group_data.get('member', [])
-                if not isinstance(group_members, list):
-                    group_members = [group_members]
-                current_app.logger.info(f"Raw LDAP entry for group: {entry}")
-                current_app.logger.info(f"Group {group_data.get('cn', [''])[0]} members: {group_members}")
-                if not group_members:
-                    current_app.logger.warning(f"Group {group_data.get('cn', [''])[0]} has no members")
-                else:
-                    current_app.logger.info(f"Group {group_data.get('cn', [''])[0]} members: {group_members}")
-                groups.append({
-                    'cn': group_data.get('cn', [''])[0],
-                    'description': desc_vals[0] if len(desc_vals) > 0 else '',
-                    'member_count': len(group_members),
-                    'members': group_members
-                })
-            return groups
+            return list(self.iter_groups(attributes=attributes))
+        except ValueError:
+            raise
         except Exception as e:
-            current_app.logger.error(f"Error fetching AD groups: {str(e)}")
+            logger.error("Error fetching AD groups: %s", e)
             # Return some mock data for testing when AD is not available
             return [
                 {'cn': 'Domain Admins', 'description': 'Domain Administrators', 'member_count': 3},
                 {'cn': 'Domain Users', 'description': 'All domain users', 'member_count': 15}
             ]
 
-    def get_computers(self):
+    def iter_computers(self, page_size=None, attributes=None):
+        """Yield AD computers page by page"""
+        search_attributes = ldap_attributes('computers', attributes) if attributes else COMPUTER_ATTRIBUTES
+        for entry in self.paged_search(COMPUTER_FILTER, search_attributes, page_size=page_size):
+            yield project(self._computer_from_entry(entry), attributes)
+
+    def get_computers(self, attributes=None):
         """Get AD computers using LDAP"""
         try:
-            if not self.conn:
-                if not self.connect():
-                    return []
-            ldap_filter = '(objectClass=computer)'
-            self.conn.search(self.base_dn, ldap_filter, SUBTREE,
-                             attributes=['name', 'dNSHostName', 'operatingSystem', 'userAccountControl'])
-
-            computers = []
-            for entry in self.conn.entries:
-                computer_data = entry.entry_attributes_as_dict
-                host_vals = computer_data.get('dNSHostName', [])
-                uac = int(computer_data['userAccountControl'][0]) if 'userAccountControl' in computer_data else 0
-                enabled = (uac & 2) == 0
-                computers.append({
-                    'name': computer_data.get('name', [''])[0],
-                    'dnsHostName': host_vals[0] if len(host_vals) > 0 else '',
-                    'status': 'Online' if enabled else 'Offline'
-                })
-            return computers
+            return list(self.iter_computers(attributes=attributes))
+        except ValueError:
+            raise
         except Exception as e:
-            current_app.logger.error(f"Error fetching AD computers: {str(e)}")
+            logger.error("Error fetching AD computers: %s", e)
             # Return some mock data for testing when AD is not available
             return [
                 {'name': 'DESKTOP-A1B2C3', 'dnsHostName': 'desktop-a1b2c3.test.local', 'status': 'Online'},
                 {'name': 'LAPTOP-X1Y2Z3', 'dnsHostName': 'laptop-x1y2z3.test.local', 'status': 'Offline'}
             ]
     
+    def iter_domain_controllers(self, page_size=None):
+        """Yield AD domain controllers page by page"""
+        for entry in self.paged_search(DC_FILTER, DC_ATTRIBUTES, page_size=page_size):
+            yield self._domain_controller_from_entry(entry)
+
     def get_domain_controllers(self):
         """Get AD domain controllers using LDAP"""
         try:
-            if not self.conn:
-                if not self.connect():
-                    return []
-            
-            # LDAP filter for domain controllers
-            ldap_filter = '(&(objectCategory=computer)(userAccountControl:1.2.840.113556.1.4.803:=8192))'
-            
-            # Execute search
-            self.conn.search(
-                search_base=self.base_dn,
-                search_filter=ldap_filter,
-                search_scope=SUBTREE,
-                attributes=['name', 'dNSHostName', 'operatingSystem']
-            )
-            
-            # Process results
-            dcs = []
-            for entry in self.conn.entries:
-                dc_data = entry.entry_attributes_as_dict
-                
-                dc = {
-                    'name': dc_data.get('name', [''])[0],
-                    'dnsHostName': dc_data.get('dNSHostName', [''])[0] if 'dNSHostName' in dc_data else '',
-                    'operatingSystem': dc_data.get('operatingSystem', [''])[0] if 'operatingSystem' in dc_data else ''
-                }
-                dcs.append(dc)
-            
-            return dcs
+            return list(self.iter_domain_controllers())
         except Exception as e:
-            current_app.logger.error(f"Error fetching AD domain controllers: {str(e)}")
+            logger.error("Error fetching AD domain controllers: %s", e)
             # Return some mock data for testing when AD is not available
             return [
                 {'name': 'DC01', 'dnsHostName': 'dc01.test.local', 'operatingSystem': 'Windows Server 2019'}
             ]
 
-    def get_dashboard_data(self):
-        """Aggregate data for the dashboard."""
-        try:
-            users = self.get_users()
-            groups = self.get_groups()
-            computers = self.get_computers()
-            domain_controllers = self.get_domain_controllers()
-
-            # Format user data for table display
-            user_details = []
-            for user in users[:10]:  # Limit to first 10 users for display
-                user_details.append({
-                    'Name': user.get('cn', ''),
-                    'Username': user.get('sAMAccountName', ''),
-                    'Email': user.get('mail', ''),
-                    'Status': 'Active' if user.get('enabled', False) else 'Disabled'
-                })
-
-            # Format group data for table display
-            group_details = []
-            for group in groups[:10]:  # Limit to first 10 groups
-                group_details.append({
-                    'Group Name': group.get('cn', ''),
-                    'Description': group.get('description', ''),
-                    'Members': str(group.get('member_count', 0))
-                })
-
-            # Format computer data for table display
-            computer_details = []
-            for computer in computers[:10]:  # Limit to first 10 computers
-                computer_details.append({
-                    'Computer Name': computer.get('name', ''),
-                    'IP Address': computer.get('dnsHostName', ''),
-                    'Status': computer.get('status', '')
-                })
+    def get_sync_watermark(self):
+        """Read the DC identity and highestCommittedUSN from the rootDSE.
+
+        USNs are local to one DC, so the watermark also records the DC's
+        NTDS Settings DN and invocationId; if either changes (other DC, or
+        the DC was restored from backup) old USNs are meaningless.
+        """
+        with self._connection() as conn:
+            conn.search('', '(objectClass=*)', BASE,
+                        attributes=['highestCommittedUSN', 'dsServiceName'])
+            if not conn.entries:
+                raise LDAPOperationResult(description='rootDSE not readable')
+            root = conn.entries[0].entry_attributes_as_dict
+            ds_service = root.get('dsServiceName', [''])[0]
+
+            invocation_id = ''
+            if ds_service:
+                conn.search(ds_service, '(objectClass=*)', BASE, attributes=['invocationId'])
+                if conn.entries:
+                    invocation_id = str(conn.entries[0].entry_attributes_as_dict.get('invocationId', [''])[0])
 
             return {
-                'users': len(users),
-                'groups': len(groups),
-                'computers': len(computers),
-                'domainControllers': len(domain_controllers),
-                'userDetails': user_details,
-                'groupDetails': group_details,
-                'computerDetails': computer_details
+                'server': ds_service,
+                'invocationId': invocation_id,
+                'usn': int(root.get('highestCommittedUSN', [0])[0])
             }
+
+    def iter_directory_changes(self, since_usn=None, page_size=None):
+        """Yield (kind, objectGUID, DN, record) for every object changed after ``since_usn``.
+
+        With ``since_usn=None`` every user, group and computer is returned,
+        which is what a full resync needs. Domain controllers are reported
+        as ``'domainControllers'`` in addition to ``'computers'``.
+        """
+        usn_filter = f"(uSNChanged>={since_usn + 1})" if since_usn is not None else ''
+        searches = [
+            ('users', USER_FILTER, USER_ATTRIBUTES, self._user_from_entry),
+            ('groups', GROUP_FILTER, GROUP_ATTRIBUTES, self._group_from_entry),
+            ('computers', COMPUTER_FILTER, COMPUTER_ATTRIBUTES, self._computer_from_entry),
+        ]
+        for kind, base_filter, attributes, formatter in searches:
+            ldap_filter = f"(&{base_filter}{usn_filter})" if usn_filter else base_filter
+            for entry in self.paged_search(ldap_filter, attributes + ['objectGUID'], page_size=page_size):
+                guid = str(entry.entry_attributes_as_dict.get('objectGUID', [entry.entry_dn])[0])
+                yield kind, guid, entry.entry_dn, formatter(entry)
+                if kind == 'computers':
+                    uac = entry.entry_attributes_as_dict.get('userAccountControl', [0])[0]
+                    # SERVER_TRUST_ACCOUNT marks a domain controller
+                    if int(uac) & 8192:
+                        yield 'domainControllers', guid, entry.entry_dn, self._domain_controller_from_entry(entry)
+
+    def iter_deleted_objects(self, since_usn, page_size=None):
+        """Yield objectGUIDs of tombstones created or changed after ``since_usn``."""
+        ldap_filter = f"(&(isDeleted=TRUE)(uSNChanged>={since_usn + 1}))"
+        controls = [(SHOW_DELETED_OID, True, None)]
+        for entry in self.paged_search(ldap_filter, ['objectGUID'], page_size=page_size, controls=controls):
+            yield str(entry.entry_attributes_as_dict.get('objectGUID', [entry.entry_dn])[0])
+
+    def _fetch_dashboard_sections(self, timeout):
+        """Run the dashboard searches concurrently, each on its own pooled connection.
+
+        Every branch counts its objects with a count-only search and reads
+        just the preview rows with the attributes the tables render, so no
+        full attribute lists (or group member arrays) are downloaded.
+        Returns ``(results, sections)``: ``(count, preview rows)`` of every
+        branch that finished in time, and a status entry per branch.
+        """
+        app = current_app._get_current_object()
+        capture, parent = current_capture(), current_span()
+        branches = {
+            'users': (USER_FILTER, lambda: self.iter_users(page_size=PREVIEW_ROWS, attributes=PREVIEW_FIELDS['users'])),
+            'groups': (GROUP_FILTER, lambda: self.iter_groups(page_size=PREVIEW_ROWS, attributes=PREVIEW_FIELDS['groups'])),
+            'computers': (COMPUTER_FILTER, lambda: self.iter_computers(page_size=PREVIEW_ROWS,
+                                                                       attributes=PREVIEW_FIELDS['computers'])),
+            'domainControllers': (DC_FILTER, None)
+        }
+
+        def run(branch):
+            ldap_filter, preview = branch
+            started = time.monotonic()
+            with app.app_context(), capture_scope(capture), span_scope(parent):
+                count = self.count_search(ldap_filter)
+                rows = []
+                if preview:
+                    # Only the first page is read; closing the generator returns the connection
+                    records = preview()
+                    try:
+                        rows = list(islice(records, PREVIEW_ROWS))
+                    finally:
+                        records.close()
+            return (count, rows), time.monotonic() - started
+
+        results, sections = {}, {}
+        executor = ThreadPoolExecutor(max_workers=len(branches))
+        try:
+            futures = {name: executor.submit(run, branch) for name, branch in branches.items()}
+            deadline = time.monotonic() + timeout
+            for name, future in futures.items():
+                try:
+                    result, elapsed = future.result(timeout=max(0, deadline - time.monotonic()))
+                except FutureTimeoutError:
+                    logger.error("Dashboard search for %s timed out after %ss", name, timeout)
+                    sections[name] = {'status': 'timeout', 'message': f'No answer within {timeout}s'}
+                except Exception as e:
+                    logger.error("Dashboard search for %s failed: %s", name, e)
+                    sections[name] = {'status': 'error', 'message': str(e)}
+                else:
+                    results[name] = result
+                    sections[name] = {'status': 'ok', 'count': result[0], 'duration': round(elapsed, 3)}
+        finally:
+            # Do not wait for branches that ran past their timeout
+            executor.shutdown(wait=False, cancel_futures=True)
+        return results, sections
+
+    def get_dashboard_data(self, timeout=None):
+        """Aggregate data for the dashboard.
+
+        Users, groups, computers and domain controllers are searched in
+        parallel with a per-branch timeout (AD_DASHBOARD_TIMEOUT). If some
+        branches fail the others are still returned, with ``sections`` and
+        ``partial`` telling which ones are missing; mock data is only used
+        when nothing could be read at all.
+        """
+        timeout = timeout or float(os.environ.get('AD_DASHBOARD_TIMEOUT', 30))
+        try:
+            results, sections = self._fetch_dashboard_sections(timeout)
+            if not results:
+                raise LDAPException('; '.join(f"{name}: {section['message']}" for name, section in sections.items()))
+
+            rows = {name: preview for name, (count, preview) in results.items()}
+            counts = {name: count for name, (count, preview) in results.items()}
+            data = build_dashboard_data(rows.get('users', []), rows.get('groups', []),
+                                        rows.get('computers', []), rows.get('domainControllers', []),
+                                        counts=counts)
+            data['sections'] = sections
+            data['partial'] = len(results) < len(sections)
+            return data
         except Exception as e:
-            current_app.logger.error(f"Error fetching dashboard data: {str(e)}")
+            logger.error("Error fetching dashboard data: %s", e)
             # Return mock data for testing
             return {
                 'users': 2,
@@ -293,237 +1183,515 @@ class ActiveDirectoryManager:
             }
 
     def create_user(self, username, first_name, last_name, password, email=None, ou_path=None):
-        """Create a new user in Active Directory using LDAP"""
+        """Create a new user in Active Directory using LDAP
+
+        The password and the enabled flag are sent with the add itself, so a
+        user costs one round trip and a password rejected by policy leaves
+        no half-created account behind (AD accepts unicodePwd on add over
+        LDAPS).
+        """
         try:
-            if not self.conn:
-                self.connect()
-            
-            # Set default path if not specified
-            if not ou_path:
-                ou_path = f"CN=Users,{self.base_dn}"
+            with self._connection(write=True) as conn:
+                # Set default path if not specified
+                if not ou_path:
+                    ou_path = f"CN=Users,{self.base_dn}"
             
-            # Create distinguished name for new user
-            user_dn = f"CN={first_name} {last_name},{ou_path}"
-            
-            # Define user attributes
-            user_attrs = {
-                'objectClass': ['top', 'person', 'organizationalPerson', 'user'],
-                'cn': f"{first_name} {last_name}",
-                'sAMAccountName': username,
-                'userPrincipalName': f"{username}@{self.domain}",
-                'givenName': first_name,
-                'sn': last_name,
-                'displayName': f"{first_name} {last_name}",
-                'userAccountControl': '512'  # Normal account, enabled
-            }
+                # Create distinguished name for new user
+                user_dn = f"CN={escape_rdn(f'{first_name} {last_name}')},{ou_path}"
             
-            if email:
-                user_attrs['mail'] = email
-            
-            # Add the user
-            self.conn.add(user_dn, attributes=user_attrs)
-            
-            if not self.conn.result['result'] == 0:
-                return False, f"Failed to create user: {self.conn.result['description']}"
+                # Define user attributes
+                user_attrs = {
+                    'objectClass': ['top', 'person', 'organizationalPerson', 'user'],
+                    'cn': f"{first_name} {last_name}",
+                    'sAMAccountName': username,
+                    'userPrincipalName': f"{username}@{self.domain}",
+                    'givenName': first_name,
+                    'sn': last_name,
+                    'displayName': f"{first_name} {last_name}",
+                    'unicodePwd': '"{}"'.format(password).encode('utf-16-le'),
+                    'userAccountControl': '512'  # Normal account, enabled
+                }
             
-            # Set the password
-            encoded_password = '"{}"'.format(password).encode('utf-16-le')
-            self.conn.modify(
-                user_dn,
-                {'unicodePwd': [(MODIFY_REPLACE, [encoded_password])]}
-            )
+                if email:
+                    user_attrs['mail'] = email
             
-            if not self.conn.result['result'] == 0:
-                return False, f"User created but failed to set password: {self.conn.result['description']}"
+                # Add the user
+                conn.add(user_dn, attributes=user_attrs)
             
-            # Enable the account
-            self.conn.modify(
-                user_dn,
-                {'userAccountControl': [(MODIFY_REPLACE, ['512'])]}  # Normal account, enabled
-            )
+                if conn.result['result'] == RESULT_ENTRY_ALREADY_EXISTS:
+                    return False, "A user with this name already exists"
+                if not conn.result['result'] == 0:
+                    return False, f"Failed to create user: {conn.result['description']}"
             
-            return True, "User created successfully"
+                dn_cache.put('user', username, user_dn)
+                response_cache.invalidate('users')
+                return True, "User created successfully"
         except LDAPEntryAlreadyExistsResult:
             return False, "A user with this name already exists"
         except Exception as e:
-            current_app.logger.error(f"Error creating AD user: {str(e)}")
+            logger.error("Error creating AD user: %s", e)
             return False, str(e)
     
+    def _lookup(self, conn, kind, name, attributes):
+        """Return the entry of a user (by sAMAccountName) or group (by cn).
+
+        For callers that need attributes of the object; writes that only
+        need the DN use _write_by_name(). A cached DN is read with a BASE
+        search, which is all a cache hit costs. If the object was renamed
+        or moved since it was cached, it is followed by objectGUID;
+        otherwise a single indexed SUBTREE search resolves the name and
+        refreshes the cache.
+        """
+        cached = dn_cache.get(kind, name)
+        if cached:
+            dn, guid = cached
+            entry_attributes = list(attributes) + [NAMING_ATTRIBUTES[kind], 'objectGUID']
+            conn.search(dn, '(objectClass=*)', BASE, attributes=entry_attributes)
+            if conn.entries and self._has_name(conn.entries[0], kind, name):
+                return conn.entries[0]
+            dn_cache.invalidate_dn(dn)
+            entry = self._find_by_guid(conn, kind, name, dn, guid, attributes)
+            if entry is not None:
+                return entry
+        return self._find_by_name(conn, kind, name, attributes)
+
+    @staticmethod
+    def _has_name(entry, kind, name):
+        values = entry.entry_attributes_as_dict.get(NAMING_ATTRIBUTES[kind], [])
+        return bool(values) and str(values[0]).lower() == name.lower()
+
+    def _find_by_guid(self, conn, kind, name, old_dn, guid, attributes):
+        """Entry of a cached object that left ``old_dn``, found by objectGUID, or None."""
+        if not guid:
+            return None
+        attributes = list(attributes) + [NAMING_ATTRIBUTES[kind], 'objectGUID']
+        conn.search(f"<GUID={guid.strip('{}')}>", '(objectClass=*)', BASE, attributes=attributes)
+        if not conn.entries or not self._has_name(conn.entries[0], kind, name):
+            return None
+        entry = conn.entries[0]
+        logger.info("%s %s moved from %s to %s", kind, name, old_dn, entry.entry_dn)
+        dn_cache.put(kind, name, entry.entry_dn, guid)
+        return entry
+
+    def _find_by_name(self, conn, kind, name, attributes):
+        """Entry of a user or group found with one indexed SUBTREE search, or None; caches its DN."""
+        attributes = list(attributes) + [NAMING_ATTRIBUTES[kind], 'objectGUID']
+        if kind == 'user':
+            ldap_filter = f"(sAMAccountName={escape_filter_chars(name)})"
+        else:
+            ldap_filter = f"(&(objectClass=group)(cn={escape_filter_chars(name)}))"
+        conn.search(self.base_dn, ldap_filter, SUBTREE, attributes=attributes)
+        if len(conn.entries) == 0:
+            return None
+        entry = conn.entries[0]
+        guid_vals = entry.entry_attributes_as_dict.get('objectGUID', [])
+        dn_cache.put(kind, name, entry.entry_dn, str(guid_vals[0]) if guid_vals else None)
+        return entry
+
+    def _write_by_name(self, conn, objects, write):
+        """Call ``write(*dns)`` with the DNs of ``objects``, (kind, name) pairs of users and groups.
+
+        DNs are taken straight from dn_cache, so a cache hit costs no read.
+        If the DC answers noSuchObject, a cached object was renamed, moved
+        or deleted elsewhere: its cache entries are dropped, it is found
+        again by objectGUID (else by name) and the write is retried once.
+        Returns the (kind, name) pair that does not exist, or None once
+        ``write`` has run; its outcome is in conn.result.
+        """
+        targets = []  # (dn, guid, from cache)
+        for kind, name in objects:
+            cached = dn_cache.get(kind, name)
+            if cached is None:
+                entry = self._find_by_name(conn, kind, name, [])
+                if entry is None:
+                    return kind, name
+                targets.append((entry.entry_dn, None, False))
+            else:
+                targets.append((cached[0], cached[1], True))
+
+        write(*[dn for dn, _, _ in targets])
+        if conn.result['result'] != RESULT_NO_SUCH_OBJECT or not any(hit for _, _, hit in targets):
+            return None
+
+        dns = []
+        for (kind, name), (dn, guid, hit) in zip(objects, targets):
+            if hit:
+                dn_cache.invalidate_dn(dn)
+                entry = (self._find_by_guid(conn, kind, name, dn, guid, []) or
+                         self._find_by_name(conn, kind, name, []))
+                if entry is None:
+                    return kind, name
+                dn = entry.entry_dn
+            dns.append(dn)
+        write(*dns)
+        return None
+
+    def _set_user_enabled(self, conn, username, enabled, entry=None):
+        """Clear (``enabled``) or set ACCOUNTDISABLE on a user.
+
+        ``entry`` is the user's entry with userAccountControl if it was
+        already read, e.g. by a batch; otherwise it is looked up here.
+        """
+        if entry is None:
+            entry = self._lookup(conn, 'user', username, ['userAccountControl'])
+        if entry is None:
+            logger.error("User %s not found", username)
+            return False, f"User {username} not found"
+        logger.debug("Search results for %s: %s", username, entry)
+        
+        # Get current UAC value
+        current_uac = int(entry.userAccountControl.value)
+        
+        # Bit 2 (value 2) disables the account
+        if enabled:
+            new_uac = current_uac & ~2
+            logger.info("Enabling user %s: Current UAC=%s, New UAC=%s", username, current_uac, new_uac)
+        else:
+            new_uac = current_uac | 2
+        
+        # Update the account
+        conn.modify(
+            entry.entry_dn,
+            {'userAccountControl': [(MODIFY_REPLACE, [str(new_uac)])]}
+        )
+        
+        if conn.result['result'] == 0:
+            response_cache.invalidate('users')
+            return True, f"User {'enabled' if enabled else 'disabled'} successfully"
+        else:
+            return False, f"Failed to {'enable' if enabled else 'disable'} user: {conn.result['description']}"
+
     def disable_user(self, username):
-        """Disable a user account in Active Directory using LDAP"""
+        """Disable a user account in Active Directory using LDAP
+
+        Connection errors propagate, so the pool (or a batch worker) can
+        drop the connection; other failures come back as (False, message).
+        """
         try:
-            if not self.conn:
-                self.connect()
-            
-            # Find the user DN
-            user_filter = f"(sAMAccountName={username})"
-            search_base = self.base_dn
-            
-            self.conn.search(
-                search_base=search_base,
-                search_filter=user_filter,
-                search_scope=SUBTREE,
-                attributes=['userAccountControl']
-            )
-            
-            if len(self.conn.entries) == 0:
-                current_app.logger.error(f"User {username} not found in search results: {self.conn.entries}")
-                return False, f"User {username} not found"
-            current_app.logger.info(f"Search results for {username}: {self.conn.entries}")
-                
-            user_dn = self.conn.entries[0].entry_dn
-            
-            # Get current UAC value
-            current_uac = self.conn.entries[0].userAccountControl.value
-            
-            # Set bit 2 (value 2) to disable account
-            new_uac = current_uac | 2
-            
-            # Update the account
-            self.conn.modify(
-                user_dn,
-                {'userAccountControl': [(MODIFY_REPLACE, [str(new_uac)])]}
-            )
-            
-            if self.conn.result['result'] == 0:
-                return True, "User disabled successfully"
-            else:
-                return False, f"Failed to disable user: {self.conn.result['description']}"
+            with self._connection(write=True) as conn:
+                return self._set_user_enabled(conn, username, False)
+        except CONNECTION_ERRORS:
+            raise
         except Exception as e:
-            current_app.logger.error(f"Error disabling AD user: {str(e)}")
+            logger.error("Error disabling AD user: %s", e)
             return False, str(e)
     
     def enable_user(self, username):
-        """Enable a user account in Active Directory using LDAP"""
+        """Enable a user account in Active Directory using LDAP (errors as in disable_user())"""
         try:
-            if not self.conn:
-                self.connect()
-            
-            # Find the user DN
-            user_filter = f"(sAMAccountName={username})"
-            search_base = self.base_dn
-            
-            self.conn.search(
-                search_base=search_base,
-                search_filter=user_filter,
-                search_scope=SUBTREE,
-                attributes=['userAccountControl']
-            )
-            
-            if len(self.conn.entries) == 0:
-                current_app.logger.error(f"User {username} not found in search results")
-                return False, f"User {username} not found"
-            current_app.logger.info(f"Search results for {username}: {self.conn.entries}")
-                
-            user_dn = self.conn.entries[0].entry_dn
-            
-            # Get current UAC value
-            current_uac = self.conn.entries[0].userAccountControl.value
-            
-            # Clear bit 2 (value 2) to enable account
-            new_uac = current_uac & ~2  # Clear bit 2 to enable account
-            current_app.logger.info(f"Enabling user {username}: Current UAC={current_uac}, New UAC={new_uac}")
-            
-            # Update the account
-            self.conn.modify(
-                user_dn,
-                {'userAccountControl': [(MODIFY_REPLACE, [str(new_uac)])]}
-            )
-            
-            if self.conn.result['result'] == 0:
-                return True, "User enabled successfully"
-            else:
-                return False, f"Failed to enable user: {self.conn.result['description']}"
+            with self._connection(write=True) as conn:
+                return self._set_user_enabled(conn, username, True)
+        except CONNECTION_ERRORS:
+            raise
         except Exception as e:
-            current_app.logger.error(f"Error enabling AD user: {str(e)}")
+            logger.error("Error enabling AD user: %s", e)
             return False, str(e)
     
     def reset_password(self, username, new_password):
-        """Reset a user's password in Active Directory using LDAP"""
+        """Reset a user's password in Active Directory using LDAP (errors as in disable_user())"""
         try:
-            if not self.conn:
-                self.connect()
+            with self._connection(write=True) as conn:
+                # Set the new password
+                encoded_password = ('"' + new_password + '"').encode('utf-16-le')
+                changes = {'unicodePwd': [(MODIFY_REPLACE, [encoded_password])]}
+                logger.info("Resetting password for %s", username)
             
-            # Check if username is a DN; if not, fetch the DN
-            if ',' not in username:  # Simple check for DN format
-                user_filter = f"(sAMAccountName={username})"
-                self.conn.search(
-                    search_base=self.base_dn,
-                    search_filter=user_filter,
-                    search_scope=SUBTREE,
-                    attributes=['distinguishedName']
-                )
-                if len(self.conn.entries) == 0:
+                # Use username directly if it is a DN; otherwise write to its (cached) DN
+                if ',' in username:  # Simple check for DN format
+                    conn.modify(username, changes)
+                elif self._write_by_name(conn, [('user', username)], lambda dn: conn.modify(dn, changes)):
                     return False, f"User {username} not found"
-                username = self.conn.entries[0].entry_dn
-            
-            # Set the new password
-            encoded_password = ('"' + new_password + '"').encode('utf-16-le')
-            current_app.logger.info(f"Resetting password for {username} with encoded password: {encoded_password}")
-            self.conn.modify(
-                username,
-                {'unicodePwd': [(MODIFY_REPLACE, [encoded_password])]}
-            )
             
-            if self.conn.result['result'] == 0:
-                return True, "Password reset successfully"
-            else:
-                return False, f"Failed to reset password: {self.conn.result['description']}"
+                if conn.result['result'] == 0:
+                    response_cache.invalidate('users')
+                    return True, "Password reset successfully"
+                else:
+                    return False, f"Failed to reset password: {conn.result['description']}"
+        except CONNECTION_ERRORS:
+            raise
         except Exception as e:
-            current_app.logger.error(f"Error resetting AD user password: {str(e)}")
+            logger.error("Error resetting AD user password: %s", e)
             return False, str(e)
 
     def add_user_to_group(self, username, group_name):
         """Add a user to an AD group using LDAP"""
         try:
-            if not self.conn:
-                self.connect()
-            
-            # Find the user DN
-            user_filter = f"(sAMAccountName={username})"
-            search_base = f"CN=Users,{self.base_dn}"
-            
-            self.conn.search(
-                search_base=search_base,
-                search_filter=user_filter,
-                search_scope=SUBTREE,
-                attributes=['distinguishedName']
-            )
-            
-            if len(self.conn.entries) == 0:
-                return False, f"User {username} not found"
-                
-            user_dn = self.conn.entries[0].entry_dn
-            
-            # Find the group DN
-            group_filter = f"(cn={group_name})"
-            self.conn.search(
-                search_base=self.base_dn,
-                search_filter=group_filter,
-                search_scope=SUBTREE,
-                attributes=['member']
-            )
-            
-            if len(self.conn.entries) == 0:
-                return False, f"Group {group_name} not found"
-            
-            group_dn = self.conn.entries[0].entry_dn
-            
-            # Check if user is already a member
-            group_members = self.conn.entries[0].member.values
-            if user_dn in group_members:
-                return True, f"User is already a member of {group_name}"
-            
-            # Add user to group
-            self.conn.modify(
-                group_dn,
-                {'member': [(MODIFY_REPLACE, group_members + [user_dn])]}
-            )
+            with self._connection(write=True) as conn:
+                # Add just this value instead of rewriting the whole member list;
+                # the DC rejects duplicates, which tells us the user is already in
+                missing = self._write_by_name(
+                    conn, [('user', username), ('group', group_name)],
+                    lambda user_dn, group_dn: conn.modify(group_dn, {'member': [(MODIFY_ADD, [user_dn])]})
+                )
+                if missing == ('user', username):
+                    return False, f"User {username} not found"
+                if missing:
+                    return False, f"Group {group_name} not found"
             
-            if self.conn.result['result'] == 0:
-                return True, f"User added to {group_name} successfully"
-            else:
-                return False, f"Failed to add user to group: {self.conn.result['description']}"
+                if conn.result['result'] == 0:
+                    response_cache.invalidate('groups')
+                    return True, f"User added to {group_name} successfully"
+                elif conn.result['result'] in (RESULT_ATTRIBUTE_OR_VALUE_EXISTS, RESULT_ENTRY_ALREADY_EXISTS):
+                    return True, f"User is already a member of {group_name}"
+                else:
+                    return False, f"Failed to add user to group: {conn.result['description']}"
+        except Exception as e:
+            logger.error("Error adding user to group: %s", e)
+            return False, str(e)
+
+    def remove_user_from_group(self, user_dn, group_name):
+        """Remove a member (by DN) from an AD group using LDAP"""
+        try:
+            with self._connection(write=True) as conn:
+                missing = self._write_by_name(
+                    conn, [('group', group_name)],
+                    lambda group_dn: conn.modify(group_dn, {'member': [(MODIFY_DELETE, [user_dn])]})
+                )
+                if missing:
+                    return False, f"Group {group_name} not found"
+
+                if conn.result['result'] == 0:
+                    response_cache.invalidate('groups')
+                    return True, f"Member removed from {group_name} successfully"
+                else:
+                    return False, f"Failed to remove member from group: {conn.result['description']}"
         except Exception as e:
-            current_app.logger.error(f"Error adding user to group: {str(e)}")
+            logger.error("Error removing user from group: %s", e)
             return False, str(e)
+
+    def iter_group_members(self, group_name, page_size=None):
+        """Yield pages of resolved members for a single group.
+
+        Only the requested group is read. Its ``member`` attribute is walked
+        with ``member;range=`` retrieval, so groups above the DC's
+        MaxValRange (1500) come back complete, and every page of member DNs
+        is resolved to display name and sAMAccountName with one search.
+        Raises LDAPNoSuchObjectResult when the group does not exist.
+        """
+        page_size = page_size or self.page_size
+        with self._connection() as conn:
+            group_entry = self._lookup(conn, 'group', group_name, [])
+            if group_entry is None:
+                raise LDAPNoSuchObjectResult(description=f"Group {group_name} not found")
+            group_dn = group_entry.entry_dn
+
+            # Range steps are driven by hand so each chunk can be yielded. With
+            # auto_range off, ldap3's empty_attributes handling deletes the plain
+            # 'member' attribute whenever a ;range= one comes back, which fails
+            # (KeyError) on the later steps that return only the ranged one
+            auto_range, empty_attributes = conn.auto_range, conn.empty_attributes
+            conn.auto_range = conn.empty_attributes = False
+            try:
+                attribute = 'member'
+                while attribute:
+                    conn.search(group_dn, '(objectClass=*)', BASE, attributes=[attribute])
+                    if not conn.response:
+                        break
+                    attributes = conn.response[0].get('attributes', {})
+                    member_dns, attribute = [], None
+                    for name, values in attributes.items():
+                        if name.lower() == 'member':
+                            member_dns = values
+                        elif name.lower().startswith('member;range='):
+                            member_dns = values
+                            high = name.split('=', 1)[1].split('-', 1)[1]
+                            if high != '*':
+                                attribute = f"member;range={int(high) + 1}-*"
+                    if not isinstance(member_dns, list):
+                        member_dns = [member_dns]
+
+                    for i in range(0, len(member_dns), page_size):
+                        yield self._resolve_member_dns(conn, member_dns[i:i + page_size])
+            finally:
+                conn.auto_range, conn.empty_attributes = auto_range, empty_attributes
+
+    def _resolve_member_dns(self, conn, member_dns):
+        """Resolve a batch of DNs to name and sAMAccountName in one query"""
+        ldap_filter = '(|' + ''.join(f"(distinguishedName={escape_filter_chars(dn)})" for dn in member_dns) + ')'
+        conn.search(self.base_dn, ldap_filter, SUBTREE,
+                    attributes=['displayName', 'cn', 'sAMAccountName', 'objectClass'])
+        found = {}
+        for entry in conn.entries:
+            data = entry.entry_attributes_as_dict
+            display_vals = data.get('displayName', []) or data.get('cn', [])
+            sam_vals = data.get('sAMAccountName', [])
+            classes = [str(c).lower() for c in data.get('objectClass', [])]
+            found[entry.entry_dn.lower()] = {
+                'name': display_vals[0] if len(display_vals) > 0 else '',
+                'sAMAccountName': sam_vals[0] if len(sam_vals) > 0 else '',
+                'type': 'group' if 'group' in classes else 'computer' if 'computer' in classes else 'user'
+            }
+
+        members = []
+        for dn in member_dns:
+            # Members outside the base DN (e.g. foreign security principals) keep their RDN
+            info = found.get(dn.lower()) or {'name': dn.split(',', 1)[0].split('=', 1)[-1],
+                                             'sAMAccountName': '', 'type': 'unknown'}
+            members.append(dict(info, dn=dn))
+        return members
+
+    def get_group_members(self, group_name):
+        """Get all resolved members of one group, or None if it does not exist"""
+        try:
+            members = []
+            for page in self.iter_group_members(group_name):
+                members.extend(page)
+            return members
+        except LDAPNoSuchObjectResult:
+            return None
+
+    def run_user_operation(self, operation):
+        """Run one {username, action, ...} operation; returns (success, message)"""
+        username = operation.get('username')
+        action = operation.get('action')
+        if not username:
+            return False, 'Username is required'
+        if action == 'enable':
+            return self.enable_user(username)
+        elif action == 'disable':
+            return self.disable_user(username)
+        elif action == 'reset_password':
+            password = operation.get('password')
+            if not password:
+                return False, 'Password is required for reset'
+            return self.reset_password(username, password)
+        return False, f'Invalid action: {action}'
+
+    def _resolve_users(self, conn, usernames):
+        """Read many users with one OR-filter search; returns {lower-case sAMAccountName: entry}.
+
+        Entries carry userAccountControl for enable/disable, and their DNs
+        go into dn_cache like a _lookup() would put them.
+        """
+        if not usernames:
+            return {}
+        ldap_filter = '(|' + ''.join(f"(sAMAccountName={escape_filter_chars(name)})" for name in usernames) + ')'
+        conn.search(self.base_dn, ldap_filter, SUBTREE,
+                    attributes=['sAMAccountName', 'objectGUID', 'userAccountControl'])
+        entries = {}
+        for entry in conn.entries:
+            values = entry.entry_attributes_as_dict
+            name = str(values.get('sAMAccountName', [''])[0])
+            guid_vals = values.get('objectGUID', [])
+            dn_cache.put('user', name, entry.entry_dn, str(guid_vals[0]) if guid_vals else None)
+            entries[name.lower()] = entry
+        return entries
+
+    def _run_batched_operation(self, conn, operation, entries):
+        """run_user_operation() with the users already read by _resolve_users()."""
+        username = operation.get('username')
+        action = operation.get('action')
+        if username and action in ('enable', 'disable'):
+            entry = entries.get(username.lower())
+            if entry is None:
+                return False, f"User {username} not found"
+            return self._set_user_enabled(conn, username, action == 'enable', entry)
+        # Password resets write straight to the DN the search just cached
+        return self.run_user_operation(operation)
+
+    def batch_user_operations(self, operations, workers=None):
+        """Run many user operations over a small set of pinned pooled connections.
+
+        Workers take the operations in chunks of AD_BATCH_CHUNK. A chunk
+        starts with one OR-filter search reading all of its users that are
+        not in the DN cache, or need their userAccountControl. Then its
+        modifies go out one after the other on the same connection, so an
+        operation costs about one round trip. After a connection error the
+        connection is dropped and the rest of the chunk runs on a fresh
+        one; the operation in flight is reported failed, since it may or
+        may not have been applied. Results come back in input order.
+        """
+        workers = workers or int(os.environ.get('AD_BATCH_WORKERS', 4))
+        pool_size = self.pool.size if self.pool else int(os.environ.get('AD_POOL_SIZE', 5))
+        workers = max(1, min(workers, pool_size, len(operations)))
+        # Operations per chunk, but spread so every worker gets some
+        chunk_size = int(os.environ.get('AD_BATCH_CHUNK', 50))
+        chunk_size = max(1, min(chunk_size, -(-len(operations) // workers)))
+        results = [None] * len(operations)
+        pending = deque(range(len(operations)))
+        pending_lock = threading.Lock()
+        app = current_app._get_current_object()
+        capture, parent = current_capture(), current_span()
+
+        def record(index, success, message):
+            operation = operations[index]
+            results[index] = {
+                'index': index,
+                'username': operation.get('username'),
+                'action': operation.get('action'),
+                'success': success,
+                'message': message
+            }
+
+        def needs_search(operation):
+            username = operation.get('username')
+            if not username:
+                return False
+            if operation.get('action') in ('enable', 'disable'):
+                return True
+            return (operation.get('action') == 'reset_password' and ',' not in username and
+                    dn_cache.get('user', username) is None)
+
+        def run_chunk(remaining):
+            retried = False
+            while remaining:
+                in_flight = None
+                try:
+                    with self.pinned_connection(write=True) as conn:
+                        entries = self._resolve_users(conn, sorted({
+                            operations[index]['username'] for index in remaining if needs_search(operations[index])
+                        }))
+                        while remaining:
+                            in_flight = remaining[0]
+                            try:
+                                success, message = self._run_batched_operation(conn, operations[in_flight], entries)
+                            except CONNECTION_ERRORS:
+                                raise
+                            except Exception as e:
+                                success, message = False, str(e)
+                            record(remaining.popleft(), success, message)
+                            in_flight = None
+                except CONNECTION_ERRORS as e:
+                    # Leaving the pinned scope with the error made the pool drop the connection
+                    logger.warning("Batch connection failed, %s operations left in chunk: %s", len(remaining), e)
+                    if in_flight is not None:
+                        record(remaining.popleft(), False, str(e))
+                    elif retried:
+                        # No connection could be borrowed and used again
+                        for index in remaining:
+                            record(index, False, str(e))
+                        return
+                    retried = in_flight is None
+
+        def work():
+            with app.app_context(), capture_scope(capture), span_scope(parent):
+                while True:
+                    with pending_lock:
+                        chunk = deque(pending.popleft() for _ in range(min(chunk_size, len(pending))))
+                    if not chunk:
+                        return
+                    run_chunk(chunk)
+
+        errors = []
+        if operations:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for future in [executor.submit(work) for _ in range(workers)]:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        errors.append(str(e))
+
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = {
+                    'index': index,
+                    'username': operations[index].get('username'),
+                    'action': operations[index].get('action'),
+                    'success': False,
+                    'message': errors[0] if errors else 'Operation was not processed'
+                }
+        return results
+
+
+# LDAP metrics are labelled with the manager method that issued the operation
+register_methods(ActiveDirectoryManager)
@@ -0,0 +1,552 @@
+import argparse
+import gzip
+import http.cookiejar
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+from ad_benchmark import BENCH_DOMAIN, mock_manager, percentile, synthetic_directory
+from ad_conn import ActiveDirectoryManager
+from generate_test_data import SyntheticDirectory, read_fixture
+
+LOADTEST_NAME = 'Load Test'
+LOADTEST_EMAIL = f'loadtest@{BENCH_DOMAIN}'
+LOADTEST_PASSWORD = 'Load-Test-Passw0rd'
+# Written by the server into its working directory: names the clients pick from
+FIXTURE_FILE = 'loadtest_fixture.json'
+FIXTURE_SAMPLE = 1000
+DEFAULT_SCENARIOS = 'dashboard=10,browse=4,writes=1'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def highest_usn(entries, top):
+    """Pass ``entries`` through, keeping the highest uSNChanged seen in ``top[0]``."""
+    for dn, attributes in entries:
+        if 'uSNChanged' in attributes:
+            top[0] = max(top[0], int(attributes['uSNChanged']))
+        yield dn, attributes
+
+
+def stub_sync_source(host, usn):
+    """Let the synced directory view run on the mock, which has no rootDSE and no tombstones.
+
+    The watermark names one fixed DC at the directory's highest USN, so
+    the first sync is a full one and later ones are incremental uSNChanged
+    searches, as against a DC. Tombstones are searched without
+    LDAP_SERVER_SHOW_DELETED_OID, which the mock cannot decode. Writes do
+    not bump uSNChanged in the mock; they only make the view re-sync.
+    """
+    watermark = {'server': f'CN=NTDS Settings,CN={host}', 'invocationId': host, 'usn': usn}
+
+    def get_sync_watermark(manager):
+        return dict(watermark)
+
+    def iter_deleted_objects(manager, since_usn, page_size=None):
+        ldap_filter = f"(&(isDeleted=TRUE)(uSNChanged>={since_usn + 1}))"
+        for entry in manager.paged_search(ldap_filter, ['objectGUID'], page_size=page_size):
+            yield str(entry.entry_attributes_as_dict.get('objectGUID', [entry.entry_dn])[0])
+
+    ActiveDirectoryManager.get_sync_watermark = get_sync_watermark
+    ActiveDirectoryManager.iter_deleted_objects = iter_deleted_objects
+
+
+def delay_mock_directory(seconds):
+    """Make every LDAP operation on the mock directory wait ``seconds``, like a round trip to a remote DC."""
+    from ldap3.strategy.mockBase import MockBaseStrategy
+    send = MockBaseStrategy.send
+
+    def delayed(strategy, *args, **kwargs):
+        time.sleep(seconds)
+        return send(strategy, *args, **kwargs)
+    MockBaseStrategy.send = delayed
+
+
+def serve(args):
+    """Run the app on a mock directory and a local SQLite database (the ``serve`` command).
+
+    Started by ``run`` in a scratch working directory, so ad_data/,
+    logs/ and users.db of the load test stay out of the checkout. The
+    list APIs are served from the synced directory view, as in production
+    (see stub_sync_source()).
+    """
+    if args.fixture:
+        header, entries = read_fixture(args.fixture)
+        directory = SyntheticDirectory.from_parameters(header['parameters'])
+    else:
+        directory = synthetic_directory(args.directory_users, args.seed)
+        entries = directory.entries('mock')
+    host = f'loadtest.{directory.domain}'
+    os.environ.update(AD_DOMAIN_CONTROLLER=host, AD_DOMAIN=directory.domain, AD_USERNAME=directory.admin_dn,
+                      AD_PASSWORD=directory.admin_password)
+    os.environ.setdefault('AD_DB_BACKEND', 'sqlite')
+    top_usn = [0]
+    mock_manager(highest_usn(entries, top_usn), host, directory.domain, directory.admin_dn,
+                 directory.admin_password)
+    stub_sync_source(host, top_usn[0])
+    if args.dc_latency:
+        delay_mock_directory(args.dc_latency / 1000)
+
+    rng = random.Random(args.seed)
+    with open(FIXTURE_FILE, 'w') as f:
+        json.dump({
+            'usernames': [directory.username(i)
+                          for i in rng.sample(range(directory.users), min(FIXTURE_SAMPLE, directory.users))],
+            'groups': [cn for cn, size in directory.group_sizes().items() if size <= 50][:FIXTURE_SAMPLE]
+        }, f)
+
+    # Imported only now: the app reads the environment set up above
+    import app as webapp
+
+    if not args.no_collector:
+        webapp.start_background_threads()
+    print(f"Serving on http://127.0.0.1:{args.port} ({'ASGI' if args.asgi else 'WSGI'}) with "
+          f"{directory.users} directory users", flush=True)
+    if args.asgi:
+        import uvicorn
+        from ad_asgi import application
+        uvicorn.run(application, host='127.0.0.1', port=args.port, lifespan='off', log_level='warning')
+        return
+    from werkzeug.serving import make_server
+    make_server('127.0.0.1', args.port, webapp.app, threaded=True).serve_forever()
+
+
+class Client:
+    """One virtual admin: its own cookie session against the app."""
+
+    def __init__(self, base_url, recorder, timeout, cookies=None):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.timeout = timeout
+        self.cookies = cookies if cookies is not None else http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def request(self, method, path, label=None, body=None, record=True):
+        """Send one request and record its latency under ``label``; returns (status, parsed JSON or None)."""
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Accept-Encoding': 'gzip', 'Accept': 'application/json'}
+        if data is not None:
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        started = time.perf_counter()
+        status, payload, encoding = 0, None, None
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                status, payload = response.status, response.read()
+                encoding = response.headers.get('Content-Encoding')
+        except urllib.error.HTTPError as e:
+            status, payload = e.code, e.read()
+        except OSError:
+            pass  # refused, reset or timed out: recorded as status 0
+        if record:
+            self.recorder.add(f'{method} {label or path}', time.perf_counter() - started, status)
+        if not payload:
+            return status, None
+        try:
+            return status, json.loads(gzip.decompress(payload) if encoding == 'gzip' else payload)
+        except ValueError:
+            return status, None
+
+    def login(self, email, password, record=False):
+        status, payload = self.request('POST', '/login', body={'email': email, 'password': password},
+                                       record=record)
+        return status == 200 and bool(payload and payload.get('success'))
+
+
+class Recorder:
+    """Collects (finished, label, seconds, status) of every request from all client threads."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.samples = []
+
+    def add(self, label, seconds, status):
+        with self.lock:
+            self.samples.append((time.perf_counter() - self.started, label, seconds, status))
+
+    def since(self, offset):
+        with self.lock:
+            return [sample for sample in self.samples if sample[0] >= offset]
+
+
+def is_error(status):
+    return status == 0 or status >= 400
+
+
+class ProcessSampler(threading.Thread):
+    """Samples CPU share, RSS and threads of the server process from /proc (Linux) every ``interval`` seconds."""
+
+    def __init__(self, pid, interval):
+        super().__init__(name='loadtest-sampler', daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+        self.available = os.path.exists(f'/proc/{pid}/stat')
+
+    def read(self):
+        with open(f'/proc/{self.pid}/stat') as f:
+            # Fields after the command name: state is first, utime and stime are 12th and 13th
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{self.pid}/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        # num_threads is the 18th field after the command name
+        return cpu_seconds, resident_pages * os.sysconf('SC_PAGE_SIZE'), int(fields[17])
+
+    def run(self):
+        if not self.available:
+            return
+        started = time.perf_counter()
+        last_time, (last_cpu, _, _) = started, self.read()
+        while not self.stopped.wait(self.interval):
+            try:
+                cpu, rss, threads = self.read()
+            except (OSError, ValueError):
+                return  # server exited
+            now = time.perf_counter()
+            self.samples.append({'t': round(now - started, 1),
+                                 'cpuPercent': round((cpu - last_cpu) / (now - last_time) * 100, 1),
+                                 'rssBytes': rss, 'threads': threads})
+            last_time, last_cpu = now, cpu
+
+
+def dashboard(client, fixture, rng, args):
+    """A dashboard tab polling the aggregated data."""
+    client.request('GET', '/api/dashboard-data')
+
+
+def browse(client, fixture, rng, args):
+    """An admin clicking through the user, group and computer tabs."""
+    tab = rng.choice(('users', 'users', 'groups', 'computers', 'members'))
+    if tab == 'members' and fixture['groups']:
+        group = rng.choice(fixture['groups'])
+        client.request('GET', f'/api/ad/group/{urllib.parse.quote(group)}/members',
+                       label='/api/ad/group/<group_name>/members')
+        return
+    if tab == 'members':
+        tab = 'users'
+    query = f'limit={args.page_size}'
+    if rng.random() < 0.3:
+        query += '&sort=-' + {'users': 'sAMAccountName', 'groups': 'cn', 'computers': 'name'}[tab]
+    status, payload = client.request('GET', f'/api/ad/{tab}?{query}', label=f'/api/ad/{tab}')
+    # Some admins page on
+    if payload and payload.get('nextCursor') and rng.random() < 0.5:
+        client.request('GET', f"/api/ad/{tab}?{query}&cursor={urllib.parse.quote(payload['nextCursor'])}",
+                       label=f'/api/ad/{tab}')
+
+
+def lookup(client, fixture, rng, args):
+    """An admin opening single user records (a directory read each)."""
+    username = rng.choice(fixture['usernames'])
+    client.request('GET', f'/api/ad/user/{urllib.parse.quote(username)}', label='/api/ad/user/<username>')
+
+
+def writes(client, fixture, rng, args):
+    """Bulk disable/enable of random users through the batch API."""
+    usernames = rng.sample(fixture['usernames'], min(args.batch_size, len(fixture['usernames'])))
+    action = rng.choice(('disable', 'enable'))
+    client.request('POST', '/api/ad/users/batch', body={
+        'operations': [{'username': username, 'action': action} for username in usernames]})
+
+
+def login(client, fixture, rng, args):
+    """Repeated sign-ins (password hashing and the user lookup)."""
+    client.login(LOADTEST_EMAIL, LOADTEST_PASSWORD, record=True)
+
+
+SCENARIOS = {'dashboard': dashboard, 'browse': browse, 'lookup': lookup, 'writes': writes, 'login': login}
+
+
+def parse_scenarios(spec):
+    """Turn "dashboard=10,browse=4" into {'dashboard': 10, 'browse': 4}."""
+    mix = {}
+    for item in spec.split(','):
+        name, _, count = item.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name!r}, choose from {', '.join(SCENARIOS)}")
+        mix[name] = int(count or 1)
+    return mix
+
+
+def virtual_user(scenario, base_url, recorder, fixture, args, seed, stop, cookies):
+    """Run ``scenario`` until ``stop``; on the signed-in session ``cookies`` (the login scenario signs in itself)."""
+    rng = random.Random(seed)
+    client = Client(base_url, recorder, args.timeout, None if scenario == 'login' else cookies)
+    if scenario == 'login' and not client.login(LOADTEST_EMAIL, LOADTEST_PASSWORD):
+        recorder.add('POST /login (session setup)', 0, 401)
+        return
+    while not stop.is_set():
+        SCENARIOS[scenario](client, fixture, rng, args)
+        if args.think:
+            # +-50% jitter so the virtual users do not fire in lockstep
+            stop.wait(args.think * rng.uniform(0.5, 1.5))
+
+
+def wait_until_ready(base_url, server, timeout, workdir):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"Server exited with {server.returncode}, see {os.path.join(workdir, 'server.log')}")
+        try:
+            with urllib.request.urlopen(base_url + '/', timeout=5):
+                return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"Server not reachable at {base_url} after {timeout}s")
+
+
+def wait_for_snapshot(workdir, timeout):
+    """Wait for the collector's first ad_data snapshot, which /api/dashboard-data serves."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.isdir(os.path.join(workdir, 'ad_data')) and os.listdir(os.path.join(workdir, 'ad_data')):
+            return True
+        time.sleep(0.5)
+    return False
+
+
+def summarize(samples, duration):
+    by_label = defaultdict(list)
+    for _, label, seconds, status in samples:
+        by_label[label].append((seconds, status))
+    by_label['total'] = [(seconds, status) for _, _, seconds, status in samples]
+    summary = {}
+    for label, results in by_label.items():
+        timings = [seconds for seconds, _ in results]
+        errors = sum(1 for _, status in results if is_error(status))
+        summary[label] = {
+            'requests': len(results),
+            'rps': round(len(results) / duration, 2),
+            'errors': errors,
+            'errorRate': round(errors / len(results), 4) if results else 0,
+            'p50Ms': round(percentile(timings, 50) * 1000, 1),
+            'p90Ms': round(percentile(timings, 90) * 1000, 1),
+            'p99Ms': round(percentile(timings, 99) * 1000, 1),
+            'maxMs': round(max(timings) * 1000, 1)
+        }
+    return summary
+
+
+def timeline(samples, process_samples, duration, interval):
+    """Requests, errors and p99 per interval, next to the server's CPU, RSS and threads."""
+    rows = []
+    buckets = defaultdict(list)
+    for finished, _, seconds, status in samples:
+        buckets[int(finished // interval)].append((seconds, status))
+    for i in range(int(duration // interval) + 1):
+        results = buckets.get(i, [])
+        row = {'t': round((i + 1) * interval, 1), 'rps': round(len(results) / interval, 1),
+               'errors': sum(1 for _, status in results if is_error(status)),
+               'p99Ms': round(percentile([seconds for seconds, _ in results], 99) * 1000, 1) if results else None}
+        # Closest server sample taken at the end of the interval
+        process = [sample for sample in process_samples if sample['t'] <= row['t']]
+        if process:
+            row.update(cpuPercent=process[-1]['cpuPercent'], rssBytes=process[-1]['rssBytes'],
+                       threads=process[-1]['threads'])
+        rows.append(row)
+    return rows
+
+
+def print_report(report):
+    print(f"\n{'endpoint':<44}{'requests':>9}{'rps':>9}{'errors':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}"
+          f"{'max ms':>9}")
+    for label, row in sorted(report['endpoints'].items(), key=lambda item: (item[0] == 'total', item[0])):
+        print(f"{label:<44}{row['requests']:>9}{row['rps']:>9.1f}{row['errors']:>8}{row['p50Ms']:>9.1f}"
+              f"{row['p90Ms']:>9.1f}{row['p99Ms']:>9.1f}{row['maxMs']:>9.1f}")
+
+    print(f"\n{'t s':>6}{'rps':>8}{'errors':>8}{'p99 ms':>9}{'cpu %':>8}{'rss MiB':>9}{'threads':>9}")
+    for row in report['timeline']:
+        p99 = f"{row['p99Ms']:.1f}" if row['p99Ms'] is not None else '-'
+        cpu = f"{row['cpuPercent']:.0f}" if 'cpuPercent' in row else '-'
+        rss = f"{row['rssBytes'] / 2 ** 20:.0f}" if 'rssBytes' in row else '-'
+        threads = row.get('threads', '-')
+        print(f"{row['t']:>6.0f}{row['rps']:>8.1f}{row['errors']:>8}{p99:>9}{cpu:>8}{rss:>9}{threads:>9}")
+    server = report['server']
+    if server.get('cpuPercentMean') is not None:
+        print(f"\nServer CPU mean {server['cpuPercentMean']}% / max {server['cpuPercentMax']}%, "
+              f"RSS max {server['rssBytesMax'] / 2 ** 20:.0f} MiB, threads max {server['threadsMax']}")
+    else:
+        print("\nServer CPU and RSS not sampled (needs /proc and a local server process)")
+
+
+def run(args):
+    mix = args.scenarios
+    workdir, server, log = None, None, None
+    directory_users = args.directory_users
+    if args.fixture:
+        args.fixture = os.path.abspath(args.fixture)
+        directory_users = read_fixture(args.fixture)[0]['counts']['users']
+    if args.url:
+        base_url, pid = args.url.rstrip('/'), args.pid
+    else:
+        workdir = tempfile.mkdtemp(prefix='ad-loadtest-')
+        port = free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        log = open(os.path.join(workdir, 'server.log'), 'w')
+        env = dict(os.environ, AD_DB_BACKEND='sqlite')
+        server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), 'serve', '--port', str(port),
+             '--directory-users', str(args.directory_users), '--seed', str(args.seed)]
+            + (['--fixture', args.fixture] if args.fixture else [])
+            + (['--no-collector'] if args.no_collector else [])
+            + (['--asgi'] if args.asgi else [])
+            + (['--dc-latency', str(args.dc_latency)] if args.dc_latency else []),
+            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        pid = server.pid
+
+    try:
+        wait_until_ready(base_url, server, args.startup_timeout, workdir)
+        if workdir:
+            with open(os.path.join(workdir, FIXTURE_FILE)) as f:
+                fixture = json.load(f)
+            if not args.no_collector and 'dashboard' in mix and not wait_for_snapshot(workdir, args.startup_timeout):
+                print("Warning: no collector snapshot yet, /api/dashboard-data will query the directory live")
+        else:
+            fixture = {'usernames': args.usernames.split(',') if args.usernames else [], 'groups': []}
+            if {'writes', 'lookup'} & set(mix) and not fixture['usernames']:
+                raise RuntimeError("--usernames is required for the writes and lookup scenarios against --url")
+
+        setup = Client(base_url, Recorder(), args.timeout)
+        setup.request('POST', '/register', record=False,
+                      body={'name': LOADTEST_NAME, 'email': LOADTEST_EMAIL, 'password': LOADTEST_PASSWORD})
+        if not setup.login(LOADTEST_EMAIL, LOADTEST_PASSWORD):
+            raise RuntimeError("Could not sign in with the load test account")
+
+        recorder = Recorder()
+        sampler = ProcessSampler(pid, args.interval) if pid else None
+        if sampler:
+            sampler.start()
+        stop = threading.Event()
+        threads = []
+        total = sum(mix.values())
+        print(f"Running {', '.join(f'{name}={count}' for name, count in mix.items())} for {args.duration}s "
+              f"against {base_url}", flush=True)
+        for scenario, count in mix.items():
+            for _ in range(count):
+                thread = threading.Thread(target=virtual_user, daemon=True, name=f'vu-{scenario}-{len(threads)}',
+                                          args=(scenario, base_url, recorder, fixture, args,
+                                                args.seed + len(threads), stop, setup.cookies))
+                threads.append(thread)
+                thread.start()
+                if args.ramp:
+                    time.sleep(args.ramp / total)
+        time.sleep(max(0, args.duration - (time.perf_counter() - recorder.started)))
+        stop.set()
+        for thread in threads:
+            thread.join(args.timeout)
+        duration = time.perf_counter() - recorder.started
+        if sampler:
+            sampler.stopped.set()
+            sampler.join()
+
+        samples = recorder.since(0)
+        process_samples = sampler.samples if sampler else []
+        report = {
+            'scenarios': mix,
+            'durationSeconds': round(duration, 1),
+            'directoryUsers': None if args.url else directory_users,
+            'endpoints': summarize(samples, duration) if samples else {},
+            'timeline': timeline(samples, process_samples, duration, args.interval),
+            'server': {
+                'cpuPercentMean': round(sum(s['cpuPercent'] for s in process_samples) / len(process_samples), 1)
+                if process_samples else None,
+                'cpuPercentMax': max((s['cpuPercent'] for s in process_samples), default=None),
+                'rssBytesMax': max((s['rssBytes'] for s in process_samples), default=None),
+                'threadsMax': max((s['threads'] for s in process_samples), default=None),
+                'samples': process_samples
+            }
+        }
+        print_report(report)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Report written to {args.json}")
+        errors = report['endpoints'].get('total', {}).get('errorRate', 0)
+        return 1 if errors > args.max_error_rate else 0
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        if log is not None:
+            log.close()
+        if workdir:
+            if args.keep:
+                print(f"Server files kept in {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Drive the app over HTTP with concurrent virtual admins. By default the app is started "
+                    "on a local WSGI server (ASGI with --asgi) with a synthetic mock directory and a local SQLite database; "
+                    "its list APIs are served from the synced directory view as in production, with a fixed "
+                    "sync watermark standing in for the mock's missing rootDSE.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run a load test")
+    run_parser.add_argument('--scenarios', type=parse_scenarios, default=DEFAULT_SCENARIOS,
+                            help="Virtual users per scenario (%(default)s); scenarios: " + ', '.join(SCENARIOS))
+    run_parser.add_argument('--duration', type=float, default=60, help="Seconds to run (default: %(default)s)")
+    run_parser.add_argument('--ramp', type=float, default=0, help="Seconds over which virtual users start")
+    run_parser.add_argument('--think', type=float, default=1.0,
+                            help="Mean pause between a virtual user's steps, 0 for back-to-back (default: %(default)s)")
+    run_parser.add_argument('--timeout', type=float, default=60, help="Per-request timeout in seconds")
+    run_parser.add_argument('--interval', type=float, default=5, help="Seconds per timeline row and server sample")
+    run_parser.add_argument('--page-size', type=int, default=50, help="limit= of the list requests")
+    run_parser.add_argument('--batch-size', type=int, default=20, help="Operations per batch write")
+    run_parser.add_argument('--max-error-rate', type=float, default=0.01,
+                            help="Exit with 1 above this share of failed requests (default: %(default)s)")
+    run_parser.add_argument('--json', metavar='PATH', help="Also write the report as JSON")
+    run_parser.add_argument('--url', help="Test a running instance instead of starting one")
+    run_parser.add_argument('--pid', type=int, help="With --url: server process to sample CPU and RSS of")
+    run_parser.add_argument('--usernames', help="With --url: comma-separated users the writes and lookup scenarios use")
+    run_parser.add_argument('--keep', action='store_true', help="Keep the server's working directory")
+    run_parser.add_argument('--startup-timeout', type=float, default=300,
+                            help="Seconds to wait for the server and the first collector snapshot")
+
+    serve_parser = commands.add_parser('serve', help="Only start the app on a mock directory (used by run)")
+    serve_parser.add_argument('--port', type=int, default=5000)
+
+    for sub in (run_parser, serve_parser):
+        sub.add_argument('--directory-users', type=int, default=1000,
+                         help="Users in the synthetic directory (default: %(default)s)")
+        sub.add_argument('--seed', type=int, default=1, help="Seed of the synthetic directory")
+        sub.add_argument('--fixture', metavar='PATH',
+                         help="Serve a directory written by generate_test_data.py --fixture instead")
+        sub.add_argument('--no-collector', action='store_true',
+                         help="Do not start the background collector (dashboard data is then read live)")
+        sub.add_argument('--asgi', action='store_true',
+                         help="Serve ad_asgi.application on uvicorn instead of the threaded WSGI server")
+        sub.add_argument('--dc-latency', type=float, default=0,
+                         help="Milliseconds every LDAP operation on the mock directory waits (default: %(default)s)")
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        return serve(args)
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+from collections import defaultdict
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Default level for every logger, e.g. INFO or WARNING
+AD_LOG_LEVEL = os.environ.get('AD_LOG_LEVEL', 'INFO').upper()
+# Per-logger overrides, e.g. "ad_conn=DEBUG,ad_sync=WARNING,werkzeug=WARNING"
+AD_LOG_LEVELS = os.environ.get('AD_LOG_LEVELS', '')
+# 'text' keeps the classic one-line format, 'json' writes one JSON object per record
+AD_LOG_FORMAT = os.environ.get('AD_LOG_FORMAT', 'text')
+AD_LOG_FILE = os.environ.get('AD_LOG_FILE', 'logs/app.log')
+# Records waiting for the writer thread; further records are dropped, never waited on
+AD_LOG_QUEUE_SIZE = int(os.environ.get('AD_LOG_QUEUE_SIZE', 10000))
+# log_sampled() lets one in this many calls per message through
+AD_LOG_SAMPLE_EVERY = int(os.environ.get('AD_LOG_SAMPLE_EVERY', 100))
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s [in %(pathname)s:%(lineno)d]'
+
+# Attributes every LogRecord has; anything else came in through ``extra=``
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+_configure_lock = threading.Lock()
+_sample_counters = defaultdict(itertools.count)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, including fields passed with ``extra=``."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+            'location': f"{record.pathname}:{record.lineno}",
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the logging thread.
+
+    Records are queued as they are, so their messages are only formatted
+    by the listener thread; callers must not mutate objects they pass as
+    arguments afterwards. When the queue is full the record is dropped
+    and counted instead of waiting for the writer.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_levels(spec):
+    """Turn "name=LEVEL,..." into {name: level}; malformed items are ignored."""
+    levels = {}
+    for item in spec.split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(app):
+    """Route all logging through one queue to the file and console handlers.
+
+    The handlers run on a QueueListener thread, so request threads only
+    pay for creating a record, and nothing at all for records below the
+    level of their logger. Library modules log through
+    ``logging.getLogger(__name__)``, the Flask app through ``app.logger``;
+    levels are set per logger name with AD_LOG_LEVEL and AD_LOG_LEVELS.
+    Safe to call more than once.
+    """
+    global _listener
+    from flask.logging import default_handler
+
+    with _configure_lock:
+        root = logging.getLogger()
+        root.setLevel(AD_LOG_LEVEL)
+        for name, level in parse_levels(AD_LOG_LEVELS).items():
+            logging.getLogger(name).setLevel(level)
+        app.logger.removeHandler(default_handler)
+        if _listener is not None:
+            return _listener
+
+        log_dir = os.path.dirname(AD_LOG_FILE)
+        if log_dir and not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+        formatter = JSONFormatter() if AD_LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+        file_handler = RotatingFileHandler(AD_LOG_FILE, maxBytes=1024*1024*10, backupCount=5)
+        file_handler.setFormatter(formatter)
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(AD_LOG_QUEUE_SIZE)
+        root.addHandler(DroppingQueueHandler(log_queue))
+        _listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+        _listener.start()
+        # Flush what is still queued when the process exits
+        atexit.register(_listener.stop)
+        return _listener
+
+
+def dropped_records():
+    """Number of records dropped because the log queue was full."""
+    return sum(handler.dropped for handler in logging.getLogger().handlers
+               if isinstance(handler, DroppingQueueHandler))
+
+
+def log_sampled(logger, level, msg, *args, every=None, **kwargs):
+    """Log only one in ``every`` (AD_LOG_SAMPLE_EVERY) calls with the same message.
+
+    For per-entry logs inside directory scans. Returns immediately when
+    ``level`` is disabled for ``logger``.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    every = every or AD_LOG_SAMPLE_EVERY
+    if next(_sample_counters[msg]) % every == 0:
+        extra = dict(kwargs.pop('extra', None) or {}, sampled=every)
+        logger.log(level, msg, *args, extra=extra, stacklevel=2, **kwargs)
@@ -0,0 +1,150 @@
+import threading
+from array import array
+from collections import defaultdict, deque
+
+# Closures kept per graph before the oldest is dropped
+MAX_CACHED_CLOSURES = 10000
+
+
+class MembershipGraph:
+    """Group containment graph with cached transitive closures.
+
+    Built from the locally synced directory (see ad_sync.DirectorySync), so
+    questions like "who effectively is in Domain Admins" are answered from
+    memory instead of LDAP_MATCHING_RULE_IN_CHAIN queries against the DC.
+    Membership through primaryGroupID is not part of ``member`` and is
+    therefore not included. DNs are handled as ids of the DirectorySync
+    DNTable and only turned back into strings for results.
+    """
+
+    def __init__(self, objects, dns, dn_table):
+        self.lock = threading.Lock()
+        self.dn_table = dn_table
+        self.records = {}               # dn id -> (kind, record)
+        self.users_by_name = {}         # sAMAccountName -> dn id
+        self.groups_by_name = {}        # cn -> dn id
+        self.members = {}               # group dn id -> array of member dn ids
+        self.member_of = defaultdict(lambda: array('I'))  # member dn id -> group dn ids
+
+        for kind in ('users', 'computers', 'groups'):
+            for guid, record in objects.get(kind, {}).items():
+                dn = dns.get(guid)
+                if dn is None:
+                    continue
+                self.records[dn] = (kind, record)
+                if kind == 'users' and record.get('sAMAccountName'):
+                    self.users_by_name[record['sAMAccountName'].lower()] = dn
+                elif kind == 'groups':
+                    if record.get('cn'):
+                        self.groups_by_name[record['cn'].lower()] = dn
+                    self.members[dn] = record.member_ids
+                    for member_dn in record.member_ids:
+                        self.member_of[member_dn].append(dn)
+
+        self.cycles = self._find_cycles()
+        self._effective_groups = {}
+        self._effective_members = {}
+
+    def _find_cycles(self):
+        """Return groups that contain themselves, as strongly connected components.
+
+        Iterative Kosaraju so deep nesting cannot hit the recursion limit.
+        """
+        order, seen = [], set()
+        for start in self.members:
+            if start in seen:
+                continue
+            seen.add(start)
+            stack = [(start, iter(self.members.get(start, ())))]
+            while stack:
+                node, children = stack[-1]
+                for child in children:
+                    if child in self.members and child not in seen:
+                        seen.add(child)
+                        stack.append((child, iter(self.members.get(child, ()))))
+                        break
+                else:
+                    stack.pop()
+                    order.append(node)
+
+        cycles, assigned = [], set()
+        for start in reversed(order):
+            if start in assigned:
+                continue
+            component, stack = [], [start]
+            assigned.add(start)
+            while stack:
+                node = stack.pop()
+                component.append(node)
+                for parent in self.member_of.get(node, ()):
+                    if parent not in assigned:
+                        assigned.add(parent)
+                        stack.append(parent)
+            if len(component) > 1 or start in self.members.get(start, ()):
+                cycles.append(sorted(self.dn_table.dn(dn) for dn in component))
+        return cycles
+
+    def _cache(self, cache, key, compute):
+        with self.lock:
+            if key in cache:
+                return cache[key]
+        value = compute(key)
+        with self.lock:
+            if len(cache) >= MAX_CACHED_CLOSURES:
+                cache.pop(next(iter(cache)))
+            cache[key] = value
+        return value
+
+    def _walk_up(self, dn):
+        """Breadth-first walk of member_of; returns {group dn: depth}."""
+        depths = {}
+        queue = deque((group_dn, 1) for group_dn in self.member_of.get(dn, ()))
+        while queue:
+            group_dn, depth = queue.popleft()
+            if group_dn in depths:
+                continue  # already reached, possibly through a cycle
+            depths[group_dn] = depth
+            queue.extend((parent, depth + 1) for parent in self.member_of.get(group_dn, ()))
+        return depths
+
+    def _walk_down(self, group_dn):
+        """Breadth-first walk of member; returns {member dn: depth}."""
+        depths = {}
+        queue = deque((member_dn, 1) for member_dn in self.members.get(group_dn, ()))
+        while queue:
+            member_dn, depth = queue.popleft()
+            if member_dn in depths or member_dn == group_dn:
+                continue
+            depths[member_dn] = depth
+            queue.extend((child, depth + 1) for child in self.members.get(member_dn, ()))
+        return depths
+
+    def _describe(self, dn, depth):
+        kind, record = self.records.get(dn, ('unknown', {}))
+        dn = self.dn_table.dn(dn)
+        return {
+            'dn': dn,
+            'type': {'users': 'user', 'computers': 'computer', 'groups': 'group'}.get(kind, 'unknown'),
+            'name': record.get('cn') or record.get('name') or dn.split(',', 1)[0].split('=', 1)[-1],
+            'sAMAccountName': record.get('sAMAccountName', ''),
+            'direct': depth == 1,
+            'depth': depth
+        }
+
+    def effective_groups(self, username):
+        """All groups a user belongs to, directly or through nesting; None if unknown."""
+        dn = self.users_by_name.get(username.lower())
+        if dn is None:
+            return None
+        depths = self._cache(self._effective_groups, dn, self._walk_up)
+        return sorted((self._describe(group_dn, depth) for group_dn, depth in depths.items()),
+                      key=lambda group: group['name'].lower())
+
+    def effective_members(self, group_name):
+        """All principals inside a group, including nested groups; None if unknown."""
+        dn = self.groups_by_name.get(group_name.lower())
+        if dn is None:
+            return None
+        depths = self._cache(self._effective_members, dn, self._walk_down)
+        return sorted((self._describe(member_dn, depth) for member_dn, depth in depths.items()),
+                      key=lambda member: (member['depth'], member['name'].lower()))
@@ -0,0 +1,342 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Directory shared by all worker processes; each writes its values there so
+# /metrics in any worker reports the sum. Unset: values are per process.
+AD_METRICS_DIR = os.environ.get('AD_METRICS_DIR', '')
+# Seconds between writes of this process' values to AD_METRICS_DIR
+AD_METRICS_FLUSH_INTERVAL = float(os.environ.get('AD_METRICS_FLUSH_INTERVAL', 5))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ENTRY_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+COLLECTOR_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base for metric families: one value per tuple of label values.
+
+    Updates take a per-family lock and touch a single dict entry, so they
+    are cheap and safe from any thread.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def dump(self):
+        with self.lock:
+            return [[list(labels), value] for labels, value in self.values.items()]
+
+    @staticmethod
+    def merge(values, other):
+        """Combine the dumped values of several processes into ``values``."""
+        for labels, value in other:
+            labels = tuple(labels)
+            values[labels] = values.get(labels, 0) + value
+
+    def samples(self, values):
+        for labels, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """Gauge; ``aggregate`` decides how values of several processes combine ('sum' or 'max')."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), aggregate='sum'):
+        super().__init__(name, documentation, labelnames)
+        self.aggregate = aggregate
+
+    def set(self, value, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+    def merge(self, values, other):
+        if self.aggregate != 'max':
+            return Metric.merge(values, other)
+        for labels, value in other:
+            labels = tuple(labels)
+            values[labels] = max(values.get(labels, value), value)
+
+
+class Histogram(Metric):
+    """Histogram; each label tuple holds [count per bucket..., sum, count], rendered cumulatively."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def dump(self):
+        with self.lock:
+            return [[list(labels), list(state)] for labels, state in self.values.items()]
+
+    @staticmethod
+    def merge(values, other):
+        for labels, state in other:
+            labels = tuple(labels)
+            current = values.get(labels)
+            values[labels] = state if current is None else [a + b for a, b in zip(current, state)]
+
+    def samples(self, values):
+        for labels, state in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state[:-2] + [state[-1] - sum(state[:-2])]):
+                cumulative += count
+                yield (f'{self.name}_bucket',
+                       _format_labels(self.labelnames, labels, [('le', _format_value(float(bound)))]), cumulative)
+            yield f'{self.name}_sum', _format_labels(self.labelnames, labels), state[-2]
+            yield f'{self.name}_count', _format_labels(self.labelnames, labels), state[-1]
+
+
+class CallbackMetric(Metric):
+    """Counter or gauge whose values are read from ``callback()`` ({labels: value}) when collected.
+
+    For statistics other objects already keep, such as cache hit counts.
+    """
+
+    def __init__(self, name, documentation, labelnames, callback, kind='counter'):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.kind = kind
+
+    def dump(self):
+        try:
+            return [[list(labels), value] for labels, value in self.callback().items()]
+        except Exception as e:
+            logger.warning("Collecting %s failed: %s", self.name, e)
+            return []
+
+
+class Registry:
+    """The metric families of this process, rendered in the Prometheus text format.
+
+    With AD_METRICS_DIR set, every process writes its dumped values to
+    ``<pid>.json`` there (atomically, every AD_METRICS_FLUSH_INTERVAL
+    seconds) and render() adds up the files of all processes, in the
+    spirit of prometheus_client's multiprocess mode. Files of processes
+    that have exited keep contributing their final counts.
+    """
+
+    def __init__(self, directory=''):
+        self.directory = directory
+        self.metrics = {}
+        self.derived = []
+        self._flusher = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), aggregate='sum'):
+        return self.register(Gauge(name, documentation, labelnames, aggregate))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, labelnames, callback, kind='counter'):
+        return self.register(CallbackMetric(name, documentation, labelnames, callback, kind))
+
+    def derive(self, name, documentation, labelnames, compute):
+        """Gauge computed at render time from the merged values: ``compute(values) -> {labels: value}``."""
+        self.derived.append((name, documentation, tuple(labelnames), compute))
+
+    def dump(self):
+        return {name: metric.dump() for name, metric in self.metrics.items()}
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def flush(self):
+        """Write this process' values to the shared directory."""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getpid())
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.dump(), f)
+        os.replace(path + '.tmp', path)
+
+    def start_flusher(self):
+        """Flush periodically from a daemon thread (no-op without a directory)."""
+        if not self.directory or self._flusher is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(AD_METRICS_FLUSH_INTERVAL)
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.warning("Writing metrics to %s failed: %s", self.directory, e)
+
+        self._flusher = threading.Thread(target=run, name='metrics-flush', daemon=True)
+        self._flusher.start()
+
+    def collect(self):
+        """Values of all families, merged over every process sharing the directory."""
+        dumps = [self.dump()]
+        if self.directory and os.path.isdir(self.directory):
+            own = f'{os.getpid()}.json'
+            for filename in os.listdir(self.directory):
+                if not filename.endswith('.json') or filename == own:
+                    continue
+                try:
+                    with open(os.path.join(self.directory, filename)) as f:
+                        dumps.append(json.load(f))
+                except (OSError, ValueError):
+                    continue  # being replaced or removed
+        merged = {}
+        for name, metric in self.metrics.items():
+            values = merged[name] = {}
+            for dump in dumps:
+                metric.merge(values, dump.get(name, []))
+        return merged
+
+    def render(self):
+        merged = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for sample, labels, value in metric.samples(merged[name]):
+                lines.append(f'{sample}{labels} {_format_value(value)}')
+        for name, documentation, labelnames, compute in self.derived:
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} gauge')
+            for labels, value in sorted(compute(merged).items()):
+                lines.append(f'{name}{_format_labels(labelnames, labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry(AD_METRICS_DIR)
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'ad_http_request_duration_seconds', 'Time to produce a response, per route.',
+    ('route', 'method', 'status'))
+LDAP_OPERATIONS = registry.counter(
+    'ad_ldap_operations_total', 'LDAP operations by ActiveDirectoryManager method.',
+    ('operation', 'method', 'result'))
+LDAP_OPERATION_SECONDS = registry.histogram(
+    'ad_ldap_operation_duration_seconds', 'LDAP operation latency by ActiveDirectoryManager method.',
+    ('operation', 'method'))
+LDAP_SEARCH_ENTRIES = registry.histogram(
+    'ad_ldap_search_entries', 'Entries returned per LDAP search request (per page for paged searches).',
+    ('method',), ENTRY_BUCKETS)
+COLLECTOR_RUNS = registry.counter(
+    'ad_collector_runs_total', 'Background collector runs.', ('result',))
+COLLECTOR_SECONDS = registry.histogram(
+    'ad_collector_run_duration_seconds', 'Duration of background collector runs.', (), COLLECTOR_BUCKETS)
+COLLECTOR_LAST_SUCCESS = registry.gauge(
+    'ad_collector_last_success_timestamp_seconds', 'Unix time of the last successful collector run.',
+    aggregate='max')
+DB_CONNECTIONS = registry.counter(
+    'ad_db_connections_total', 'Database connections opened per backend; mysql failures fall back to sqlite.',
+    ('backend', 'result'))
+
+
+# Cache name -> callable returning its {'hit', 'stale', 'miss'} counts
+_cache_stats = {}
+# Code object -> name, for the methods registered with register_methods()
+_method_names = {}
+
+
+def _cache_requests():
+    values = {}
+    for cache, stats in list(_cache_stats.items()):
+        counts = stats()
+        for result in ('hit', 'stale', 'miss'):
+            if result in counts:
+                values[(cache, result)] = counts[result]
+    return values
+
+
+def _hit_ratios(merged):
+    totals = {}
+    for (cache, result), value in merged['ad_cache_requests_total'].items():
+        hits, lookups = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (value if result != 'miss' else 0), lookups + value)
+    return {(cache,): hits / lookups for cache, (hits, lookups) in totals.items() if lookups}
+
+
+CACHE_REQUESTS = registry.callback(
+    'ad_cache_requests_total', 'Cache lookups by result.', ('cache', 'result'), _cache_requests)
+registry.derive('ad_cache_hit_ratio', 'Share of cache lookups answered from the cache, stale ones included.',
+                ('cache',), _hit_ratios)
+
+
+def register_cache(name, stats):
+    """Export the lookups of a cache; ``stats()`` returns a dict with 'hit', 'stale' and/or 'miss' counts."""
+    _cache_stats[name] = stats
+
+
+def register_methods(cls):
+    """Label LDAP operations issued inside the methods of ``cls`` with the method name."""
+    for name, member in vars(cls).items():
+        func = getattr(member, '__func__', member)
+        code = getattr(func, '__code__', None)
+        if code is not None:
+            _method_names[code] = name
+
+
+def calling_method():
+    """Name of the outermost registered method on the current thread's stack, or 'other'."""
+    name = 'other'
+    frame = sys._getframe(1)
+    while frame is not None:
+        name = _method_names.get(frame.f_code, name)
+        frame = frame.f_back
+    return name
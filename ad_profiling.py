@@ -0,0 +1,266 @@
+import cProfile
+import contextvars
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from ad_tracing import end_span, start_span
+
+# Directory holding the captured requests (the ring buffer)
+AD_PROFILE_DIR = os.environ.get('AD_PROFILE_DIR', 'profiles')
+# Captures kept; the oldest are deleted beyond this
+AD_PROFILE_MAX_CAPTURES = int(os.environ.get('AD_PROFILE_MAX_CAPTURES', 50))
+# Requests slower than this many milliseconds are captured automatically (0 disables)
+AD_PROFILE_SLOW_MS = float(os.environ.get('AD_PROFILE_SLOW_MS', 2000))
+# Share of requests run under cProfile so a slow one also comes with a call-stack profile
+AD_PROFILE_SAMPLE_RATE = float(os.environ.get('AD_PROFILE_SAMPLE_RATE', 0))
+# Functions listed in a capture's profile summary
+AD_PROFILE_TOP_FUNCTIONS = int(os.environ.get('AD_PROFILE_TOP_FUNCTIONS', 40))
+
+CAPTURE_ID = re.compile(r'^[0-9]{8}T[0-9]{12}-[0-9a-f]{6}$')
+# Timeline entries kept per request, so a huge export cannot grow a capture without bound
+MAX_EVENTS = 5000
+
+_capture = contextvars.ContextVar('ad_profile_capture', default=None)
+_write_lock = threading.Lock()
+
+
+class Capture:
+    """Timeline of LDAP and SQL calls of one request, plus its cProfile data if profiled.
+
+    Events may be added from any thread working for the request; each
+    thread that runs under capture_scope() with profiling on gets its own
+    cProfile.Profile, merged when the capture is saved.
+    """
+
+    def __init__(self, profile=False):
+        self.profile = profile
+        self.started = time.perf_counter()
+        self.events = []
+        self.dropped_events = 0
+        self.profilers = []
+        self.caller_profiler = None
+        self.lock = threading.Lock()
+
+    def add_event(self, kind, operation, started, duration, **details):
+        with self.lock:
+            if len(self.events) >= MAX_EVENTS:
+                self.dropped_events += 1
+                return
+            self.events.append(dict(
+                details, kind=kind, operation=operation, thread=threading.current_thread().name,
+                startMs=round((started - self.started) * 1000, 3), durationMs=round(duration * 1000, 3)))
+
+    def new_profiler(self):
+        profiler = cProfile.Profile()
+        with self.lock:
+            self.profilers.append(profiler)
+        return profiler
+
+    def stats(self):
+        """Merged pstats.Stats of all threads, or None if the request was not profiled."""
+        stats = None
+        for profiler in self.profilers:
+            profiler.create_stats()
+            if not profiler.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profiler, stream=io.StringIO())
+            else:
+                stats.add(profiler)
+        return stats
+
+
+def current_capture():
+    return _capture.get()
+
+
+def start_capture(profile=False, this_thread=True):
+    """Begin capturing the current request; profiling covers the calling thread from here on.
+
+    Coroutines share their event loop thread with other requests, so they
+    pass ``this_thread=False``: only their capture_scope() workers are profiled.
+    """
+    capture = Capture(profile)
+    token = _capture.set(capture)
+    if profile and this_thread:
+        capture.caller_profiler = capture.new_profiler()
+        capture.caller_profiler.enable()
+    return capture, token
+
+
+def stop_capture(capture, token):
+    if capture.caller_profiler is not None:
+        capture.caller_profiler.disable()
+    _capture.reset(token)
+
+
+@contextmanager
+def capture_scope(capture):
+    """Make ``capture`` current in a worker thread, profiling it too if the request is profiled.
+
+    Use around work handed to other threads (thread pools do not carry
+    context variables over).
+    """
+    if capture is None:
+        yield
+        return
+    token = _capture.set(capture)
+    profiler = capture.new_profiler() if capture.profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        _capture.reset(token)
+
+
+def record_event(kind, operation, started, duration, **details):
+    """Add an event to the current request's timeline (no-op outside a capture)."""
+    capture = _capture.get()
+    if capture is not None:
+        capture.add_event(kind, operation, started, duration, **details)
+
+
+def should_profile(requested):
+    return requested or (AD_PROFILE_SAMPLE_RATE > 0 and random.random() < AD_PROFILE_SAMPLE_RATE)
+
+
+def should_save(capture, duration):
+    return capture.profile or (AD_PROFILE_SLOW_MS > 0 and duration * 1000 >= AD_PROFILE_SLOW_MS)
+
+
+def timed_statement(backend, operation, call, statement, *args, **kwargs):
+    """Run a SQL statement, adding it to the request timeline and, inside a trace, as a span."""
+    statement_text = str(statement)[:500]
+    span = start_span(f'sql.{operation}', backend=backend, statement=statement_text)
+    started = time.perf_counter()
+    error = None
+    try:
+        return call(statement, *args, **kwargs)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        record_event('sql', operation, started, time.perf_counter() - started,
+                     backend=backend, statement=statement_text)
+        end_span(span, error)
+
+
+class TimedCursor:
+    """Proxy for a DB-API cursor that times every execute() (see timed_statement)."""
+
+    def __init__(self, cursor, backend):
+        self._cursor = cursor
+        self._backend = backend
+
+    def _timed(self, call, operation, statement, *args, **kwargs):
+        return timed_statement(self._backend, operation, call, statement, *args, **kwargs)
+
+    def execute(self, statement, *args, **kwargs):
+        return self._timed(self._cursor.execute, 'execute', statement, *args, **kwargs)
+
+    def executemany(self, statement, *args, **kwargs):
+        return self._timed(self._cursor.executemany, 'executemany', statement, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class TimedSQLiteConnection(sqlite3.Connection):
+    """sqlite3 connection (use as ``factory=``) whose execute() calls are timed (see timed_statement)."""
+
+    def execute(self, statement, *args, **kwargs):
+        return timed_statement('sqlite', 'execute', super().execute, statement, *args, **kwargs)
+
+
+def _profile_summary(stats):
+    rows = []
+    for (filename, line, function), (calls, primitive, total, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': f"{os.path.basename(filename)}:{line}({function})",
+            'calls': calls,
+            'primitiveCalls': primitive,
+            'totalTime': round(total, 6),
+            'cumulativeTime': round(cumulative, 6)
+        })
+    rows.sort(key=lambda row: row['cumulativeTime'], reverse=True)
+    return rows[:AD_PROFILE_TOP_FUNCTIONS]
+
+
+def _prune():
+    captures = sorted(name for name in os.listdir(AD_PROFILE_DIR) if name.endswith('.json'))
+    for name in captures[:max(0, len(captures) - AD_PROFILE_MAX_CAPTURES)]:
+        capture_id = name[:-len('.json')]
+        for suffix in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(AD_PROFILE_DIR, capture_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def save_capture(capture, metadata):
+    """Write a capture (JSON plus the raw .prof if profiled) and drop the oldest beyond the limit.
+
+    Returns the capture id.
+    """
+    now = datetime.now()
+    # Sorts by time, which the ring buffer relies on
+    capture_id = f"{now:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:6]}"
+    stats = capture.stats()
+    document = dict(metadata, id=capture_id, timestamp=now.isoformat(), profiled=stats is not None,
+                    events=sorted(capture.events, key=lambda event: event['startMs']),
+                    droppedEvents=capture.dropped_events)
+    if stats is not None:
+        document['profile'] = _profile_summary(stats)
+
+    with _write_lock:
+        os.makedirs(AD_PROFILE_DIR, exist_ok=True)
+        if stats is not None:
+            stats.dump_stats(os.path.join(AD_PROFILE_DIR, capture_id + '.prof'))
+        path = os.path.join(AD_PROFILE_DIR, capture_id + '.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(document, f, default=str)
+        os.replace(path + '.tmp', path)
+        _prune()
+    return capture_id
+
+
+def list_captures():
+    """Metadata of the stored captures, newest first."""
+    if not os.path.isdir(AD_PROFILE_DIR):
+        return []
+    captures = []
+    for name in sorted(os.listdir(AD_PROFILE_DIR), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(AD_PROFILE_DIR, name)) as f:
+                document = json.load(f)
+        except (OSError, ValueError):
+            continue  # pruned or being written
+        captures.append({key: document.get(key) for key in
+                         ('id', 'timestamp', 'method', 'route', 'path', 'status', 'durationMs', 'profiled', 'reason')})
+        captures[-1]['events'] = len(document.get('events', []))
+    return captures
+
+
+def capture_path(capture_id, suffix='.json'):
+    """Path of a stored capture file, or None for unknown or malformed ids."""
+    if not CAPTURE_ID.match(capture_id or ''):
+        return None
+    path = os.path.join(AD_PROFILE_DIR, capture_id + suffix)
+    return path if os.path.exists(path) else None
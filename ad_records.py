@@ -0,0 +1,228 @@
+import sys
+import threading
+from array import array
+from collections.abc import Mapping
+
+
+class DNTable:
+    """Intern table giving every distinct DN a small integer id.
+
+    DNs are matched case-insensitively and kept as first spelled (or as
+    spelled by the object itself, see ``canonical``). Group
+    memberships store ids (4 bytes each in an array) instead of one DN
+    string per membership. Ids are never reused; DirectorySync starts a
+    new table on every full sync, which also drops DNs of deleted objects.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = {}   # lower-cased DN -> id
+        self.dns = []   # id -> DN
+
+    def intern(self, dn, canonical=False):
+        """Return the id of ``dn``, adding it if needed.
+
+        ``canonical`` marks the object's own DN, whose spelling replaces the
+        one of a member reference seen earlier.
+        """
+        key = dn.lower()
+        dn_id = self.ids.get(key)
+        if dn_id is None or canonical:
+            with self.lock:
+                dn_id = self.ids.get(key)
+                if dn_id is None:
+                    dn_id = len(self.dns)
+                    self.dns.append(sys.intern(dn))
+                    self.ids[key] = dn_id
+                elif canonical:
+                    self.dns[dn_id] = sys.intern(dn)
+        return dn_id
+
+    def rename(self, dn_id, dn):
+        """Point ``dn_id`` at ``dn``, after the object it names was renamed or moved.
+
+        References stored as ``dn_id`` then decode to the new DN. Returns the
+        id ``dn`` had until now, or None; references held as that id are
+        left to the caller.
+        """
+        key = dn.lower()
+        with self.lock:
+            old_key = self.dns[dn_id].lower()
+            if self.ids.get(old_key) == dn_id:
+                del self.ids[old_key]
+            other = self.ids.get(key)
+            self.ids[key] = dn_id
+            self.dns[dn_id] = sys.intern(dn)
+        return other if other != dn_id else None
+
+    def lookup(self, dn):
+        """Id of a DN already in the table, or None."""
+        return self.ids.get(dn.lower())
+
+    def dn(self, dn_id):
+        return self.dns[dn_id]
+
+    def encode(self, dns):
+        return array('I', (self.intern(dn) for dn in dns))
+
+    def decode(self, dn_ids):
+        return [self.dns[dn_id] for dn_id in dn_ids]
+
+    def __len__(self):
+        return len(self.dns)
+
+
+class CompactRecord(Mapping):
+    """Read-only record with one slot per field instead of a per-object dict.
+
+    Behaves like the dicts built by ActiveDirectoryManager (``get``, ``[]``,
+    iteration), so sorting, filtering and the dashboard work on it
+    unchanged; to_dict() turns it back into a plain dict for JSON.
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init__(self, record):
+        for field in self.FIELDS:
+            setattr(self, field, record.get(field, ''))
+
+    def __getitem__(self, field):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def to_dict(self):
+        return {field: self[field] for field in self.FIELDS}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class UserRecord(CompactRecord):
+    __slots__ = FIELDS = ('sAMAccountName', 'cn', 'givenName', 'sn', 'mail', 'enabled')
+
+
+class ComputerRecord(CompactRecord):
+    __slots__ = FIELDS = ('name', 'dnsHostName', 'status')
+
+    def __init__(self, record):
+        super().__init__(record)
+        # 'Online' / 'Offline' shared by all records
+        self.status = sys.intern(self.status)
+
+
+class DomainControllerRecord(CompactRecord):
+    __slots__ = FIELDS = ('name', 'dnsHostName', 'operatingSystem')
+
+    def __init__(self, record):
+        super().__init__(record)
+        self.operatingSystem = sys.intern(self.operatingSystem)
+
+
+class GroupRecord(CompactRecord):
+    """Group whose members are DNTable ids; ``members`` decodes them on access."""
+
+    __slots__ = ('cn', 'description', 'member_ids', 'dn_table')
+    FIELDS = ('cn', 'description', 'member_count', 'members')
+
+    def __init__(self, record, dn_table):
+        self.cn = record.get('cn', '')
+        self.description = record.get('description', '')
+        self.dn_table = dn_table
+        self.member_ids = dn_table.encode(record.get('members') or [])
+
+    @property
+    def member_count(self):
+        return len(self.member_ids)
+
+    @property
+    def members(self):
+        return self.dn_table.decode(self.member_ids)
+
+
+RECORD_TYPES = {
+    'users': UserRecord,
+    'computers': ComputerRecord,
+    'domainControllers': DomainControllerRecord,
+}
+
+
+def compact_record(kind, record, dn_table):
+    """Compact form of a record dict returned by ActiveDirectoryManager."""
+    if kind == 'groups':
+        return GroupRecord(record, dn_table)
+    return RECORD_TYPES[kind](record)
+
+
+def as_dict(record):
+    """Plain dict for a compact or already plain record."""
+    return record.to_dict() if isinstance(record, CompactRecord) else record
+
+
+def deep_sizeof(obj, shared_strings=True):
+    """Bytes held by ``obj`` and everything it references, counting shared objects once.
+
+    With ``shared_strings=False`` string values are counted every time they
+    are referenced, as they are in records parsed one LDAP entry at a time.
+    """
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, str) and not shared_strings:
+            total += sys.getsizeof(obj)
+            continue
+        if id(obj) in seen or isinstance(obj, (DNTable, type)):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            for key in obj:
+                # Field names are shared constants either way
+                if id(key) not in seen:
+                    seen.add(id(key))
+                    total += sys.getsizeof(key)
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, CompactRecord):
+            stack.extend(getattr(obj, slot) for slot in type(obj).__slots__ if slot != 'dn_table')
+    return total
+
+
+def memory_report(objects, dn_table, sample=1000):
+    """Estimate bytes per object as plain dicts versus compact records.
+
+    ``objects`` maps kind to {id: record}. Up to ``sample`` records per kind
+    are measured and the totals extrapolated; the DN table is reported on
+    its own because the compact records share it.
+    """
+    report = {}
+    for kind, records in objects.items():
+        sampled = [record for _, record in zip(range(sample), records.values())]
+        if not sampled:
+            report[kind] = {'objects': 0, 'dictBytesPerObject': 0, 'compactBytesPerObject': 0}
+            continue
+        compact = deep_sizeof(sampled) - sys.getsizeof(sampled)
+        plain = [as_dict(record) for record in sampled]
+        dict_bytes = deep_sizeof(plain, shared_strings=False) - sys.getsizeof(plain)
+        report[kind] = {
+            'objects': len(records),
+            'dictBytesPerObject': round(dict_bytes / len(sampled)),
+            'compactBytesPerObject': round(compact / len(sampled)),
+            'estimatedDictBytes': round(dict_bytes / len(sampled) * len(records)),
+            'estimatedCompactBytes': round(compact / len(sampled) * len(records)),
+        }
+    report['dnTable'] = {
+        'entries': len(dn_table),
+        'bytes': deep_sizeof(dn_table.ids) + deep_sizeof(dn_table.dns)
+    }
+    return report
@@ -0,0 +1,402 @@
+import base64
+import bisect
+import json
+import logging
+import threading
+from datetime import datetime
+from ad_conn import build_dashboard_data, dn_cache
+from ad_membership import MembershipGraph
+from ad_records import DNTable, as_dict, compact_record, memory_report
+
+logger = logging.getLogger(__name__)
+
+# Attributes the list endpoints may sort on, per object kind
+SORTABLE_ATTRIBUTES = {
+    'users': ('sAMAccountName', 'cn', 'givenName', 'sn', 'mail', 'enabled'),
+    'groups': ('cn', 'description', 'member_count'),
+    'computers': ('name', 'dnsHostName', 'status'),
+}
+DEFAULT_SORT = {'users': 'sAMAccountName', 'groups': 'cn', 'computers': 'name'}
+# Sorted/filtered views kept per data version before the oldest is dropped
+MAX_CACHED_INDEXES = 32
+
+
+def _match_prefix(kind, record, prefix):
+    prefix = prefix.lower()
+    if kind == 'users':
+        return (record.get('cn', '').lower().startswith(prefix) or
+                record.get('sAMAccountName', '').lower().startswith(prefix))
+    if kind == 'computers':
+        return record.get('name', '').lower().startswith(prefix)
+    return record.get('cn', '').lower().startswith(prefix)
+
+
+def _match_mail_domain(kind, record, domain):
+    return record.get('mail', '').lower().endswith('@' + domain.lower().lstrip('@'))
+
+
+def _match_enabled(kind, record, enabled):
+    return bool(record.get('enabled')) == (enabled.lower() in ('1', 'true', 'yes'))
+
+
+# Attribute filters the list endpoints accept, per object kind
+FILTERS = {
+    'users': {'prefix': _match_prefix, 'mail_domain': _match_mail_domain, 'enabled': _match_enabled},
+    'groups': {'prefix': _match_prefix},
+    'computers': {'prefix': _match_prefix},
+}
+
+
+def _sort_key(value):
+    """Comparable key for mixed attribute values (bools, numbers, strings)."""
+    if isinstance(value, bool):
+        return (0, int(value))
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, str(value or '').lower())
+
+
+def encode_cursor(sort, key, object_id):
+    raw = json.dumps([sort, list(key), object_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor, sort):
+    try:
+        cursor_sort, key, object_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort:
+        raise ValueError("Cursor was issued for a different sort order")
+    return (tuple(key), object_id)
+
+
+def record_filter(kind, filters=None):
+    """Return a predicate that is true for records matching all ``filters``.
+
+    Raises ValueError for filters the kind does not support.
+    """
+    matchers = []
+    for name, value in (filters or {}).items():
+        if name not in FILTERS[kind]:
+            raise ValueError(f"Unsupported filter for {kind}: {name}")
+        matchers.append((FILTERS[kind][name], value))
+    return lambda record: all(match(kind, record, value) for match, value in matchers)
+
+
+def build_index(kind, records, sort=None, filters=None):
+    """Sort and filter ``records`` ({id: record}) into a list of (sort key, id).
+
+    Raises ValueError for attributes the kind cannot be sorted or filtered on.
+    """
+    sort = sort or DEFAULT_SORT[kind]
+    if sort not in SORTABLE_ATTRIBUTES[kind]:
+        raise ValueError(f"Cannot sort {kind} by {sort}")
+    matches = record_filter(kind, filters)
+
+    return sorted(
+        (_sort_key(record.get(sort)), object_id)
+        for object_id, record in records.items()
+        if matches(record)
+    )
+
+
+def page_index(index, records, sort, descending=False, limit=None, cursor=None):
+    """Return (page, next_cursor) from an index built by build_index.
+
+    The cursor records the last (sort key, id) handed out, so locating the
+    next page is a bisect plus a slice, independent of directory size.
+    """
+    if descending:
+        end = bisect.bisect_left(index, decode_cursor(cursor, sort)) if cursor else len(index)
+        start = 0 if limit is None else max(0, end - limit)
+        selected = index[start:end][::-1]
+        more = start > 0
+    else:
+        start = bisect.bisect_right(index, decode_cursor(cursor, sort)) if cursor else 0
+        end = len(index) if limit is None else min(len(index), start + limit)
+        selected = index[start:end]
+        more = end < len(index)
+
+    page = [records[object_id] for _, object_id in selected]
+    next_cursor = None
+    if more and selected:
+        key, object_id = selected[-1]
+        next_cursor = encode_cursor(sort, key, object_id)
+    return page, next_cursor
+
+
+class SyncInProgress(Exception):
+    """The local view is not built yet; its first sync is running in the background."""
+
+
+class DirectorySync:
+    """Locally held copy of the directory kept current through uSNChanged.
+
+    The first run (and any run after the watermark became unusable) reads
+    every user, group and computer. Later runs only ask the DC for objects
+    whose uSNChanged is above the stored highestCommittedUSN, plus the
+    tombstones created since then, and merge them into the local state.
+    uSNChanged polling is used instead of DirSync because it needs no
+    "Replicating Directory Changes" right for the service account.
+
+    Records are held as ad_records compact records, with DNs (of objects
+    and group members) interned in a DNTable; callers get plain dicts.
+    """
+
+    KINDS = ('users', 'groups', 'computers', 'domainControllers')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects = {kind: {} for kind in self.KINDS}
+        self.dn_table = DNTable()
+        self.dns = {}  # objectGUID -> DN id in dn_table
+        self.watermark = None
+        self.last_sync = None
+        self.last_mode = None
+        self.last_changes = 0
+        self.version = 0
+        self._stale = False
+        self._indexes = {}
+        self._membership = None
+        # Serializes whole sync runs (collector and request threads alike)
+        self._sync_lock = threading.RLock()
+        self._initial_sync = None  # thread started by ensure_fresh() before the first sync
+
+    def _needs_full_sync(self, current):
+        """A stored watermark is only usable against the same DC database."""
+        if self.watermark is None:
+            return True
+        if current['server'] != self.watermark['server']:
+            logger.info("Domain controller changed, running full directory sync")
+            return True
+        if current['invocationId'] != self.watermark['invocationId']:
+            logger.info("DC invocationId changed (restore?), running full directory sync")
+            return True
+        if current['usn'] < self.watermark['usn']:
+            logger.warning("highestCommittedUSN went backwards, running full directory sync")
+            return True
+        return False
+
+    def sync(self, ad_manager, full=False):
+        """Bring the local state up to date and return the sync mode used.
+
+        The watermark read and every search of the run share one pinned
+        connection: USNs are local to a DC, so with several DCs a watermark
+        read on one and a delta search on another would skip or replay
+        changes. Runs are serialized: a full sync swaps in a new DNTable,
+        which an overlapping incremental run would intern into stale ids.
+        """
+        with self._sync_lock, ad_manager.pinned_connection():
+            return self._sync(ad_manager, full)
+
+    def _sync(self, ad_manager, full):
+        # Read the watermark before searching so changes that land during
+        # the search are picked up again by the next run
+        self._stale = False
+        current = ad_manager.get_sync_watermark()
+
+        if full or self._needs_full_sync(current):
+            objects = {kind: {} for kind in self.KINDS}
+            dns = {}
+            dn_table = DNTable()
+            changes = 0
+            for kind, guid, dn, record in ad_manager.iter_directory_changes():
+                objects[kind][guid] = compact_record(kind, record, dn_table)
+                dns[guid] = dn_table.intern(dn, canonical=True)
+                changes += 1
+            with self.lock:
+                self.objects = objects
+                self.dns = dns
+                self.dn_table = dn_table
+                self._indexes = {}
+                self._membership = None
+            mode = 'full'
+        else:
+            since = self.watermark['usn']
+            changed = list(ad_manager.iter_directory_changes(since_usn=since))
+            deleted = list(ad_manager.iter_deleted_objects(since))
+            moved = []  # DNs objects were renamed or moved away from, or deleted at
+            with self.lock:
+                dn_table = self.dn_table
+                for kind, guid, dn, record in changed:
+                    previous = self.dns.get(guid)
+                    if previous is not None and dn_table.dn(previous).lower() != dn.lower():
+                        moved.append(dn_table.dn(previous))
+                        self._rename(previous, dn)
+            # Interned only now, so member DNs in this batch map to the ids renamed above
+            changed = [(kind, guid, dn_table.intern(dn, canonical=True), compact_record(kind, record, dn_table))
+                       for kind, guid, dn, record in changed]
+            with self.lock:
+                for kind, guid, dn, record in changed:
+                    self.objects[kind][guid] = record
+                    self.dns[guid] = dn
+                # A computer that lost SERVER_TRUST_ACCOUNT is no longer a DC
+                changed_dcs = {guid for kind, guid, _, _ in changed if kind == 'domainControllers'}
+                for kind, guid, _, _ in changed:
+                    if kind == 'computers' and guid not in changed_dcs:
+                        self.objects['domainControllers'].pop(guid, None)
+                for guid in deleted:
+                    previous = self.dns.pop(guid, None)
+                    if previous is not None:
+                        moved.append(dn_table.dn(previous))
+                    for kind in self.KINDS:
+                        self.objects[kind].pop(guid, None)
+                if changed or deleted:
+                    self._indexes = {}
+                    self._membership = None
+            # Changes made elsewhere: writes must not go to the old DN first
+            dn_cache.invalidate_dn(*moved)
+            changes = len(changed) + len(deleted)
+            mode = 'incremental'
+
+        with self.lock:
+            self.watermark = current
+            self.last_sync = datetime.now()
+            self.last_mode = mode
+            self.last_changes = changes
+            if changes or mode == 'full':
+                self.version += 1
+        logger.info("Directory sync (%s) applied %s changes up to USN %s", mode, changes, current['usn'])
+        return mode
+
+    def _rename(self, dn_id, dn):
+        """Keep a renamed or moved object's DN id, pointed at its new DN.
+
+        Moving a member does not change the uSNChanged of its groups, so
+        their member lists are not read again; they follow the object
+        because they hold its id. Caller holds self.lock.
+        """
+        other = self.dn_table.rename(dn_id, dn)
+        if other is None or other in set(self.dns.values()):
+            # Unknown so far, or another object's DN it gave up in this batch
+            return
+        # Member references to the new DN seen before the object moved there
+        for record in self.objects['groups'].values():
+            member_ids = record.member_ids
+            for i, member_id in enumerate(member_ids):
+                if member_id == other:
+                    member_ids[i] = dn_id
+
+    def _is_fresh(self, max_age):
+        return (not self._stale and self.last_sync is not None and
+                (datetime.now() - self.last_sync).total_seconds() < max_age)
+
+    def mark_stale(self, resources=None):
+        """Make the next ensure_fresh() sync, e.g. after a write through this process."""
+        self._stale = True
+
+    def _start_initial_sync(self, ad_manager):
+        def run():
+            try:
+                # The collector may be running the first sync already
+                with self._sync_lock:
+                    if self.last_sync is None:
+                        self.sync(ad_manager)
+            except Exception as e:
+                logger.error("Initial directory sync failed: %s", e)
+
+        with self.lock:
+            if self._initial_sync is not None and self._initial_sync.is_alive():
+                return
+            self._initial_sync = threading.Thread(target=run, name='directory-sync', daemon=True)
+            self._initial_sync.start()
+
+    def ensure_fresh(self, ad_manager, max_age):
+        """Run an incremental sync if the local state is older than ``max_age`` seconds.
+
+        Until the first sync has finished this raises SyncInProgress
+        instead: reading the whole directory takes longer than a request
+        may, so it runs on a background thread and callers answer from a
+        live search meanwhile.
+        """
+        if self._is_fresh(max_age):
+            return
+        if self.last_sync is None:
+            self._start_initial_sync(ad_manager)
+            raise SyncInProgress("Initial directory sync in progress")
+        # Concurrent requests wait for one sync instead of each starting their own
+        with self._sync_lock:
+            if self._is_fresh(max_age):
+                return
+            self.sync(ad_manager)
+
+    def _index(self, kind, sort, filters):
+        # Caller holds self.lock
+        cache_key = (kind, sort, tuple(sorted((filters or {}).items())))
+        index = self._indexes.get(cache_key)
+        if index is None:
+            index = build_index(kind, self.objects[kind], sort, filters)
+            if len(self._indexes) >= MAX_CACHED_INDEXES:
+                self._indexes.pop(next(iter(self._indexes)))
+            self._indexes[cache_key] = index
+        return index
+
+    def query(self, kind, sort=None, descending=False, filters=None, limit=None, cursor=None):
+        """Page through one object kind of the local state.
+
+        Sorted and filtered indexes are built once per data version and then
+        reused, so following a cursor costs O(log n + page size).
+        """
+        sort = sort or DEFAULT_SORT[kind]
+        with self.lock:
+            records = self.objects[kind]
+            index = self._index(kind, sort, filters)
+            page, next_cursor = page_index(index, records, sort, descending, limit, cursor)
+            return [as_dict(record) for record in page], next_cursor, len(index)
+
+    def iter_query(self, kind, sort=None, descending=False, filters=None):
+        """Yield every matching record of one kind in sort order.
+
+        Only the (shared, cached) index is taken under the lock; records are
+        looked up as they are consumed, so a full export holds no copy of
+        the directory. Objects deleted by a sync in the meantime are skipped.
+        """
+        sort = sort or DEFAULT_SORT[kind]
+        with self.lock:
+            records = self.objects[kind]
+            index = self._index(kind, sort, filters)
+        for _, object_id in (reversed(index) if descending else index):
+            record = records.get(object_id)
+            if record is not None:
+                yield as_dict(record)
+
+    def membership(self):
+        """Nested-group graph for the current data version, built on first use."""
+        with self.lock:
+            if self._membership is None:
+                self._membership = MembershipGraph(self.objects, self.dns, self.dn_table)
+                for cycle in self._membership.cycles:
+                    logger.warning("Group nesting cycle: %s", ' -> '.join(cycle))
+            return self._membership
+
+    def memory_report(self, sample=1000):
+        """Bytes per object of the local state, compact versus as plain dicts."""
+        with self.lock:
+            return memory_report(self.objects, self.dn_table, sample)
+
+    def snapshot(self):
+        """Return lists of users, groups, computers and DCs from local state."""
+        with self.lock:
+            return {kind: list(records.values()) for kind, records in self.objects.items()}
+
+    def dashboard_data(self):
+        """Dashboard payload built from local state instead of a live scan."""
+        snapshot = self.snapshot()
+        data = build_dashboard_data(snapshot['users'], snapshot['groups'],
+                                    snapshot['computers'], snapshot['domainControllers'])
+        data['sync'] = self.status()
+        return data
+
+    def status(self):
+        with self.lock:
+            return {
+                'mode': self.last_mode,
+                'usn': self.watermark['usn'] if self.watermark else None,
+                'changes': self.last_changes,
+                'lastSync': self.last_sync.isoformat() if self.last_sync else None
+            }
+
+
+# Process-wide state used by the background collector
+directory_sync = DirectorySync()
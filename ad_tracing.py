@@ -0,0 +1,247 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# JSONL file the finished spans are appended to, one object per line
+AD_TRACE_FILE = os.environ.get('AD_TRACE_FILE', 'logs/traces.jsonl')
+# Share of new traces that are recorded (0 turns tracing off); an incoming traceparent decides for itself
+AD_TRACE_SAMPLE_RATE = float(os.environ.get('AD_TRACE_SAMPLE_RATE', 1))
+# Size at which the trace file is rotated to <file>.1
+AD_TRACE_MAX_BYTES = int(os.environ.get('AD_TRACE_MAX_BYTES', 50*1024*1024))
+# Spans waiting for the writer thread; further spans are dropped, never waited on
+AD_TRACE_QUEUE_SIZE = int(os.environ.get('AD_TRACE_QUEUE_SIZE', 10000))
+
+# W3C trace context header: version-traceid-parentid-flags
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_span = contextvars.ContextVar('ad_trace_span', default=None)
+
+
+def _new_id(bits):
+    return f'{random.getrandbits(bits):0{bits // 4}x}'
+
+
+class Span:
+    """One timed operation of a trace; ``parent_id`` is None for the root span."""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attributes', 'start', 'started', 'error')
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self, duration):
+        return {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentId': self.parent_id,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'durationMs': round(duration * 1000, 3),
+            'status': 'error' if self.error else 'ok',
+            'error': self.error,
+            'thread': threading.current_thread().name,
+            'pid': os.getpid(),
+            'attributes': self.attributes
+        }
+
+
+class JSONLExporter:
+    """Appends finished spans to a JSONL file from a background thread.
+
+    Callers only put the span on a bounded queue; when it is full the span
+    is dropped and counted. The file is opened in append mode, so several
+    worker processes may share it (each rotates it on its own once it
+    reaches AD_TRACE_MAX_BYTES).
+    """
+
+    def __init__(self, path, max_bytes=AD_TRACE_MAX_BYTES, queue_size=AD_TRACE_QUEUE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.queue = queue.Queue(queue_size)
+        self.dropped = 0
+        self.exported = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def export(self, record):
+        self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='trace-export', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _write(self, records):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(record, default=str) + '\n' for record in records))
+            size = f.tell()
+        self.exported += len(records)
+        if self.max_bytes and size >= self.max_bytes:
+            os.replace(self.path, self.path + '.1')
+
+    def _drain(self, block):
+        records = [self.queue.get()] if block else []
+        while True:
+            try:
+                records.append(self.queue.get_nowait())
+            except queue.Empty:
+                return records
+
+    def _run(self):
+        while True:
+            records = self._drain(block=True)
+            try:
+                self._write(records)
+            except Exception as e:
+                self.dropped += len(records)
+                logger.warning("Writing spans to %s failed: %s", self.path, e)
+
+    def flush(self):
+        """Write what is still queued (at exit; the writer thread may already be gone)."""
+        records = self._drain(block=False)
+        if records:
+            try:
+                self._write(records)
+            except Exception as e:
+                logger.warning("Writing spans to %s failed: %s", self.path, e)
+
+    def stats(self):
+        return {'file': self.path, 'exported': self.exported, 'dropped': self.dropped, 'queued': self.queue.qsize()}
+
+
+exporter = JSONLExporter(AD_TRACE_FILE)
+
+
+def current_span():
+    return _span.get()
+
+
+def parse_traceparent(header):
+    """``(trace_id, parent_id, sampled)`` from a W3C traceparent header, or None."""
+    match = TRACEPARENT.match((header or '').strip().lower())
+    if not match or match.group(1) == '0' * 32:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+def start_trace(name, traceparent=None, **attributes):
+    """Open the root span of a request or background run and make it current.
+
+    Returns ``(span, token)`` for end_trace(); span is None when the trace
+    is not sampled, which makes all nested spans no-ops.
+    """
+    parent = parse_traceparent(traceparent)
+    if parent is not None:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id, parent_id = None, None
+        sampled = AD_TRACE_SAMPLE_RATE > 0 and random.random() < AD_TRACE_SAMPLE_RATE
+    root = Span(name, trace_id or _new_id(128), parent_id, attributes) if sampled else None
+    return root, _span.set(root)
+
+
+def end_trace(span, token, error=None):
+    _span.reset(token)
+    end_span(span, error)
+
+
+def start_span(name, **attributes):
+    """Child span of the current span, or None outside a sampled trace.
+
+    Does not become current itself; use span() for operations with children.
+    """
+    parent = _span.get()
+    if parent is None:
+        return None
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+def end_span(span, error=None, **attributes):
+    if span is None:
+        return
+    duration = time.perf_counter() - span.started
+    if attributes:
+        span.attributes.update(attributes)
+    if error is not None:
+        span.error = str(error)[:500]
+    exporter.export(span.to_dict(duration))
+
+
+@contextmanager
+def span(name, **attributes):
+    """Child span around a block; spans started inside become its children."""
+    child = start_span(name, **attributes)
+    if child is None:
+        yield None
+        return
+    token = _span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = child.error or f'{type(e).__name__}: {e}'[:500]
+        raise
+    finally:
+        _span.reset(token)
+        end_span(child)
+
+
+@contextmanager
+def trace(name, **attributes):
+    """Root span around a block run outside a request, e.g. one collector run."""
+    root, token = start_trace(name, **attributes)
+    error = None
+    try:
+        yield root
+    except BaseException as e:
+        error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        end_trace(root, token, error)
+
+
+@contextmanager
+def span_scope(parent):
+    """Make ``parent`` current in a worker thread so its operations join the trace.
+
+    Use around work handed to other threads (thread pools do not carry
+    context variables over).
+    """
+    if parent is None:
+        yield
+        return
+    token = _span.set(parent)
+    try:
+        yield
+    finally:
+        _span.reset(token)
@@ -1,11 +1,19 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, g
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, session, g, send_file
 import os
-import logging
-from logging.handlers import RotatingFileHandler
 from werkzeug.security import generate_password_hash, check_password_hash
 from database import init_db, get_db, close_db
 import sqlite3
-from ad_conn import ActiveDirectoryManager
+from ldap3.utils.conv import escape_filter_chars
+from ad_conn import ActiveDirectoryManager, ldap_attributes, project
+from ad_cache import response_cache
+from http_cache import PreparedJSON, prepared_responses, serialize_payload, prepared_from_serialized, json_response
+from ad_sync import directory_sync, build_index, page_index, record_filter, DEFAULT_SORT, SyncInProgress
+from ad_logging import configure_logging, dropped_records
+from ad_profiling import (TimedSQLiteConnection, start_capture, stop_capture, should_profile, should_save,
+                          save_capture, list_captures, capture_path)
+from ad_tracing import start_trace, end_trace, trace, span, exporter as trace_exporter
+from ad_metrics import registry, HTTP_REQUEST_SECONDS, COLLECTOR_RUNS, COLLECTOR_SECONDS, COLLECTOR_LAST_SUCCESS, DB_CONNECTIONS
+from import_jobs import init_import_db, create_import_job, start_import_job, get_import_job, list_import_jobs
 import json
 from datetime import datetime, timedelta
 import threading
@@ -14,33 +22,123 @@ import time
 # Fallback SQLite-Datenbank für den Fall, dass MySQL nicht verfügbar ist
 SQLITE_DATABASE = 'users.db'
 
+# 'incremental' keeps a local directory copy updated via uSNChanged,
+# 'full' re-reads the whole directory on every collector run
+AD_SYNC_MODE = os.environ.get('AD_SYNC_MODE', 'incremental')
+# Maximum age in seconds of the local directory view behind the list APIs
+AD_VIEW_MAX_AGE = int(os.environ.get('AD_VIEW_MAX_AGE', 30))
+# Record fields the list filters look at, per object kind
+FILTER_FIELDS = {
+    'users': {'enabled': ['enabled'], 'prefix': ['cn', 'sAMAccountName'], 'mail_domain': ['mail']},
+    'groups': {'prefix': ['cn']},
+    'computers': {'prefix': ['name']},
+}
+# Records serialized per chunk written to a streaming (NDJSON) export
+AD_STREAM_BATCH = int(os.environ.get('AD_STREAM_BATCH', 200))
+# Add DCs found in the directory to the configured AD_DOMAIN_CONTROLLER list
+AD_DC_DISCOVERY = os.environ.get('AD_DC_DISCOVERY', '0').lower() in ('1', 'true', 'yes')
+# Upper bound on operations accepted by /api/ad/users/batch
+AD_BATCH_MAX_OPERATIONS = int(os.environ.get('AD_BATCH_MAX_OPERATIONS', 1000))
+# Bearer token required by /metrics; empty leaves it open to the network
+AD_METRICS_TOKEN = os.environ.get('AD_METRICS_TOKEN', '')
+
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 app.teardown_appcontext(close_db)
+init_import_db()
+# Writes through this process also make the synced view catch up on the next request
+response_cache.add_listener(directory_sync.mark_stale)
+
+@app.after_request
+def add_ad_server_header(response):
+    """Tell clients which domain controller answered the request."""
+    if g.get('ad_server'):
+        response.headers['X-AD-Domain-Controller'] = g.ad_server
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
 
-# Configure logging
-if not os.path.exists('logs'):
-    os.makedirs('logs')
+@app.after_request
+def record_request_metrics(response):
+    """Observe the request latency per route (the URL rule, not the concrete path)."""
+    if 'request_started' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_started,
+                                     route, request.method, str(response.status_code))
+    return response
 
-file_handler = RotatingFileHandler('logs/app.log', maxBytes=1024*1024*10, backupCount=5)
-file_handler.setFormatter(logging.Formatter(
-    '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-))
-file_handler.setLevel(logging.INFO)
+# Share metric values with the other worker processes (if AD_METRICS_DIR is set)
+registry.start_flusher()
 
-stream_handler = logging.StreamHandler()
-stream_handler.setLevel(logging.INFO)
+@app.before_request
+def start_request_capture():
+    """Record an LDAP/SQL timeline for every request; profile it on ?__profile=1 or when sampled."""
+    requested = request.args.get('__profile') == '1' and 'user_id' in session
+    capture, token = start_capture(should_profile(requested), this_thread=not request.environ.get('ad.coroutine'))
+    g.profile_capture = (capture, token, requested)
 
-app.logger.addHandler(file_handler)
-app.logger.addHandler(stream_handler)
-app.logger.setLevel(logging.INFO)
+@app.before_request
+def start_request_trace():
+    """Open the root span of the request; a W3C traceparent header continues the caller's trace."""
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.trace = start_trace(f'{request.method} {route}', request.headers.get('traceparent'),
+                          method=request.method, route=route, path=request.path)
+
+@app.after_request
+def remember_response_status(response):
+    g.response_status = response.status_code
+    root = g.trace[0] if 'trace' in g else None
+    if root is not None:
+        root.set(status=response.status_code)
+        response.headers['X-Trace-Id'] = root.trace_id
+    return response
+
+@app.teardown_request
+def end_request_trace(exc=None):
+    entry = g.pop('trace', None)
+    if entry is None:
+        return
+    root, token = entry
+    status = g.get('response_status', 500)
+    end_trace(root, token, exc or (f'HTTP {status}' if status >= 500 else None))
+
+@app.teardown_request
+def save_request_capture(exc=None):
+    """Store the capture of profiled and slow requests (failed ones included) in the ring buffer."""
+    entry = g.pop('profile_capture', None)
+    if entry is None:
+        return
+    capture, token, requested = entry
+    stop_capture(capture, token)
+    duration = time.perf_counter() - capture.started
+    if not should_save(capture, duration):
+        return
+    try:
+        save_capture(capture, {
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else None,
+            'path': request.path,
+            'status': g.get('response_status', 500),
+            'durationMs': round(duration * 1000, 1),
+            'reason': 'requested' if requested else 'sampled' if capture.profile else 'slow',
+            'traceId': g.trace[0].trace_id if g.get('trace') and g.trace[0] else None,
+            'error': str(exc) if exc else None
+        })
+    except Exception as e:
+        app.logger.error("Could not save request capture: %s", e)
+
+# Configure logging (file and console written by a background thread, see ad_logging)
+configure_logging(app)
 
 # SQLite-Fallback-Funktionen
 def get_sqlite_db():
     """Verbindung zur SQLite-Datenbank herstellen."""
     if 'sqlite_db' not in g:
-        g.sqlite_db = sqlite3.connect(SQLITE_DATABASE)
+        g.sqlite_db = sqlite3.connect(SQLITE_DATABASE, factory=TimedSQLiteConnection)
         g.sqlite_db.row_factory = sqlite3.Row
+        DB_CONNECTIONS.inc('sqlite', 'success')
     return g.sqlite_db
 
 def close_sqlite_db(e=None):
@@ -69,36 +167,62 @@ def collect_ad_data():
     with app.app_context():
         while True:
             try:
-                app.logger.info("Starting AD data collection...")
-                ad_manager = ActiveDirectoryManager()
+                # One trace per run; the LDAP operations below become its spans
+                with trace('collector.run', mode=AD_SYNC_MODE):
+                    app.logger.info("Starting AD data collection...")
+                    started = time.monotonic()
+                    ad_manager = ActiveDirectoryManager()
                 
-                # Get dashboard data (includes users, groups, computers)
-                data = ad_manager.get_dashboard_data()
+                    # Re-rank the DCs by round trip (and pick up new ones)
+                    try:
+                        with span('collector.refresh_domain_controllers'):
+                            ad_manager.refresh_domain_controllers(discover=AD_DC_DISCOVERY)
+                    except Exception as e:
+                        app.logger.error("Could not refresh domain controllers: %s", e)
                 
-                # Add metadata if not already present
-                data['metadata'] = {
-                    'timestamp': datetime.now().isoformat(),
-                    'server': ad_manager.domain_controller
-                }
+                    if AD_SYNC_MODE == 'incremental':
+                        # Only fetch objects changed since the last run
+                        try:
+                            with span('collector.sync'):
+                                directory_sync.sync(ad_manager)
+                            data = directory_sync.dashboard_data()
+                        except Exception as e:
+                            app.logger.error("Incremental sync failed, falling back to full scan: %s", e)
+                            with span('collector.dashboard', fallback=True):
+                                data = ad_manager.get_dashboard_data()
+                    else:
+                        # Get dashboard data (includes users, groups, computers)
+                        with span('collector.dashboard'):
+                            data = ad_manager.get_dashboard_data()
                 
-                # Save to file
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f'ad_data/ad_data_{timestamp}.json'
+                    # Add metadata if not already present
+                    data['metadata'] = {
+                        'timestamp': datetime.now().isoformat(),
+                        'server': ad_manager.active_dc or ad_manager.domain_controller
+                    }
                 
-                # Create directory if it doesn't exist
-                if not os.path.exists('ad_data'):
-                    os.makedirs('ad_data')
+                    # Save to file
+                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                    filename = f'ad_data/ad_data_{timestamp}.json'
                 
-                with open(filename, 'w') as f:
-                    json.dump(data, f, indent=2)
+                    # Create directory if it doesn't exist
+                    if not os.path.exists('ad_data'):
+                        os.makedirs('ad_data')
                 
-                app.logger.info(f"AD data saved to {filename}")
-                ad_manager.disconnect()
+                    with span('collector.save', file=filename), open(filename, 'w') as f:
+                        json.dump(data, f, indent=2)
+                
+                    app.logger.info("AD data saved to %s", filename)
+                    ad_manager.disconnect()
+                    COLLECTOR_SECONDS.observe(time.monotonic() - started)
+                    COLLECTOR_RUNS.inc('success')
+                    COLLECTOR_LAST_SUCCESS.set(time.time())
                 
                 # Sleep for 5 minutes before next collection
                 time.sleep(300)
             except Exception as e:
-                app.logger.error(f"Error collecting AD data: {str(e)}")
+                app.logger.error("Error collecting AD data: %s", e)
+                COLLECTOR_RUNS.inc('error')
                 # Sleep for 1 minute before retry on error
                 time.sleep(60)
 
@@ -106,9 +230,11 @@ def collect_ad_data():
 with app.app_context():
     try:
         app.logger.info("Versuche, MySQL-Datenbank zu initialisieren...")
-        init_db()
+        if not init_db():
+            # Ohne MySQL laufen Login und Registrierung über SQLite
+            init_sqlite_db()
     except Exception as e:
-        app.logger.error(f"Fehler bei der MySQL-Initialisierung: {e}")
+        app.logger.error("Fehler bei der MySQL-Initialisierung: %s", e)
         app.logger.info("Verwende SQLite als Fallback...")
         init_sqlite_db()
 
@@ -150,7 +276,7 @@ def login():
             db = get_sqlite_db()
             user = db.execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
     except Exception as e:
-        app.logger.error(f"Fehler bei der Datenbankabfrage: {e}")
+        app.logger.error("Fehler bei der Datenbankabfrage: %s", e)
         # Fallback zu SQLite
         app.logger.info("Fallback zu SQLite für Login...")
         db = get_sqlite_db()
@@ -214,7 +340,7 @@ def register():
             )
             db.commit()
     except Exception as e:
-        app.logger.error(f"Fehler bei der Registrierung: {e}")
+        app.logger.error("Fehler bei der Registrierung: %s", e)
         # Fallback zu SQLite
         app.logger.info("Fallback zu SQLite für Registrierung...")
         db = get_sqlite_db()
@@ -264,17 +390,152 @@ def ad_dashboard():
     
     return render_template('ad_dashboard.html', user=user)
 
+def live_fields(kind, attributes, sort, filters):
+    """Record fields a live listing needs: the requested ones plus those used for sorting and filtering."""
+    if not attributes:
+        return None
+    fields = set(attributes) | {sort or DEFAULT_SORT[kind]}
+    fields |= {field for name in filters for field in FILTER_FIELDS[kind].get(name, [])}
+    return sorted(fields)
+
+def load_directory_page(kind, fetch_live, sort, descending, limit, cursor, filters, attributes):
+    """Build one list response payload, from the synced view or a live listing."""
+    ad_manager = ActiveDirectoryManager()
+    try:
+        try:
+            directory_sync.ensure_fresh(ad_manager, AD_VIEW_MAX_AGE)
+            page, next_cursor, total = directory_sync.query(kind, sort, descending, filters, limit, cursor)
+        except ValueError:
+            raise
+        except Exception as e:
+            log = app.logger.info if isinstance(e, SyncInProgress) else app.logger.error
+            log("Directory view unavailable, listing %s live: %s", kind, e)
+            fields = live_fields(kind, attributes, sort, filters)
+            records = {str(i): record for i, record in enumerate(fetch_live(ad_manager, fields))}
+            index = build_index(kind, records, sort, filters)
+            page, next_cursor = page_index(index, records, sort or DEFAULT_SORT[kind], descending, limit, cursor)
+            total = len(index)
+    finally:
+        ad_manager.disconnect()
+
+    if attributes:
+        page = [project(record, attributes) for record in page]
+    return {'success': True, kind: page, 'total': total, 'nextCursor': next_cursor}
+
+def wants_stream():
+    """True if the client asked for newline-delimited JSON (``?stream=1`` or ``Accept: application/x-ndjson``)."""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+
+def stream_directory_objects(kind, iter_live, sort, descending, filters, attributes):
+    """Stream every matching object as one JSON document per line.
+
+    Records come straight from the synced view (in sort order) or, if it
+    is unavailable, from the paged live search (in directory order), and
+    are written out in chunks of AD_STREAM_BATCH lines, so memory use does
+    not grow with the directory and the first lines go out before the
+    last page has been read. An error after the response has started is
+    reported as a final ``{"error": ...}`` line.
+    """
+    def records():
+        ad_manager = ActiveDirectoryManager()
+        try:
+            try:
+                directory_sync.ensure_fresh(ad_manager, AD_VIEW_MAX_AGE)
+                source = directory_sync.iter_query(kind, sort, descending, filters)
+            except Exception as e:
+                log = app.logger.info if isinstance(e, SyncInProgress) else app.logger.error
+                log("Directory view unavailable, streaming %s live: %s", kind, e)
+                matches = record_filter(kind, filters)
+                source = (record for record in iter_live(ad_manager, live_fields(kind, attributes, sort, filters))
+                          if matches(record))
+            yield from source
+        finally:
+            ad_manager.disconnect()
+
+    def generate():
+        # Runs after the view has returned, outside its request context
+        lines = []
+        count = 0
+        with app.app_context():
+            try:
+                for record in records():
+                    lines.append(app.json.dumps(project(record, attributes) if attributes else record))
+                    if len(lines) >= AD_STREAM_BATCH:
+                        count += len(lines)
+                        yield '\n'.join(lines) + '\n'
+                        lines = []
+            except Exception as e:
+                app.logger.error("Streaming %s failed after %s records: %s", kind, count + len(lines), e)
+                lines.append(app.json.dumps({'error': str(e)}))
+            if lines:
+                yield '\n'.join(lines) + '\n'
+
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def list_directory_objects(kind, fetch_live, stream_live):
+    """Serve one page of users, groups or computers from the locally synced directory.
+
+    Query parameters: ``limit``, ``cursor``, ``sort`` (prefix with ``-`` for
+    descending), the attribute filters ``enabled``, ``prefix`` and
+    ``mail_domain`` and ``attributes`` (comma separated record fields to
+    return). Without ``limit`` every matching object is returned. Pages
+    are served through ad_cache.response_cache, which successful writes
+    in ActiveDirectoryManager invalidate.
+
+    With ``?stream=1`` or ``Accept: application/x-ndjson`` the whole
+    (filtered, sorted) listing is streamed instead; ``limit`` and
+    ``cursor`` are ignored and the response cache is bypassed. When the
+    view is unavailable, ``stream_live(ad_manager, fields)`` supplies the
+    records as a paged generator instead of ``fetch_live``'s list.
+    """
+    sort = request.args.get('sort') or None
+    descending = bool(sort and sort.startswith('-'))
+    if descending:
+        sort = sort[1:]
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit <= 0:
+        return jsonify({'success': False, 'message': 'limit must be positive'}), 400
+    cursor = request.args.get('cursor') or None
+    filters = {name: request.args[name] for name in ('enabled', 'prefix', 'mail_domain') if request.args.get(name)}
+    attributes = [name.strip() for name in request.args.get('attributes', '').split(',') if name.strip()]
+
+    if wants_stream():
+        try:
+            # Validate before the response starts; errors later can only be reported in-band
+            ldap_attributes(kind, attributes)
+            build_index(kind, {}, sort, filters)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        return stream_directory_objects(kind, stream_live, sort, descending, filters, attributes)
+
+    cache_key = json.dumps([sort, descending, limit, cursor, filters, attributes], sort_keys=True)
+
+    def load():
+        # Cached serialized, so a hit costs no JSON encoding
+        return serialize_payload(load_directory_page(kind, fetch_live, sort, descending, limit, cursor,
+                                                     filters, attributes))
+
+    try:
+        ldap_attributes(kind, attributes)  # reject unknown fields up front
+        serialized = response_cache.get_or_load(kind, cache_key, load)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return json_response(prepared_from_serialized(serialized))
+
 @app.route('/api/ad/users')
 def get_ad_users():
     """API endpoint to get Active Directory users"""
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
-    ad_manager = ActiveDirectoryManager()
-    users = ad_manager.get_users()
-    ad_manager.disconnect()
-    
-    return jsonify({'success': True, 'users': users})
+    return list_directory_objects('users',
+                                  lambda ad_manager, fields: ad_manager.get_users(attributes=fields),
+                                  lambda ad_manager, fields: ad_manager.iter_users(attributes=fields))
 
 @app.route('/api/ad/groups')
 def get_ad_groups():
@@ -282,11 +543,85 @@ def get_ad_groups():
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
+    return list_directory_objects('groups',
+                                  lambda ad_manager, fields: ad_manager.get_groups(attributes=fields),
+                                  lambda ad_manager, fields: ad_manager.iter_groups(attributes=fields))
+
+@app.route('/api/ad/computers')
+def get_ad_computers():
+    """API endpoint to get Active Directory computers"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    return list_directory_objects('computers',
+                                  lambda ad_manager, fields: ad_manager.get_computers(attributes=fields),
+                                  lambda ad_manager, fields: ad_manager.iter_computers(attributes=fields))
+
+@app.route('/api/ad/users/batch', methods=['POST'])
+def batch_ad_users():
+    """API endpoint to enable, disable or reset passwords for many users at once"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    data = request.get_json(silent=True)
+    operations = data.get('operations') if isinstance(data, dict) else data
+    if not isinstance(operations, list) or not all(isinstance(op, dict) for op in operations):
+        return jsonify({'success': False, 'message': 'A list of operations is required'}), 400
+    if len(operations) > AD_BATCH_MAX_OPERATIONS:
+        return jsonify({'success': False, 'message': f'At most {AD_BATCH_MAX_OPERATIONS} operations per batch'}), 400
+    
+    app.logger.info("Batch user API call with %s operations", len(operations))
     ad_manager = ActiveDirectoryManager()
-    groups = ad_manager.get_groups()
-    ad_manager.disconnect()
+    try:
+        results = ad_manager.batch_user_operations(operations)
+    except Exception as e:
+        app.logger.error("Unexpected error in batch user API: %s", e, exc_info=True)
+        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
+    finally:
+        ad_manager.disconnect()
     
-    return jsonify({'success': True, 'groups': groups})
+    # The operations ran on worker threads, outside this request
+    g.ad_server = ad_manager.active_dc
+    succeeded = sum(1 for result in results if result['success'])
+    return jsonify({
+        'success': succeeded == len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'results': results
+    })
+
+@app.route('/api/ad/users/import', methods=['GET', 'POST'])
+def import_ad_users():
+    """API endpoint to start a CSV user import job or list recent jobs"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    if request.method == 'GET':
+        return jsonify({'success': True, 'jobs': list_import_jobs()})
+    
+    # Either a multipart upload in 'file' or the CSV as the raw request body
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    filename = upload.filename if upload else None
+    try:
+        job_id, rows = create_import_job(stream, filename=filename, created_by=session.get('user_name'))
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    app.logger.info("Import job %s queued with %s valid rows", job_id, len(rows))
+    start_import_job(app, job_id, rows)
+    return jsonify({'success': True, 'jobId': job_id, 'job': get_import_job(job_id)}), 202
+
+@app.route('/api/ad/users/import/<job_id>')
+def get_import_job_status(job_id):
+    """API endpoint to poll the progress of a CSV user import job"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    job = get_import_job(job_id, rows=request.args.get('rows'))
+    if job is None:
+        return jsonify({'success': False, 'message': 'Import job not found'}), 404
+    return jsonify({'success': True, 'job': job})
 
 @app.route('/api/ad/user/<username>', methods=['GET', 'POST', 'PUT', 'DELETE'])
 def manage_ad_user(username):
@@ -294,17 +629,17 @@ def manage_ad_user(username):
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
-    app.logger.info(f"User API call for: {username}, method: {request.method}")
+    app.logger.info("User API call for: %s, method: %s", username, request.method)
     ad_manager = ActiveDirectoryManager()
     
     try:
         if request.method == 'GET':
             # Get user details using sAMAccountName
             try:
-                users = ad_manager.get_users(filter=f"(sAMAccountName={username})")
-                app.logger.info(f"Users fetched: {users}")
+                users = ad_manager.get_users(custom_filter=f"(sAMAccountName={escape_filter_chars(username)})")
+                app.logger.debug("Fetched %s users for %s", len(users), username)
             except Exception as e:
-                app.logger.error(f"Error fetching user: {str(e)}", exc_info=True)
+                app.logger.error("Error fetching user: %s", e, exc_info=True)
                 ad_manager.disconnect()
                 return jsonify({'success': False, 'message': f'Error fetching user: {str(e)}'}), 500
             
@@ -334,7 +669,8 @@ def manage_ad_user(username):
         elif request.method == 'PUT':
             # Update user (enable/disable or reset password)
             data = request.get_json()
-            app.logger.info(f"PUT data: {data}")
+            # The body may carry a new password, so only the action is logged
+            app.logger.info("PUT action for %s: %s", username, (data or {}).get('action'))
             
             action = data.get('action')
             if not action:
@@ -363,7 +699,7 @@ def manage_ad_user(username):
             return jsonify({'success': False, 'message': 'User deletion not implemented'}), 501
             
     except Exception as e:
-        app.logger.error(f"Unexpected error in user management API: {str(e)}", exc_info=True)
+        app.logger.error("Unexpected error in user management API: %s", e, exc_info=True)
         ad_manager.disconnect()
         return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
 
@@ -373,43 +709,26 @@ def manage_ad_group_members(group_name):
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
-    app.logger.info(f"Group members API call for: {group_name}, method: {request.method}")
+    app.logger.info("Group members API call for: %s, method: %s", group_name, request.method)
     ad_manager = ActiveDirectoryManager()
     
     try:
         if request.method == 'GET':
-            app.logger.info(f"Fetching members for group: {group_name}")
+            app.logger.info("Fetching members for group: %s", group_name)
             try:
-                # Fetch all groups
-                groups = ad_manager.get_groups()
-                app.logger.info(f"Groups fetched: {groups}")
+                # Read only this group, with ranged member retrieval
+                members = ad_manager.get_group_members(group_name)
             except Exception as e:
-                app.logger.error(f"Error fetching groups: {str(e)}", exc_info=True)
+                app.logger.error("Error fetching group members: %s", e, exc_info=True)
                 ad_manager.disconnect()
-                return jsonify({'success': False, 'message': f'Error fetching groups: {str(e)}'}), 500
+                return jsonify({'success': False, 'message': f'Error fetching group members: {str(e)}'}), 500
             
-            # Filter the group by name
-            group = next((g for g in groups if g.get('cn', '').lower() == group_name.lower()), None)
-            if not group:
-                app.logger.warning(f"Group not found: {group_name}")
+            if members is None:
+                app.logger.warning("Group not found: %s", group_name)
                 ad_manager.disconnect()
                 return jsonify({'success': False, 'message': f'Group {group_name} not found'}), 404
             
-            # Log the entire group object for debugging
-            app.logger.info(f"Group details: {group}")
-            
-            # Extract members
-            members = group.get('members', [])
-            
-            # Log the raw members data
-            app.logger.info(f"Raw members data: {members}, type: {type(members)}")
-            
-            if isinstance(members, str):
-                members = [members]
-            elif not members:
-                members = []
-            
-            app.logger.info(f"Found {len(members)} members for group {group_name}")
+            app.logger.info("Found %s members for group %s", len(members), group_name)
             ad_manager.disconnect()
             return jsonify({'success': True, 'members': members})
         
@@ -431,87 +750,57 @@ def manage_ad_group_members(group_name):
             if not user_dn:
                 return jsonify({'success': False, 'message': 'User DN is required'}), 400
             
+            success, message = ad_manager.remove_user_from_group(user_dn, group_name)
+            ad_manager.disconnect()
             if success:
                 return jsonify({'success': True, 'message': message})
             return jsonify({'success': False, 'message': message}), 400
             
     except Exception as e:
-        app.logger.error(f"Unexpected error in group members API: {str(e)}", exc_info=True)
+        app.logger.error("Unexpected error in group members API: %s", e, exc_info=True)
         ad_manager.disconnect()
         return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
-def manage_ad_group_members(group_name):
-    """API endpoint to manage group membership"""
+
+def get_membership_graph():
+    """Nested-group graph of the local directory view, refreshed if stale."""
+    ad_manager = ActiveDirectoryManager()
+    try:
+        directory_sync.ensure_fresh(ad_manager, AD_VIEW_MAX_AGE)
+    finally:
+        ad_manager.disconnect()
+    return directory_sync.membership()
+
+@app.route('/api/ad/user/<username>/effective-groups')
+def get_effective_groups(username):
+    """API endpoint listing a user's direct and nested group memberships"""
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
-    app.logger.info(f"Group members API call for: {group_name}, method: {request.method}")
-    ad_manager = ActiveDirectoryManager()
+    try:
+        groups = get_membership_graph().effective_groups(username)
+    except Exception as e:
+        app.logger.error("Error resolving effective groups: %s", e, exc_info=True)
+        return jsonify({'success': False, 'message': f'Directory view unavailable: {str(e)}'}), 503
+    
+    if groups is None:
+        return jsonify({'success': False, 'message': f'User {username} not found'}), 404
+    return jsonify({'success': True, 'groups': groups})
+
+@app.route('/api/ad/group/<group_name>/effective-members')
+def get_effective_members(group_name):
+    """API endpoint listing every principal inside a group, including nested groups"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
     try:
-        if request.method == 'GET':
-            app.logger.info(f"Fetching members for group: {group_name}")
-            try:
-                # Fetch all groups
-                groups = ad_manager.get_groups()
-                app.logger.info(f"Groups fetched: {groups}")
-            except Exception as e:
-                app.logger.error(f"Error fetching groups: {str(e)}", exc_info=True)
-                ad_manager.disconnect()
-                return jsonify({'success': False, 'message': f'Error fetching groups: {str(e)}'}), 500
-            
-            # Filter the group by name
-            group = next((g for g in groups if g.get('cn', '').lower() == group_name.lower()), None)
-            if not group:
-                app.logger.warning(f"Group not found: {group_name}")
-                ad_manager.disconnect()
-                return jsonify({'success': False, 'message': f'Group {group_name} not found'}), 404
-            
-            # Log the entire group object for debugging
-            app.logger.info(f"Group details: {group}")
-            
-            # Extract members
-            members = group.get('member', [])
-            
-            # Log the raw members data
-            app.logger.info(f"Raw members data: {members}, type: {type(members)}")
-            
-            if isinstance(members, str):
-                members = [members]
-            elif not members:
-                members = []
-            
-            app.logger.info(f"Found {len(members)} members for group {group_name}")
-            ad_manager.disconnect()
-            return jsonify({'success': True, 'members': members})
-        
-        elif request.method == 'POST':
-            # Add user to group
-            data = request.get_json()
-            username = data.get('username')
-            
-            success, message = ad_manager.add_user_to_group(username, group_name)
-            ad_manager.disconnect()
-            
-            if success:
-                return jsonify({'success': True, 'message': message})
-            return jsonify({'success': False, 'message': message}), 400
-        
-        elif request.method == 'DELETE':
-            data = request.get_json()
-            user_dn = data.get('dn')
-            if not user_dn:
-                return jsonify({'success': False, 'message': 'User DN is required'}), 400
-            
-            success, message = ad_manager.remove_user_from_group(user_dn, group_name)
-            ad_manager.disconnect()
-            if success:
-                return jsonify({'success': True, 'message': message})
-            return jsonify({'success': False, 'message': message}), 400
-            
+        members = get_membership_graph().effective_members(group_name)
     except Exception as e:
-        app.logger.error(f"Unexpected error in group members API: {str(e)}", exc_info=True)
-        ad_manager.disconnect()
-        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
+        app.logger.error("Error resolving effective members: %s", e, exc_info=True)
+        return jsonify({'success': False, 'message': f'Directory view unavailable: {str(e)}'}), 503
+    
+    if members is None:
+        return jsonify({'success': False, 'message': f'Group {group_name} not found'}), 404
+    return jsonify({'success': True, 'members': members})
 
 @app.route('/api/dashboard-data')
 def dashboard_data():
@@ -526,15 +815,22 @@ def dashboard_data():
             if ad_data_files:
                 # Get most recent file
                 latest_file = sorted(ad_data_files)[-1]
-                with open(f'ad_data/{latest_file}', 'r') as f:
-                    data = json.load(f)
-                    app.logger.info(f"Using cached AD data from {latest_file}")
+                path = f'ad_data/{latest_file}'
+                
+                def build():
+                    with open(path, 'r') as f:
+                        data = json.load(f)
+                    app.logger.info("Using cached AD data from %s", latest_file)
                     # Update the timestamp to show we're using cached data
                     if 'metadata' in data:
                         data['metadata']['source'] = 'cache'
-                    return jsonify(data)
+                    return PreparedJSON.from_payload(data)
+                
+                # Parsed and serialized once per collector snapshot
+                prepared = prepared_responses.get_or_build(('dashboard', path, os.path.getmtime(path)), build)
+                return json_response(prepared)
         except Exception as e:
-            app.logger.error(f"Error loading cached AD data: {str(e)}")
+            app.logger.error("Error loading cached AD data: %s", e)
         
         # If no cached data or error, try live data
         ad_manager = ActiveDirectoryManager()
@@ -545,9 +841,9 @@ def dashboard_data():
             app.logger.warning("No AD data returned from manager")
             raise Exception("No data returned from AD manager")
         
-        return jsonify(data)
+        return json_response(PreparedJSON.from_payload(data))
     except Exception as e:
-        app.logger.error(f"Error in dashboard data API: {str(e)}")
+        app.logger.error("Error in dashboard data API: %s", e)
         # Return error data with more details
         return jsonify({
             'success': False,
@@ -566,6 +862,40 @@ def dashboard_data():
             }
         })
 
+@app.route('/api/profiles')
+def get_profiles():
+    """API endpoint to list captured (profiled or slow) requests, newest first"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    return jsonify({'success': True, 'profiles': list_captures()})
+
+@app.route('/api/profiles/<capture_id>')
+def get_profile(capture_id):
+    """API endpoint to download one capture: JSON timeline and summary, or ?format=pstats"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    if request.args.get('format') == 'pstats':
+        path = capture_path(capture_id, '.prof')
+        if path is None:
+            return jsonify({'success': False, 'message': 'No profile for this capture'}), 404
+        return send_file(os.path.abspath(path), mimetype='application/octet-stream',
+                         as_attachment=True, download_name=f'{capture_id}.prof')
+    
+    path = capture_path(capture_id)
+    if path is None:
+        return jsonify({'success': False, 'message': 'Capture not found'}), 404
+    return send_file(os.path.abspath(path), mimetype='application/json',
+                     as_attachment=request.args.get('download') == '1', download_name=f'{capture_id}.json')
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint (text exposition format)"""
+    if AD_METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {AD_METRICS_TOKEN}':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Add a new debug endpoint to check API connectivity
 @app.route('/api/debug')
 def api_debug():
@@ -590,6 +920,19 @@ def api_debug():
             }
         }
         
+        debug_info['response_cache'] = response_cache.stats()
+        debug_info['directory_memory'] = directory_sync.memory_report(sample=200)
+        debug_info['logging'] = {'dropped_records': dropped_records()}
+        debug_info['tracing'] = trace_exporter.stats()
+        
+        # Health of the domain controllers seen by this process
+        try:
+            debug_info['domain_controllers'] = ActiveDirectoryManager()._get_pool().stats()
+        except Exception as e:
+            debug_info['domain_controllers'] = {
+                'error': str(e)
+            }
+        
         # Test database connection
         try:
             db, cursor = get_db()
@@ -631,6 +974,32 @@ def api_debug():
             'error': str(e)
         })
 
+@app.cli.command('refresh-ad-schema')
+def refresh_ad_schema():
+    """Re-read DSA and schema info from the DC and rewrite the local cache."""
+    ad_manager = ActiveDirectoryManager()
+    try:
+        refreshed = ad_manager.refresh_server_info()
+        for host in ad_manager.domain_controllers:
+            print(f"{host}: {'refreshed' if host in refreshed else 'returned no server info'}")
+    finally:
+        ad_manager.disconnect()
+
+@app.cli.command('memory-report')
+def print_memory_report():
+    """Run a full directory sync and print bytes per object, as dicts and compact records."""
+    ad_manager = ActiveDirectoryManager()
+    try:
+        directory_sync.sync(ad_manager, full=True)
+    finally:
+        ad_manager.disconnect()
+    report = directory_sync.memory_report()
+    dn_table = report.pop('dnTable')
+    print(f"{'kind':<20}{'objects':>10}{'dict B/obj':>12}{'compact B/obj':>15}")
+    for kind, row in report.items():
+        print(f"{kind:<20}{row['objects']:>10}{row['dictBytesPerObject']:>12}{row['compactBytesPerObject']:>15}")
+    print(f"DN table: {dn_table['entries']} DNs, {dn_table['bytes']} bytes")
+
 def start_background_threads():
     """Start background threads for data collection"""
     app.logger.info("Starting AD data collection background thread")
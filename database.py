@@ -1,6 +1,11 @@
+import os
+import time
 import mysql.connector
 from mysql.connector import Error
 from flask import g, current_app
+from ad_metrics import DB_CONNECTIONS
+from ad_profiling import TimedCursor, record_event
+from ad_tracing import end_span, start_span
 
 # Datenbankverbindungsdaten
 DB_CONFIG = {
@@ -10,18 +15,28 @@ DB_CONFIG = {
     'password': 'password',
     'auth_plugin': 'mysql_native_password'  # Verwende Standard-Authentifizierung
 }
+# 'sqlite' verwendet nur die lokale SQLite-Datenbank (z.B. für Lasttests ohne MySQL-Server)
+AD_DB_BACKEND = os.environ.get('AD_DB_BACKEND', 'mysql')
 
 def get_db():
     """Verbindung zur Datenbank herstellen, falls noch nicht verbunden."""
-    if 'db' not in g:
+    if 'db' not in g and AD_DB_BACKEND == 'sqlite':
+        g.db = None
+        g.cursor = None
+    elif 'db' not in g:
+        span = start_span('sql.connect', backend='mysql', host=DB_CONFIG['host'])
+        started = time.perf_counter()
         try:
             # Verbindung zum MySQL-Server herstellen
             connection = mysql.connector.connect(**DB_CONFIG)
+            record_event('sql', 'connect', started, time.perf_counter() - started, backend='mysql', success=True)
+            end_span(span)
             
             if connection.is_connected():
                 g.db = connection
-                g.cursor = connection.cursor(dictionary=True)
+                g.cursor = TimedCursor(connection.cursor(dictionary=True), 'mysql')
                 current_app.logger.info("Verbindung zur MySQL-Datenbank hergestellt")
+                DB_CONNECTIONS.inc('mysql', 'success')
                 
                 # Stelle sicher, dass die Datenbank existiert
                 g.cursor.execute("CREATE DATABASE IF NOT EXISTS authdata")
@@ -31,7 +46,10 @@ def get_db():
                 init_tables(g.db, g.cursor)
                 
         except Error as e:
-            current_app.logger.error(f"Fehler bei der Verbindung zur MySQL-Datenbank: {e}")
+            current_app.logger.error("Fehler bei der Verbindung zur MySQL-Datenbank: %s", e)
+            DB_CONNECTIONS.inc('mysql', 'error')
+            record_event('sql', 'connect', started, time.perf_counter() - started, backend='mysql', success=False)
+            end_span(span, e)
             # Fallback zu einer leeren Verbindung, um Fehler zu vermeiden
             g.db = None
             g.cursor = None
@@ -71,11 +89,15 @@ def init_tables(db, cursor):
         db.commit()
         current_app.logger.info("Tabellen erfolgreich initialisiert")
     except Error as e:
-        current_app.logger.error(f"Fehler beim Initialisieren der Tabellen: {e}")
+        current_app.logger.error("Fehler beim Initialisieren der Tabellen: %s", e)
 
 def init_db():
-    """Initialisiere die Datenbankverbindung und Tabellen."""
+    """Initialisiere die Datenbankverbindung und Tabellen.
+
+    Gibt False zurück, wenn MySQL nicht verfügbar ist und SQLite verwendet wird.
+    """
     db, cursor = get_db()
     if db is None:
         current_app.logger.warning("Konnte keine Verbindung zur Datenbank herstellen. Verwende SQLite als Fallback.")
-        # Hier könnte ein Fallback zu SQLite implementiert werden
+        return False
+    return True
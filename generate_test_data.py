@@ -1,54 +1,646 @@
+import argparse
+import base64
+import bisect
+import gzip
 import json
+import math
 import os
 import random
-from datetime import datetime
-
-# Ensure directory exists
-if not os.path.exists('ad_data'):
-    os.makedirs('ad_data')
-
-# Generate mock data
-mock_data = {
-    'users': random.randint(10, 50),
-    'groups': random.randint(5, 15),
-    'computers': random.randint(5, 20),
-    'domainControllers': random.randint(1, 3),
-    'userDetails': [
-        {
-            'Name': f'User {i}',
-            'Username': f'user{i}',
-            'Email': f'user{i}@test.local',
-            'Status': random.choice(['Active', 'Disabled'])
-        }
-        for i in range(1, 11)  # Generate 10 users
-    ],
-    'groupDetails': [
-        {
-            'Group Name': f'Group {i}',
-            'Description': f'Description for Group {i}',
-            'Members': str(random.randint(1, 15))
-        }
-        for i in range(1, 6)  # Generate 5 groups
-    ],
-    'computerDetails': [
-        {
-            'Computer Name': f'COMPUTER{i}',
-            'IP Address': f'192.168.1.{100 + i}',
-            'Status': random.choice(['Online', 'Offline'])
+import re
+import sys
+import time
+import uuid
+from contextlib import ExitStack, nullcontext
+from datetime import date, datetime, timezone
+
+DEFAULT_USERS = 1000
+DEFAULT_DOMAIN = 'test.local'
+DEFAULT_ADMIN_PASSWORD = 'Test-Passw0rd'
+FIXTURE_FORMAT = 'ad-mock-fixture'
+FIXTURE_VERSION = 1
+PROFILES = ('full', 'mock', 'import')
+
+# Accounts without a logon for this many days count as stale
+STALE_DAYS = 90
+# Shares of the generated objects
+DISABLED_USERS = 0.05
+STALE_USERS = 0.15
+NEVER_LOGGED_ON_USERS = 0.03
+SERVICE_ACCOUNTS = 0.02
+DISABLED_COMPUTERS = 0.08
+STALE_COMPUTERS = 0.2
+NEVER_LOGGED_ON_COMPUTERS = 0.02
+SERVERS = 0.05
+NESTED_GROUPS = 0.1
+# Pareto shape of the group sizes: most groups have a handful of members, a few hold much of the directory
+GROUP_SIZE_ALPHA = 1.1
+# Direct reports per manager in the org chart (manager attribute)
+MANAGER_SPAN = 8
+# One site per this many users, up to len(SITES)
+USERS_PER_SITE = 20000
+FIRST_USN = 12000
+PROGRESS_EVERY = 100000
+
+# userAccountControl flags
+ACCOUNTDISABLE = 2
+NORMAL_ACCOUNT = 512
+WORKSTATION_TRUST_ACCOUNT = 4096
+SERVER_TRUST_ACCOUNT = 8192
+DONT_EXPIRE_PASSWORD = 65536
+TRUSTED_FOR_DELEGATION = 524288
+# (name prefix, groupType) with their shares
+GROUP_TYPES = (('GG', -2147483646), ('DL', -2147483644), ('DIST', 8))
+GROUP_TYPE_WEIGHTS = (60, 25, 15)
+
+# Attributes a DC maintains itself; left out of the 'import' profile
+SYSTEM_ATTRIBUTES = frozenset(('distinguishedName', 'name', 'objectCategory', 'objectGUID', 'uSNCreated',
+                               'uSNChanged', 'whenCreated', 'lastLogonTimestamp', 'pwdLastSet'))
+# Written base64-encoded in their binary form to LDIF, as ldifde exports them
+BINARY_ATTRIBUTES = frozenset(('objectGUID',))
+# Short objectCategory names (what the app's filters use) -> schema class CN
+CATEGORIES = {'person': 'Person', 'computer': 'Computer', 'group': 'Group', 'organizationalUnit': 'Organizational-Unit'}
+
+# 100 ns intervals between 1601-01-01 (FILETIME) and the Unix epoch
+FILETIME_EPOCH = 116444736000000000
+MASK64 = (1 << 64) - 1
+# RFC 2849 SAFE-STRING; anything else is written base64-encoded
+LDIF_SAFE = re.compile(r'^(?:[\x01-\x09\x0b\x0c\x0e-\x1f\x21-\x39\x3b\x3d-\x7f][\x01-\x09\x0b\x0c\x0e-\x7f]*)?$')
+LDIF_LINE_LENGTH = 76
+
+FIRST_NAMES = ('Alexander', 'Andrea', 'Anna', 'Ben', 'Christian', 'Clara', 'Daniel', 'David', 'Elena', 'Emma',
+               'Felix', 'Finn', 'Greta', 'Hannah', 'Jan', 'Jonas', 'Julia', 'Jürgen', 'Katharina', 'Laura',
+               'Lena', 'Leon', 'Lukas', 'Maria', 'Markus', 'Max', 'Mia', 'Michael', 'Noah', 'Paul',
+               'Petra', 'Sabine', 'Sandra', 'Sophie', 'Stefan', 'Thomas', 'Tim', 'Ursula', 'Yusuf', 'Zoë')
+LAST_NAMES = ('Bauer', 'Becker', 'Braun', 'Fischer', 'Hartmann', 'Hoffmann', 'Jäger', 'Kaya', 'Keller', 'Klein',
+              'Koch', 'Krüger', 'Lange', 'Lehmann', 'Meyer', 'Möller', 'Müller', 'Nowak', 'Neumann', 'Richter',
+              'Schäfer', 'Schmidt', 'Schmitz', 'Schneider', 'Schulz', 'Schwarz', 'Wagner', 'Walter', 'Weber',
+              'Werner', 'Wolf', 'Yilmaz', 'Zimmermann', 'Öztürk')
+# (OU name, site code); earlier sites get more users
+SITES = (('Berlin', 'BER'), ('Hamburg', 'HAM'), ('Munich', 'MUC'), ('Cologne', 'CGN'), ('Frankfurt', 'FRA'),
+         ('Stuttgart', 'STR'), ('Duesseldorf', 'DUS'), ('Leipzig', 'LEJ'), ('Dresden', 'DRS'), ('Hanover', 'HAJ'),
+         ('Nuremberg', 'NUE'), ('Bremen', 'BRE'), ('Vienna', 'VIE'), ('Zurich', 'ZRH'), ('Amsterdam', 'AMS'),
+         ('Paris', 'PAR'), ('London', 'LON'), ('Madrid', 'MAD'), ('Milan', 'MIL'), ('Warsaw', 'WAW'),
+         ('Prague', 'PRG'), ('Stockholm', 'STO'), ('New York', 'NYC'), ('Singapore', 'SIN'))
+# Largest departments first
+DEPARTMENTS = ('Production', 'Sales', 'Support', 'IT', 'Logistics', 'Research', 'Finance', 'Marketing',
+               'Purchasing', 'Human Resources', 'Legal', 'Management')
+TITLES = ('Analyst', 'Assistant', 'Consultant', 'Engineer', 'Specialist', 'Senior Specialist', 'Team Lead',
+          'Manager')
+WORKSTATION_SYSTEMS = ('Windows 11 Enterprise', 'Windows 11 Enterprise', 'Windows 10 Enterprise')
+SERVER_SYSTEMS = ('Windows Server 2022 Standard', 'Windows Server 2019 Standard', 'Windows Server 2016 Standard')
+# Found on long-forgotten computer accounts
+LEGACY_SYSTEMS = ('Windows 7 Enterprise', 'Windows 8.1 Enterprise', 'Windows Server 2012 R2 Standard')
+KINDS = ('ou', 'user', 'group', 'member', 'computer', 'dc')
+TRANSLITERATION = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss', 'ë': 'e', 'Ä': 'Ae', 'Ö': 'Oe',
+                                 'Ü': 'Ue'})
+
+
+def _mix(value):
+    """SplitMix64 finaliser: spreads an integer evenly over 64 bits."""
+    value = (value + 0x9E3779B97F4A7C15) & MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+
+def _zipf_cumulative(count):
+    total, cumulative = 0, []
+    for rank in range(count):
+        total += 1 / (rank + 1)
+        cumulative.append(total)
+    return cumulative
+
+
+def _pick(cumulative, bits):
+    """Weighted choice from 32 hash bits; ``cumulative`` holds the running sum of the weights."""
+    return min(len(cumulative) - 1, bisect.bisect_right(cumulative, bits / 2 ** 32 * cumulative[-1]))
+
+
+class SyntheticDirectory:
+    """A reproducible Active Directory domain, generated object by object.
+
+    Every object is a pure function of the seed, its kind and its index, so
+    objects() streams millions of entries without keeping earlier ones
+    (the largest allocation is the member list of the biggest group), and
+    the DN or account name of any object can be looked up on its own.
+    Timestamps are relative to ``reference`` (default: today, UTC); the
+    output is identical for the same arguments and reference date.
+
+    The domain has an OU tree of sites (more users at the first ones) with
+    department, workstation, server and group OUs; users with an org chart,
+    disabled, stale and never-used accounts; groups of Pareto-distributed
+    sizes, some nesting groups of higher index (so there are no cycles);
+    workstations and servers, some disabled or stale; and the DCs.
+    """
+
+    def __init__(self, users=DEFAULT_USERS, seed=1, domain=DEFAULT_DOMAIN, groups=None, computers=None,
+                 domain_controllers=2, reference=None, admin_password=DEFAULT_ADMIN_PASSWORD):
+        if isinstance(reference, str):
+            reference = date.fromisoformat(reference)
+        self.users = users
+        self.seed = seed
+        self.domain = domain.lower()
+        self.groups = max(10, users // 20) if groups is None else groups
+        self.computers = users // 3 if computers is None else computers
+        self.domain_controllers = domain_controllers
+        self.reference = reference or datetime.now(timezone.utc).date()
+        self.admin_password = admin_password
+        self.base_dn = ','.join(f'DC={part}' for part in self.domain.split('.'))
+        self.admin_dn = f'CN=Administrator,CN=Users,{self.base_dn}'
+        self.domain_controllers_dn = f'OU=Domain Controllers,{self.base_dn}'
+        self.sites = SITES[:max(1, min(len(SITES), math.ceil(users / USERS_PER_SITE)))]
+        self._now = datetime(self.reference.year, self.reference.month, self.reference.day,
+                             tzinfo=timezone.utc).timestamp()
+        self._salts = {kind: _mix(((seed & MASK64) << 8) | number) for number, kind in enumerate(KINDS)}
+        self._site_weights = _zipf_cumulative(len(self.sites))
+        self._department_weights = _zipf_cumulative(len(DEPARTMENTS))
+        self._group_type_weights = [sum(GROUP_TYPE_WEIGHTS[:i + 1]) for i in range(len(GROUP_TYPE_WEIGHTS))]
+        # uSNs follow the stream order: DCs (the oldest objects), OUs, users, groups, computers
+        ous = 2 + len(self.sites) * (5 + len(DEPARTMENTS))
+        self._first_usn = {'dc': FIRST_USN}
+        self._first_usn['ou'] = self._first_usn['dc'] + domain_controllers
+        self._first_usn['user'] = self._first_usn['ou'] + ous
+        self._first_usn['group'] = self._first_usn['user'] + users
+        self._first_usn['computer'] = self._first_usn['group'] + self.groups
+        self.organizational_units = ous
+
+    @classmethod
+    def from_parameters(cls, parameters):
+        return cls(**parameters)
+
+    def parameters(self):
+        """Constructor arguments that regenerate this directory (JSON-serialisable)."""
+        return {'users': self.users, 'seed': self.seed, 'domain': self.domain, 'groups': self.groups,
+                'computers': self.computers, 'domain_controllers': self.domain_controllers,
+                'reference': self.reference.isoformat(), 'admin_password': self.admin_password}
+
+    def counts(self):
+        """Objects the app's searches find; computers include the DCs, as COMPUTER_FILTER does."""
+        return {'users': self.users, 'groups': self.groups, 'computers': self.computers + self.domain_controllers,
+                'domainControllers': self.domain_controllers, 'organizationalUnits': self.organizational_units}
+
+    def _hash(self, kind, index):
+        return _mix(self._salts[kind] ^ index)
+
+    def _rng(self, kind, index):
+        return random.Random(self._hash(kind, index))
+
+    def _usn(self, kind, index):
+        return str(self._first_usn[kind] + index)
+
+    def _filetime(self, days_ago):
+        return str(FILETIME_EPOCH + int((self._now - days_ago * 86400) * 10 ** 7))
+
+    def _generalized_time(self, days_ago):
+        return datetime.fromtimestamp(self._now - days_ago * 86400, timezone.utc).strftime('%Y%m%d%H%M%S.0Z')
+
+    @staticmethod
+    def _guid(value):
+        return str(uuid.UUID(int=(_mix(value ^ 0x5555555555555555) << 64) | _mix(value ^ 0xAAAAAAAAAAAAAAAA),
+                             version=4))
+
+    def _site_dn(self, site):
+        return f'OU={self.sites[site][0]},OU=Sites,{self.base_dn}'
+
+    def _common(self, kind, index, dn, cn, category, created_days_ago):
+        value = self._hash(kind, index)
+        return {
+            'objectCategory': category,
+            'distinguishedName': dn,
+            'cn': cn,
+            'name': cn,
+            'whenCreated': self._generalized_time(created_days_ago),
+            'objectGUID': self._guid(value),
+            'uSNCreated': self._usn(kind, index),
+            'uSNChanged': self._usn(kind, index)
         }
-        for i in range(1, 7)  # Generate 6 computers
-    ],
-    'metadata': {
+
+    # Users
+
+    def _person(self, i):
+        value = self._hash('user', i)
+        placement = _mix(value)
+        first = FIRST_NAMES[(value & 0xFFFFFFFF) % len(FIRST_NAMES)]
+        last = LAST_NAMES[(value >> 32) % len(LAST_NAMES)]
+        site = _pick(self._site_weights, placement & 0xFFFFFFFF)
+        department = _pick(self._department_weights, placement >> 32)
+        return first, last, site, DEPARTMENTS[department]
+
+    @staticmethod
+    def _username(i, first, last):
+        # sAMAccountName allows 20 characters
+        return f'{first[0]}{last.translate(TRANSLITERATION)[:11]}{i:06d}'.lower()
+
+    def _user_dn(self, i, first, last, site, department):
+        return f'CN={first} {last} {i:06d},OU={department},OU=Users,{self._site_dn(site)}'
+
+    def username(self, i):
+        return self._username(i, *self._person(i)[:2])
+
+    def user_ou(self, i):
+        site, department = self._person(i)[2:]
+        return f'OU={department},OU=Users,{self._site_dn(site)}'
+
+    def user_dn(self, i):
+        return self._user_dn(i, *self._person(i))
+
+    def user(self, i):
+        first, last, site, department = self._person(i)
+        rng = self._rng('user', i)
+        username = self._username(i, first, last)
+        dn = self._user_dn(i, first, last, site, department)
+        disabled = rng.random() < DISABLED_USERS
+        if rng.random() < NEVER_LOGGED_ON_USERS:
+            last_logon = None
+        elif disabled or rng.random() < STALE_USERS:
+            last_logon = rng.uniform(STALE_DAYS, 3 * 365)
+        else:
+            last_logon = rng.uniform(0, 14)
+        created = (last_logon or 0) + rng.uniform(1, 8 * 365)
+        control = NORMAL_ACCOUNT | (ACCOUNTDISABLE if disabled else 0)
+        if rng.random() < SERVICE_ACCOUNTS:
+            control |= DONT_EXPIRE_PASSWORD
+
+        attributes = {'objectClass': ['top', 'person', 'organizationalPerson', 'user']}
+        attributes.update(self._common('user', i, dn, dn[3:dn.index(',')], 'person', created))
+        attributes.update({
+            'givenName': first,
+            'sn': last,
+            'displayName': f'{first} {last}',
+            'sAMAccountName': username,
+            'userPrincipalName': f'{username}@{self.domain}',
+            'mail': f'{username}@{self.domain}',
+            'title': rng.choice(TITLES),
+            'department': department,
+            'physicalDeliveryOfficeName': self.sites[site][0],
+            'telephoneNumber': f'+49 {rng.randint(30, 999)} {rng.randint(100000, 9999999)}',
+            'employeeID': str(100000 + i),
+            'userAccountControl': str(control),
+            'pwdLastSet': self._filetime(rng.uniform(last_logon or 0, min(created, (last_logon or 0) + 180)))
+        })
+        if last_logon is not None:
+            attributes['lastLogonTimestamp'] = self._filetime(last_logon)
+        if i:
+            attributes['manager'] = self.user_dn((i - 1) // MANAGER_SPAN)
+        return dn, attributes
+
+    # Groups
+
+    def _group_identity(self, g):
+        value = self._hash('group', g)
+        site = _pick(self._site_weights, value & 0xFFFFFFFF)
+        department = DEPARTMENTS[_pick(self._department_weights, value >> 32)]
+        prefix, group_type = GROUP_TYPES[_pick(self._group_type_weights, _mix(value) & 0xFFFFFFFF)]
+        return site, department, prefix, group_type
+
+    def group_name(self, g):
+        site, department, prefix = self._group_identity(g)[:3]
+        return f"{prefix}_{self.sites[site][1]}_{department.replace(' ', '')}_{g:05d}"
+
+    def group_dn(self, g):
+        return f'CN={self.group_name(g)},OU=Groups,{self._site_dn(self._group_identity(g)[0])}'
+
+    def group_members(self, g):
+        """``(user indexes, group indexes)`` of the direct members of group ``g``."""
+        rng = self._rng('member', g)
+        size = max(0, min(self.users, int(rng.paretovariate(GROUP_SIZE_ALPHA) * 5) - 4))
+        users = rng.sample(range(self.users), size)
+        groups = []
+        if g + 1 < self.groups and rng.random() < NESTED_GROUPS:
+            groups = rng.sample(range(g + 1, self.groups), min(rng.randint(1, 3), self.groups - g - 1))
+        return users, groups
+
+    def group_sizes(self):
+        """Group name -> number of direct members (users and nested groups)."""
+        return {self.group_name(g): sum(map(len, self.group_members(g))) for g in range(self.groups)}
+
+    def group(self, g):
+        site, department, prefix, group_type = self._group_identity(g)
+        rng = self._rng('group', g)
+        cn = self.group_name(g)
+        dn = self.group_dn(g)
+        users, groups = self.group_members(g)
+        attributes = {'objectClass': ['top', 'group']}
+        attributes.update(self._common('group', g, dn, cn, 'group', rng.uniform(1, 10 * 365)))
+        attributes.update({
+            'sAMAccountName': cn,
+            'description': f'{department} {"mailing list" if prefix == "DIST" else "access"}, {self.sites[site][0]}',
+            'groupType': str(group_type)
+        })
+        members = [self.user_dn(i) for i in users] + [self.group_dn(j) for j in groups]
+        if members:
+            attributes['member'] = members
+        return dn, attributes
+
+    # Computers
+
+    def _computer_identity(self, i):
+        value = self._hash('computer', i)
+        site = _pick(self._site_weights, value & 0xFFFFFFFF)
+        server = ((value >> 32) & 0xFFFF) / 0x10000 < SERVERS
+        return site, server
+
+    def computer_name(self, i):
+        site, server = self._computer_identity(i)
+        # NetBIOS names have at most 15 characters
+        return f"{self.sites[site][1]}-{'SRV' if server else 'WS'}{i:06d}"
+
+    def computer_dn(self, i):
+        site, server = self._computer_identity(i)
+        return f"CN={self.computer_name(i)},OU={'Servers' if server else 'Workstations'},{self._site_dn(site)}"
+
+    def _machine(self, kind, index, dn, name, category, created, last_logon, control, operating_system):
+        attributes = {'objectClass': ['top', 'person', 'organizationalPerson', 'user', 'computer']}
+        attributes.update(self._common(kind, index, dn, name, category, created))
+        attributes.update({
+            'sAMAccountName': f'{name}$',
+            'dNSHostName': f'{name.lower()}.{self.domain}',
+            'operatingSystem': operating_system,
+            'userAccountControl': str(control)
+        })
+        if last_logon is not None:
+            # Machine passwords change every 30 days while the computer is in use
+            attributes['pwdLastSet'] = self._filetime(min(created, last_logon + index % 30))
+            attributes['lastLogonTimestamp'] = self._filetime(last_logon)
+        return attributes
+
+    def computer(self, i):
+        server = self._computer_identity(i)[1]
+        rng = self._rng('computer', i)
+        name = self.computer_name(i)
+        dn = self.computer_dn(i)
+        disabled = rng.random() < DISABLED_COMPUTERS
+        stale = disabled or rng.random() < STALE_COMPUTERS
+        if rng.random() < NEVER_LOGGED_ON_COMPUTERS:
+            last_logon = None
+        else:
+            last_logon = rng.uniform(STALE_DAYS, 4 * 365) if stale else rng.uniform(0, 14)
+        if stale and rng.random() < 0.5:
+            operating_system = rng.choice(LEGACY_SYSTEMS)
+        else:
+            operating_system = rng.choice(SERVER_SYSTEMS if server else WORKSTATION_SYSTEMS)
+        control = WORKSTATION_TRUST_ACCOUNT | (ACCOUNTDISABLE if disabled else 0)
+        return dn, self._machine('computer', i, dn, name, 'computer', (last_logon or 0) + rng.uniform(1, 6 * 365),
+                                 last_logon, control, operating_system)
+
+    def domain_controller(self, i):
+        rng = self._rng('dc', i)
+        name = f'DC{i + 1:02d}'
+        dn = f'CN={name},{self.domain_controllers_dn}'
+        return dn, self._machine('dc', i, dn, name, 'computer', 10 * 365 - i, rng.uniform(0, 1),
+                                 SERVER_TRUST_ACCOUNT | TRUSTED_FOR_DELEGATION, SERVER_SYSTEMS[0])
+
+    # Organizational units
+
+    def _ou(self, index, dn, description):
+        attributes = {'objectClass': ['top', 'organizationalUnit'], 'ou': dn[3:dn.index(',')]}
+        attributes.update(self._common('ou', index, dn, attributes['ou'], 'organizationalUnit', 10 * 365))
+        del attributes['cn']
+        attributes['description'] = description
+        return dn, attributes
+
+    def organizational_unit_entries(self):
+        """The OU tree, parents before children."""
+        ous = [(self.domain_controllers_dn, 'Default container for domain controllers'),
+               (f'OU=Sites,{self.base_dn}', 'Company sites')]
+        for site, (site_name, _) in enumerate(self.sites):
+            site_dn = self._site_dn(site)
+            ous.append((site_dn, f'Site {site_name}'))
+            ous.append((f'OU=Users,{site_dn}', f'User accounts, {site_name}'))
+            ous.extend((f'OU={department},OU=Users,{site_dn}', f'{department}, {site_name}')
+                       for department in DEPARTMENTS)
+            ous.append((f'OU=Workstations,{site_dn}', f'Workstations, {site_name}'))
+            ous.append((f'OU=Servers,{site_dn}', f'Member servers, {site_name}'))
+            ous.append((f'OU=Groups,{site_dn}', f'Groups, {site_name}'))
+        for index, (dn, description) in enumerate(ous):
+            yield self._ou(index, dn, description)
+
+    def objects(self):
+        """Every object as ``(dn, attributes)`` in the 'mock' form (see adapt()), parents first."""
+        yield from self.organizational_unit_entries()
+        for i in range(self.users):
+            yield self.user(i)
+        for g in range(self.groups):
+            yield self.group(g)
+        for i in range(self.computers):
+            yield self.computer(i)
+        for i in range(self.domain_controllers):
+            yield self.domain_controller(i)
+        # Only in the mock, whose bind needs an entry with a password; not a user for USER_FILTER
+        yield self.admin_dn, {'objectClass': ['top', 'person'], 'cn': 'Administrator',
+                              'sAMAccountName': 'Administrator', 'userPassword': self.admin_password}
+
+    def adapt(self, dn, attributes, profile):
+        """``attributes`` as written for ``profile``, or None if the entry has no place there.
+
+        'mock' is what ldap3's MOCK_SYNC strategy needs: objectCategory in
+        the short form the app's filters compare with, and the bind account.
+        'full' is what a DC returns, objectCategory as schema DN. 'import'
+        is what ``ldifde -i`` accepts: no system-maintained attributes and
+        none of the objects a new domain already has (DCs and their OU).
+        """
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile {profile!r}, expected one of {', '.join(PROFILES)}")
+        if dn == self.admin_dn:
+            return attributes if profile == 'mock' else None
+        if profile == 'mock':
+            return attributes
+        if profile == 'full':
+            category = CATEGORIES[attributes['objectCategory']]
+            return dict(attributes, objectCategory=f'CN={category},CN=Schema,CN=Configuration,{self.base_dn}')
+        if dn == self.domain_controllers_dn or dn.endswith(',' + self.domain_controllers_dn):
+            return None
+        return {name: value for name, value in attributes.items() if name not in SYSTEM_ATTRIBUTES}
+
+    def entries(self, profile='mock'):
+        """Stream ``(dn, attributes)`` for ``profile``; 'mock' entries go straight into ``strategy.add_entry``."""
+        for dn, attributes in self.objects():
+            adapted = self.adapt(dn, attributes, profile)
+            if adapted is not None:
+                yield dn, adapted
+
+    def fixture_header(self):
+        return {'format': FIXTURE_FORMAT, 'version': FIXTURE_VERSION, 'domain': self.domain,
+                'baseDn': self.base_dn, 'bindDn': self.admin_dn, 'bindPassword': self.admin_password,
+                'counts': self.counts(), 'parameters': self.parameters()}
+
+
+def _ldif_line(name, value):
+    if name in BINARY_ATTRIBUTES:
+        line = f'{name}:: {base64.b64encode(uuid.UUID(value).bytes_le).decode("ascii")}'
+    elif LDIF_SAFE.match(value) and not value.endswith(' '):
+        line = f'{name}: {value}'
+    else:
+        line = f'{name}:: {base64.b64encode(value.encode("utf-8")).decode("ascii")}'
+    if len(line) <= LDIF_LINE_LENGTH:
+        return line
+    # Folded lines continue with a single leading space
+    step = LDIF_LINE_LENGTH - 1
+    return '\n '.join([line[:LDIF_LINE_LENGTH]] + [line[i:i + step] for i in range(LDIF_LINE_LENGTH, len(line), step)])
+
+
+class LDIFWriter:
+    """Writes entries as RFC 2849 add records (for ldifde -i or ldapadd)."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.stream.write('version: 1\n')
+
+    def write(self, dn, attributes):
+        lines = [_ldif_line('dn', dn), 'changetype: add']
+        for name, values in attributes.items():
+            for value in values if isinstance(values, list) else [values]:
+                lines.append(_ldif_line(name, value))
+        self.stream.write('\n' + '\n'.join(lines) + '\n')
+
+
+class FixtureWriter:
+    """Writes a mock directory fixture: a JSON header line, then one {dn, attributes} object per line."""
+
+    def __init__(self, stream, header):
+        self.stream = stream
+        self.stream.write(json.dumps(header, ensure_ascii=False) + '\n')
+
+    def write(self, dn, attributes):
+        self.stream.write(json.dumps({'dn': dn, 'attributes': attributes}, ensure_ascii=False) + '\n')
+
+
+def open_output(path):
+    """Text stream for ``path``: '-' is stdout, a .gz suffix compresses."""
+    if path == '-':
+        return nullcontext(sys.stdout)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if path.endswith('.gz'):
+        # Level 6 compresses nearly as well as the default 9 at a fraction of the time
+        return gzip.open(path, 'wt', compresslevel=6, encoding='utf-8', newline='\n')
+    return open(path, 'w', encoding='utf-8', newline='\n')
+
+
+def read_fixture(path):
+    """``(header, entries)`` of a fixture; ``entries`` streams ``(dn, attributes)`` from the file.
+
+    Load it into a mock with ``connection.strategy.add_entry(dn, attributes)``
+    for each entry, binding as header['bindDn'] / header['bindPassword'].
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline() or '{}')
+    if header.get('format') != FIXTURE_FORMAT or header.get('version') != FIXTURE_VERSION:
+        raise ValueError(f"{path} is not a version {FIXTURE_VERSION} {FIXTURE_FORMAT} file")
+
+    def entries():
+        with opener(path, 'rt', encoding='utf-8') as f:
+            f.readline()
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    yield entry['dn'], entry['attributes']
+
+    return header, entries()
+
+
+def export(directory, outputs, progress=None):
+    """Stream every object of ``directory`` to each ``(writer, profile)`` of ``outputs``.
+
+    ``progress(objects, seconds)`` is called every PROGRESS_EVERY objects.
+    Returns the number of objects generated.
+    """
+    started = time.perf_counter()
+    count = 0
+    for dn, attributes in directory.objects():
+        for writer, profile in outputs:
+            adapted = directory.adapt(dn, attributes, profile)
+            if adapted is not None:
+                writer.write(dn, adapted)
+        count += 1
+        if progress and count % PROGRESS_EVERY == 0:
+            progress(count, time.perf_counter() - started)
+    return count
+
+
+def write_dashboard_snapshot(directory, folder='ad_data'):
+    """Save the dashboard JSON the collector would write for ``directory``; returns its path.
+
+    Only the counts and the preview rows are generated, so this is cheap at any size.
+    """
+    # Imported here: LDIF and fixture output do not need the app's dependencies
+    from ad_conn import PREVIEW_ROWS, build_dashboard_data
+
+    users, groups, computers = [], [], []
+    for i in range(min(PREVIEW_ROWS, directory.users)):
+        attributes = directory.user(i)[1]
+        users.append({'cn': attributes['cn'], 'sAMAccountName': attributes['sAMAccountName'],
+                      'mail': attributes['mail'], 'enabled': not int(attributes['userAccountControl']) & ACCOUNTDISABLE})
+    for g in range(min(PREVIEW_ROWS, directory.groups)):
+        attributes = directory.group(g)[1]
+        groups.append({'cn': attributes['cn'], 'description': attributes['description'],
+                       'member_count': len(attributes.get('member', []))})
+    for i in range(min(PREVIEW_ROWS, directory.computers)):
+        attributes = directory.computer(i)[1]
+        enabled = not int(attributes['userAccountControl']) & ACCOUNTDISABLE
+        computers.append({'name': attributes['name'], 'dnsHostName': attributes['dNSHostName'],
+                          'status': 'Online' if enabled else 'Offline'})
+
+    data = build_dashboard_data(users, groups, computers, [], counts=directory.counts())
+    data['metadata'] = {
         'timestamp': datetime.now().isoformat(),
-        'server': 'test-dc.test.local'
+        'server': f'dc01.{directory.domain}'
     }
-}
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"ad_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate a reproducible synthetic Active Directory domain as LDIF and/or as a fixture "
+                    "for ldap3's mock strategy (streamed, so millions of objects fit in constant memory). "
+                    "Without --ldif or --fixture it writes a dashboard snapshot to ad_data/ as before. "
+                    "Paths ending in .gz are compressed; '-' writes to stdout.")
+    parser.add_argument('--users', type=int, default=DEFAULT_USERS, help="Users (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=1, help="Seed; same seed and reference date, same output")
+    parser.add_argument('--domain', default=DEFAULT_DOMAIN, help="DNS name of the domain (default: %(default)s)")
+    parser.add_argument('--groups', type=int, help="Groups (default: users / 20, at least 10)")
+    parser.add_argument('--computers', type=int, help="Computers besides the DCs (default: users / 3)")
+    parser.add_argument('--domain-controllers', type=int, default=2, help="DCs (default: %(default)s)")
+    parser.add_argument('--reference-date', type=date.fromisoformat,
+                        help="Date logon and creation times are relative to, YYYY-MM-DD (default: today)")
+    parser.add_argument('--admin-password', default=DEFAULT_ADMIN_PASSWORD,
+                        help="Password of the mock's bind account, CN=Administrator,CN=Users")
+    parser.add_argument('--ldif', metavar='PATH', help="Write the directory as LDIF")
+    parser.add_argument('--ldif-profile', choices=('full', 'import'), default='full',
+                        help="'full': every attribute a DC returns; 'import': only what ldifde -i accepts")
+    parser.add_argument('--fixture', metavar='PATH', help="Write a mock directory fixture (JSON lines)")
+    parser.add_argument('--dashboard', action='store_true', help="Also write a dashboard snapshot to ad_data/")
+    parser.add_argument('--quiet', action='store_true', help="No progress output")
+    args = parser.parse_args(argv)
+
+    directory = SyntheticDirectory(args.users, args.seed, args.domain, args.groups, args.computers,
+                                   args.domain_controllers, args.reference_date, args.admin_password)
+    total = sum(directory.counts()[key] for key in ('users', 'groups', 'computers', 'organizationalUnits'))
+
+    def progress(count, seconds):
+        print(f"{count:,} of {total:,} objects, {count / seconds:,.0f}/s", file=sys.stderr, flush=True)
 
-# Save to file
-timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-filename = f'ad_data/ad_data_{timestamp}.json'
+    if args.ldif or args.fixture:
+        with ExitStack() as stack:
+            outputs = []
+            if args.ldif:
+                outputs.append((LDIFWriter(stack.enter_context(open_output(args.ldif))), args.ldif_profile))
+            if args.fixture:
+                outputs.append((FixtureWriter(stack.enter_context(open_output(args.fixture)),
+                                              directory.fixture_header()), 'mock'))
+            started = time.perf_counter()
+            count = export(directory, outputs, None if args.quiet else progress)
+        print(f"{count:,} objects written in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    if args.dashboard or not (args.ldif or args.fixture):
+        print(f"Test data saved to {write_dashboard_snapshot(directory)}", file=sys.stderr)
+    return 0
 
-with open(filename, 'w') as f:
-    json.dump(mock_data, f, indent=2)
 
-print(f"Test data saved to {filename}")
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from flask import Response, current_app, request
+
+# Bodies smaller than this many bytes are not worth compressing
+AD_GZIP_MIN_SIZE = int(os.environ.get('AD_GZIP_MIN_SIZE', 1024))
+AD_GZIP_LEVEL = int(os.environ.get('AD_GZIP_LEVEL', 6))
+# Serialized (and compressed) responses kept in memory for reuse
+AD_PREPARED_CACHE_SIZE = int(os.environ.get('AD_PREPARED_CACHE_SIZE', 64))
+
+
+class PreparedJSON:
+    """A JSON body serialized once, with its content hash and gzipped form.
+
+    The gzip variant is only built the first time a client accepts it.
+    """
+
+    __slots__ = ('body', 'etag', '_gzipped')
+
+    def __init__(self, body, etag=None):
+        self.body = body.encode('utf-8') if isinstance(body, str) else body
+        self.etag = etag or hashlib.sha1(self.body).hexdigest()
+        self._gzipped = None
+
+    @classmethod
+    def from_payload(cls, payload):
+        # Same encoder (and key order) as jsonify
+        return cls(current_app.json.dumps(payload))
+
+    @property
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=AD_GZIP_LEVEL)
+        return self._gzipped
+
+
+class PreparedResponseCache:
+    """Small LRU of PreparedJSON objects keyed by data version."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get_or_build(self, key, build):
+        with self.lock:
+            prepared = self.entries.get(key)
+            if prepared is not None:
+                self.entries.move_to_end(key)
+                return prepared
+        prepared = build()
+        with self.lock:
+            self.entries[key] = prepared
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return prepared
+
+
+prepared_responses = PreparedResponseCache(AD_PREPARED_CACHE_SIZE)
+
+
+def serialize_payload(payload):
+    """Serialize a payload for storage in the response cache: ``{'body', 'etag'}``."""
+    prepared = PreparedJSON.from_payload(payload)
+    prepared_responses.get_or_build(prepared.etag, lambda: prepared)
+    return {'body': prepared.body.decode('utf-8'), 'etag': prepared.etag}
+
+
+def prepared_from_serialized(serialized):
+    """PreparedJSON for a serialize_payload() result, reusing the in-memory copy if there is one."""
+    return prepared_responses.get_or_build(
+        serialized['etag'], lambda: PreparedJSON(serialized['body'], serialized['etag']))
+
+
+def json_response(prepared, status=200):
+    """Send a PreparedJSON honouring If-None-Match and Accept-Encoding.
+
+    The ETag is weak because the gzip and identity bodies share it.
+    """
+    if status == 200 and request.if_none_match.contains_weak(prepared.etag):
+        response = Response(status=304)
+    else:
+        body = prepared.body
+        response = Response(mimetype='application/json', status=status)
+        if len(body) >= AD_GZIP_MIN_SIZE and 'gzip' in request.accept_encodings:
+            body = prepared.gzipped
+            response.headers['Content-Encoding'] = 'gzip'
+        response.set_data(body)
+    response.set_etag(prepared.etag, weak=True)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Let browsers keep the body but revalidate it on every poll
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,320 @@
+import csv
+import io
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from ldap3.core.exceptions import LDAPInvalidDnError
+from ldap3.utils.dn import parse_dn
+from ad_conn import ActiveDirectoryManager
+
+logger = logging.getLogger(__name__)
+
+# SQLite file holding import jobs and their per-row outcomes
+IMPORT_DATABASE = os.environ.get('AD_IMPORT_DATABASE', 'users.db')
+# Rows accepted per uploaded CSV
+AD_IMPORT_MAX_ROWS = int(os.environ.get('AD_IMPORT_MAX_ROWS', 10000))
+# Concurrent create_user workers per job, each on its own pinned connection
+AD_IMPORT_WORKERS = int(os.environ.get('AD_IMPORT_WORKERS', 4))
+
+# Accepted CSV headers (lower-cased) for each field
+COLUMN_ALIASES = {
+    'username': ('username', 'samaccountname'),
+    'first_name': ('first_name', 'firstname', 'givenname'),
+    'last_name': ('last_name', 'lastname', 'sn'),
+    'password': ('password',),
+    'email': ('email', 'mail'),
+    'ou': ('ou', 'ou_path'),
+}
+REQUIRED_COLUMNS = ('username', 'first_name', 'last_name', 'password')
+# Characters AD does not allow in sAMAccountName
+INVALID_USERNAME_CHARS = set('"/\\[]:;|=,+*?<>@')
+
+
+def _connect():
+    db = sqlite3.connect(IMPORT_DATABASE, timeout=30)
+    db.row_factory = sqlite3.Row
+    return db
+
+
+def init_import_db():
+    """Create the job tables and mark jobs cut off by a restart as interrupted.
+
+    Passwords only live in memory while a job runs, so an interrupted job
+    cannot be resumed and has to be uploaded again.
+    """
+    db = _connect()
+    try:
+        db.execute('PRAGMA journal_mode=WAL')
+        db.executescript('''
+            CREATE TABLE IF NOT EXISTS import_jobs (
+                id TEXT PRIMARY KEY,
+                filename TEXT,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                processed INTEGER NOT NULL DEFAULT 0,
+                succeeded INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                invalid INTEGER NOT NULL DEFAULT 0,
+                created_by TEXT,
+                created_at TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS import_job_rows (
+                job_id TEXT NOT NULL,
+                row_number INTEGER NOT NULL,
+                username TEXT,
+                status TEXT NOT NULL,
+                message TEXT,
+                PRIMARY KEY (job_id, row_number)
+            );
+        ''')
+        db.execute(
+            "UPDATE import_jobs SET status = 'interrupted', finished_at = ? "
+            "WHERE status IN ('queued', 'running')",
+            (datetime.now().isoformat(),)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _ou_error(ou, base_dn):
+    """Return an error message unless ``ou`` is a DN inside the managed tree ``base_dn``."""
+    try:
+        rdns = [(attribute.lower(), value.lower()) for attribute, value, _ in parse_dn(ou)]
+    except LDAPInvalidDnError:
+        return f"OU is not a valid DN: {ou}"
+    base = [(attribute.lower(), value.lower()) for attribute, value, _ in parse_dn(base_dn)]
+    if rdns[-len(base):] != base:
+        return f"OU is outside {base_dn}"
+    return None
+
+
+def _validate_row(fields, seen, base_dn):
+    """Return an error message for a row, or None if it can be imported."""
+    missing = [column for column in REQUIRED_COLUMNS if not fields.get(column)]
+    if missing:
+        return f"Missing value for {', '.join(missing)}"
+    username = fields['username']
+    if len(username) > 20:
+        return 'Username is longer than 20 characters'
+    if any(char in INVALID_USERNAME_CHARS for char in username):
+        return 'Username contains characters not allowed by Active Directory'
+    if fields.get('email') and '@' not in fields['email']:
+        return 'Invalid email address'
+    if fields.get('ou'):
+        error = _ou_error(fields['ou'], base_dn)
+        if error:
+            return error
+    if username.lower() in seen:
+        return f"Duplicate username (first seen in row {seen[username.lower()]})"
+    return None
+
+
+def parse_csv(stream, base_dn):
+    """Read an uploaded CSV row by row and split it into valid and invalid rows.
+
+    Returns ``(rows, invalid)`` where rows is a list of ``(row_number, fields)``
+    and invalid a list of ``(row_number, username, message)``. An ``ou``
+    must lie under ``base_dn``. Raises ValueError if the file is unusable
+    as a whole.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    headers = {(name or '').strip().lower(): name for name in reader.fieldnames or []}
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in headers:
+                columns[field] = headers[alias]
+                break
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+
+    rows, invalid, seen = [], [], {}
+    for row_number, raw in enumerate(reader, start=2):  # row 1 is the header
+        if row_number - 1 > AD_IMPORT_MAX_ROWS:
+            raise ValueError(f"CSV has more than {AD_IMPORT_MAX_ROWS} rows")
+        fields = {field: (raw.get(column) or '').strip() for field, column in columns.items()}
+        if not any(fields.values()):
+            continue  # blank line
+        error = _validate_row(fields, seen, base_dn)
+        if error:
+            invalid.append((row_number, fields.get('username', ''), error))
+            continue
+        seen[fields['username'].lower()] = row_number
+        rows.append((row_number, fields))
+    return rows, invalid
+
+
+def create_import_job(stream, filename=None, created_by=None):
+    """Parse and validate an upload and record it as a queued job.
+
+    Returns ``(job_id, rows)``; the rows still carry their passwords and
+    are handed to start_import_job() without being written to disk.
+    """
+    rows, invalid = parse_csv(stream, ActiveDirectoryManager().base_dn)
+    job_id = uuid.uuid4().hex
+    db = _connect()
+    try:
+        db.execute(
+            'INSERT INTO import_jobs (id, filename, status, total, invalid, created_by, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (job_id, filename, 'queued', len(rows) + len(invalid), len(invalid),
+             created_by, datetime.now().isoformat())
+        )
+        db.executemany(
+            'INSERT INTO import_job_rows (job_id, row_number, username, status, message) VALUES (?, ?, ?, ?, ?)',
+            [(job_id, row_number, fields['username'], 'pending', None) for row_number, fields in rows] +
+            [(job_id, row_number, username, 'invalid', message) for row_number, username, message in invalid]
+        )
+        db.commit()
+    finally:
+        db.close()
+    return job_id, rows
+
+
+def _record_result(job_id, row_number, success, message):
+    db = _connect()
+    try:
+        db.execute(
+            'UPDATE import_job_rows SET status = ?, message = ? WHERE job_id = ? AND row_number = ?',
+            ('created' if success else 'failed', message, job_id, row_number)
+        )
+        db.execute(
+            'UPDATE import_jobs SET processed = processed + 1, succeeded = succeeded + ?, '
+            'failed = failed + ? WHERE id = ?',
+            (int(success), int(not success), job_id)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _set_job_status(job_id, status, error=None):
+    column = 'started_at' if status == 'running' else 'finished_at'
+    db = _connect()
+    try:
+        db.execute(
+            f'UPDATE import_jobs SET status = ?, error = ?, {column} = ? WHERE id = ?',
+            (status, error, datetime.now().isoformat(), job_id)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_import_job(job_id, rows, workers=None):
+    """Create the accounts of a job with a bounded set of concurrent workers.
+
+    Must run inside an application context. Each worker pins one pooled
+    connection and pulls the next row when it is done with the last.
+    """
+    app = current_app._get_current_object()
+    ad_manager = ActiveDirectoryManager()
+    workers = max(1, min(workers or AD_IMPORT_WORKERS, len(rows) or 1))
+    pending = iter(rows)
+    pending_lock = threading.Lock()
+
+    def work():
+        with app.app_context(), ad_manager.pinned_connection(write=True):
+            while True:
+                with pending_lock:
+                    item = next(pending, None)
+                if item is None:
+                    return
+                row_number, fields = item
+                # create_user() puts the account into whatever container it is given
+                error = _ou_error(fields['ou'], ad_manager.base_dn) if fields.get('ou') else None
+                if error:
+                    _record_result(job_id, row_number, False, error)
+                    continue
+                try:
+                    success, message = ad_manager.create_user(
+                        username=fields['username'],
+                        first_name=fields['first_name'],
+                        last_name=fields['last_name'],
+                        password=fields['password'],
+                        email=fields.get('email') or None,
+                        ou_path=fields.get('ou') or None
+                    )
+                except Exception as e:
+                    success, message = False, str(e)
+                _record_result(job_id, row_number, success, message)
+
+    _set_job_status(job_id, 'running')
+    errors = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(work) for _ in range(workers)]:
+                try:
+                    future.result()
+                except Exception as e:
+                    # Typically the worker could not borrow a connection
+                    errors.append(str(e))
+    finally:
+        ad_manager.disconnect()
+
+    job = get_import_job(job_id)
+    if job['processed'] < len(rows):
+        _set_job_status(job_id, 'failed', errors[0] if errors else 'Not all rows were processed')
+    else:
+        _set_job_status(job_id, 'completed')
+    logger.info("Import job %s finished: %s created, %s failed, %s invalid",
+                job_id, job['succeeded'], job['failed'], job['invalid'])
+
+
+def start_import_job(app, job_id, rows):
+    """Run an import job on a background thread."""
+    def target():
+        with app.app_context():
+            try:
+                run_import_job(job_id, rows)
+            except Exception as e:
+                logger.error("Import job %s failed: %s", job_id, e, exc_info=True)
+                _set_job_status(job_id, 'failed', str(e))
+
+    thread = threading.Thread(target=target, name=f'import-{job_id[:8]}', daemon=True)
+    thread.start()
+    return thread
+
+
+def get_import_job(job_id, rows=None):
+    """Return a job with its progress, or None if unknown.
+
+    ``rows`` may be 'failed' (failed and invalid rows) or 'all' to include
+    per-row outcomes.
+    """
+    db = _connect()
+    try:
+        job = db.execute('SELECT * FROM import_jobs WHERE id = ?', (job_id,)).fetchone()
+        if job is None:
+            return None
+        job = dict(job)
+        job['progress'] = round(100.0 * (job['processed'] + job['invalid']) / job['total'], 1) if job['total'] else 100.0
+        if rows in ('failed', 'all'):
+            query = 'SELECT row_number, username, status, message FROM import_job_rows WHERE job_id = ?'
+            if rows == 'failed':
+                query += " AND status IN ('failed', 'invalid')"
+            job['rows'] = [dict(row) for row in db.execute(query + ' ORDER BY row_number', (job_id,))]
+        return job
+    finally:
+        db.close()
+
+
+def list_import_jobs(limit=20):
+    """Return the most recent jobs, newest first."""
+    db = _connect()
+    try:
+        return [dict(job) for job in db.execute(
+            'SELECT * FROM import_jobs ORDER BY created_at DESC LIMIT ?', (limit,)
+        )]
+    finally:
+        db.close()
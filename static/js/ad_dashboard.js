@@ -275,10 +275,13 @@ function viewGroupMembers(groupName) {
                 if (data.success) {
                     if (data.members && data.members.length > 0) {
                         membersList.innerHTML = '';
-                        data.members.forEach(memberDn => {
+                        data.members.forEach(member => {
                             const memberItem = document.createElement('div');
                             memberItem.className = 'member-item';
-                            const displayName = memberDn.match(/CN=([^,]+)/)?.[1] || memberDn;
+                            // Members come resolved ({dn, name, sAMAccountName}); plain DNs are still accepted
+                            const memberDn = typeof member === 'string' ? member : member.dn;
+                            const displayName = (typeof member === 'string' ? null : member.name) ||
+                                memberDn.match(/CN=([^,]+)/)?.[1] || memberDn;
                             memberItem.innerHTML = `
                                 <span title="${memberDn}">${displayName}</span>
                                 <span title="" data-dn="${memberDn}" data-group="${groupName}"></button>
@@ -351,7 +354,7 @@ function removeGroupMember(dn, groupName, button) {
 }
 
 // Load Users Data with improved error handling
-function loadUsers() {
+function loadUsers(cursor) {
     console.log("Loading users data...");
     const tableBody = document.querySelector('#users-table tbody');
     if (!tableBody) {
@@ -359,12 +362,22 @@ function loadUsers() {
         return;
     }
     
-    const loadingRow = document.createElement('tr');
-    loadingRow.innerHTML = `<td colspan="5" class="loading-message">Loading users data...</td>`;
-    tableBody.innerHTML = '';
-    tableBody.appendChild(loadingRow);
+    // Without a cursor the table is reloaded, with one the next page is appended
+    if (cursor) {
+        setLoadMoreRowMessage(tableBody, 5, 'Loading more users...');
+    } else {
+        const loadingRow = document.createElement('tr');
+        loadingRow.innerHTML = `<td colspan="5" class="loading-message">Loading users data...</td>`;
+        tableBody.innerHTML = '';
+        tableBody.appendChild(loadingRow);
+    }
     
-    fetch('/api/ad/users')
+    let url = '/api/ad/users?limit=100';
+    if (cursor) {
+        url += `&cursor=${encodeURIComponent(cursor)}`;
+    }
+    
+    fetch(url)
         .then(response => {
             console.log("Users API response status:", response.status);
             if (!response.ok) {
@@ -373,8 +386,12 @@ function loadUsers() {
             return response.json();
         })
         .then(data => {
-            console.log(`Received ${data.users ? data.users.length : 0} users from API`);
-            tableBody.innerHTML = '';
+            console.log(`Received ${data.users ? data.users.length : 0} of ${data.total} users from API`);
+            if (cursor) {
+                removeLoadMoreRow(tableBody);
+            } else {
+                tableBody.innerHTML = '';
+            }
             
             if (data.success && data.users && data.users.length > 0) {
                 data.users.forEach(user => {
@@ -403,10 +420,14 @@ function loadUsers() {
                     tableBody.appendChild(row);
                 });
                 
+                if (data.nextCursor) {
+                    appendLoadMoreRow(tableBody, 5, `Load more users (${data.total} total)`, () => loadUsers(data.nextCursor));
+                }
+                
                 // Set up action buttons
                 console.log("Setting up user action buttons...");
                 setupUserActionButtons();
-            } else {
+            } else if (!cursor) {
                 tableBody.innerHTML = `
                     <tr>
                         <td colspan="5" class="text-center">No users found or unable to retrieve user data.</td>
@@ -416,6 +437,10 @@ function loadUsers() {
         })
         .catch(error => {
             console.error('Error loading users:', error);
+            if (cursor) {
+                setLoadMoreRowMessage(tableBody, 5, `Error loading more users: ${error.message}`);
+                return;
+            }
             tableBody.innerHTML = `
                 <tr>
                     <td colspan="5" class="text-center error">Error loading user data: ${error.message}</td>
@@ -424,10 +449,12 @@ function loadUsers() {
         });
 }
 
+
 // Setup user action buttons
 function setupUserActionButtons() {
     // Reset Password buttons
-    document.querySelectorAll('#users-table .action-btn.edit[data-action="reset"]').forEach(button => {
+    document.querySelectorAll('#users-table .action-btn.edit[data-action="reset"]:not([data-bound])').forEach(button => {
+        button.setAttribute('data-bound', 'true');
         button.addEventListener('click', function() {
             const username = this.getAttribute('data-username');
             const resetModal = document.getElementById('reset-password-modal');
@@ -446,7 +473,8 @@ function setupUserActionButtons() {
     });
     
     // Enable/Disable buttons
-    document.querySelectorAll('#users-table .action-btn[data-action="enable"], #users-table .action-btn[data-action="disable"]').forEach(button => {
+    document.querySelectorAll('#users-table .action-btn[data-action="enable"]:not([data-bound]), #users-table .action-btn[data-action="disable"]:not([data-bound])').forEach(button => {
+        button.setAttribute('data-bound', 'true');
         button.addEventListener('click', function() {
             const username = this.getAttribute('data-username');
             const currentStatus = this.getAttribute('data-status');
@@ -481,7 +509,7 @@ function setupUserActionButtons() {
 }
 
 // Load Groups Data with improved error handling
-function loadGroups() {
+function loadGroups(cursor) {
     console.log("Loading groups data...");
     const tableBody = document.querySelector('#groups-table tbody');
     if (!tableBody) {
@@ -489,12 +517,22 @@ function loadGroups() {
         return;
     }
     
-    const loadingRow = document.createElement('tr');
-    loadingRow.innerHTML = `<td colspan="4" class="loading-message">Loading groups data...</td>`;
-    tableBody.innerHTML = '';
-    tableBody.appendChild(loadingRow);
+    // Without a cursor the table is reloaded, with one the next page is appended
+    if (cursor) {
+        setLoadMoreRowMessage(tableBody, 4, 'Loading more groups...');
+    } else {
+        const loadingRow = document.createElement('tr');
+        loadingRow.innerHTML = `<td colspan="4" class="loading-message">Loading groups data...</td>`;
+        tableBody.innerHTML = '';
+        tableBody.appendChild(loadingRow);
+    }
+    
+    let url = '/api/ad/groups?limit=100';
+    if (cursor) {
+        url += `&cursor=${encodeURIComponent(cursor)}`;
+    }
     
-    fetch('/api/ad/groups')
+    fetch(url)
         .then(response => {
             console.log("Groups API response status:", response.status);
             if (!response.ok) {
@@ -503,8 +541,12 @@ function loadGroups() {
             return response.json();
         })
         .then(data => {
-            console.log(`Received ${data.groups ? data.groups.length : 0} groups from API`);
-            tableBody.innerHTML = '';
+            console.log(`Received ${data.groups ? data.groups.length : 0} of ${data.total} groups from API`);
+            if (cursor) {
+                removeLoadMoreRow(tableBody);
+            } else {
+                tableBody.innerHTML = '';
+            }
             
             if (data.success && data.groups && data.groups.length > 0) {
                 data.groups.forEach(group => {
@@ -524,18 +566,18 @@ function loadGroups() {
                         </td>
                     `;
                     
-                    tableBody.appendChild(row);
-                });
-                
-                // Add event listeners to view members buttons
-                console.log("Setting up group view buttons...");
-                document.querySelectorAll('#groups-table .action-btn.view').forEach(button => {
-                    button.addEventListener('click', function() {
+                    row.querySelector('.action-btn.view').addEventListener('click', function() {
                         const groupName = this.getAttribute('data-group');
                         viewGroupMembers(groupName);
                     });
+                    
+                    tableBody.appendChild(row);
                 });
-            } else {
+                
+                if (data.nextCursor) {
+                    appendLoadMoreRow(tableBody, 4, `Load more groups (${data.total} total)`, () => loadGroups(data.nextCursor));
+                }
+            } else if (!cursor) {
                 tableBody.innerHTML = `
                     <tr>
                         <td colspan="4" class="text-center">No groups found or unable to retrieve group data.</td>
@@ -545,6 +587,10 @@ function loadGroups() {
         })
         .catch(error => {
             console.error('Error loading groups:', error);
+            if (cursor) {
+                setLoadMoreRowMessage(tableBody, 4, `Error loading more groups: ${error.message}`);
+                return;
+            }
             tableBody.innerHTML = `
                 <tr>
                     <td colspan="4" class="text-center error">Error loading group data: ${error.message}</td>
@@ -553,6 +599,30 @@ function loadGroups() {
         });
 }
 
+// Add a "load more" row at the end of a paged table
+function appendLoadMoreRow(tableBody, colspan, label, onClick) {
+    const row = document.createElement('tr');
+    row.className = 'load-more-row';
+    row.innerHTML = `<td colspan="${colspan}" class="text-center"><button class="action-btn view">${label}</button></td>`;
+    row.querySelector('button').addEventListener('click', onClick);
+    tableBody.appendChild(row);
+}
+
+function setLoadMoreRowMessage(tableBody, colspan, message) {
+    const row = tableBody.querySelector('.load-more-row');
+    if (row) {
+        row.innerHTML = `<td colspan="${colspan}" class="loading-message">${message}</td>`;
+    }
+}
+
+function removeLoadMoreRow(tableBody) {
+    const row = tableBody.querySelector('.load-more-row');
+    if (row) {
+        row.remove();
+    }
+}
+
+
 // Load Computers Data
 function loadComputers() {
     const tableBody = document.querySelector('#computers-table tbody');
@@ -608,6 +678,28 @@ function loadComputers() {
         });
 }
 
+// Show an error for dashboard sections that failed or timed out on the server
+function markFailedSections(sections) {
+    const elements = {
+        users: ['user-count', 'users-preview'],
+        groups: ['group-count', 'groups-preview'],
+        computers: ['computer-count', 'computers-preview'],
+        domainControllers: ['domain-controller-count', null]
+    };
+    
+    Object.keys(elements).forEach(name => {
+        const section = sections[name];
+        if (!section || section.status === 'ok') {
+            return;
+        }
+        const [countId, previewId] = elements[name];
+        updateElementWithError(countId, 'Error');
+        if (previewId) {
+            updatePreviewTableError(previewId, section.message || 'Failed to load data');
+        }
+    });
+}
+
 // Load Dashboard Data
 function loadDashboardData() {
     console.log("Fetching dashboard data from API...");
@@ -643,6 +735,11 @@ function loadDashboardData() {
             updatePreviewTable('users-preview', data.userDetails || []);
             updatePreviewTable('groups-preview', data.groupDetails || []);
             updatePreviewTable('computers-preview', data.computerDetails || []);
+            
+            // Mark sections the server could not read this time
+            if (data.sections) {
+                markFailedSections(data.sections);
+            }
         })
         .catch(error => {
             console.error('Error fetching dashboard data:', error);
@@ -1076,10 +1173,13 @@ function viewGroupMembers(groupName) {
                 if (data.success) {
                     if (data.members && data.members.length > 0) {
                         membersList.innerHTML = '';
-                        data.members.forEach(memberDn => {
+                        data.members.forEach(member => {
                             const memberItem = document.createElement('div');
                             memberItem.className = 'member-item';
-                            const displayName = memberDn.match(/CN=([^,]+)/)?.[1] || memberDn;
+                            // Members come resolved ({dn, name, sAMAccountName}); plain DNs are still accepted
+                            const memberDn = typeof member === 'string' ? member : member.dn;
+                            const displayName = (typeof member === 'string' ? null : member.name) ||
+                                memberDn.match(/CN=([^,]+)/)?.[1] || memberDn;
                             memberItem.innerHTML = `
                                 <span title="${memberDn}">${displayName}</span>
                                 <span title="" data-dn="${memberDn}" data-group="${groupName}"></button>
@@ -1152,7 +1252,7 @@ function removeGroupMember(dn, groupName, button) {
 }
 
 // Load Users Data with improved error handling
-function loadUsers() {
+function loadUsers(cursor) {
     console.log("Loading users data...");
     const tableBody = document.querySelector('#users-table tbody');
     if (!tableBody) {
@@ -1160,12 +1260,22 @@ function loadUsers() {
         return;
     }
     
-    const loadingRow = document.createElement('tr');
-    loadingRow.innerHTML = `<td colspan="5" class="loading-message">Loading users data...</td>`;
-    tableBody.innerHTML = '';
-    tableBody.appendChild(loadingRow);
+    // Without a cursor the table is reloaded, with one the next page is appended
+    if (cursor) {
+        setLoadMoreRowMessage(tableBody, 5, 'Loading more users...');
+    } else {
+        const loadingRow = document.createElement('tr');
+        loadingRow.innerHTML = `<td colspan="5" class="loading-message">Loading users data...</td>`;
+        tableBody.innerHTML = '';
+        tableBody.appendChild(loadingRow);
+    }
     
-    fetch('/api/ad/users')
+    let url = '/api/ad/users?limit=100';
+    if (cursor) {
+        url += `&cursor=${encodeURIComponent(cursor)}`;
+    }
+    
+    fetch(url)
         .then(response => {
             console.log("Users API response status:", response.status);
             if (!response.ok) {
@@ -1174,8 +1284,12 @@ function loadUsers() {
             return response.json();
         })
         .then(data => {
-            console.log(`Received ${data.users ? data.users.length : 0} users from API`);
-            tableBody.innerHTML = '';
+            console.log(`Received ${data.users ? data.users.length : 0} of ${data.total} users from API`);
+            if (cursor) {
+                removeLoadMoreRow(tableBody);
+            } else {
+                tableBody.innerHTML = '';
+            }
             
             if (data.success && data.users && data.users.length > 0) {
                 data.users.forEach(user => {
@@ -1204,10 +1318,14 @@ function loadUsers() {
                     tableBody.appendChild(row);
                 });
                 
+                if (data.nextCursor) {
+                    appendLoadMoreRow(tableBody, 5, `Load more users (${data.total} total)`, () => loadUsers(data.nextCursor));
+                }
+                
                 // Set up action buttons
                 console.log("Setting up user action buttons...");
                 setupUserActionButtons();
-            } else {
+            } else if (!cursor) {
                 tableBody.innerHTML = `
                     <tr>
                         <td colspan="5" class="text-center">No users found or unable to retrieve user data.</td>
@@ -1217,6 +1335,10 @@ function loadUsers() {
         })
         .catch(error => {
             console.error('Error loading users:', error);
+            if (cursor) {
+                setLoadMoreRowMessage(tableBody, 5, `Error loading more users: ${error.message}`);
+                return;
+            }
             tableBody.innerHTML = `
                 <tr>
                     <td colspan="5" class="text-center error">Error loading user data: ${error.message}</td>
@@ -1225,10 +1347,12 @@ function loadUsers() {
         });
 }
 
+
 // Setup user action buttons
 function setupUserActionButtons() {
     // Reset Password buttons
-    document.querySelectorAll('#users-table .action-btn.edit[data-action="reset"]').forEach(button => {
+    document.querySelectorAll('#users-table .action-btn.edit[data-action="reset"]:not([data-bound])').forEach(button => {
+        button.setAttribute('data-bound', 'true');
         button.addEventListener('click', function() {
             const username = this.getAttribute('data-username');
             const resetModal = document.getElementById('reset-password-modal');
@@ -1247,7 +1371,8 @@ function setupUserActionButtons() {
     });
     
     // Enable/Disable buttons
-    document.querySelectorAll('#users-table .action-btn[data-action="enable"], #users-table .action-btn[data-action="disable"]').forEach(button => {
+    document.querySelectorAll('#users-table .action-btn[data-action="enable"]:not([data-bound]), #users-table .action-btn[data-action="disable"]:not([data-bound])').forEach(button => {
+        button.setAttribute('data-bound', 'true');
         button.addEventListener('click', function() {
             const username = this.getAttribute('data-username');
             const currentStatus = this.getAttribute('data-status');
@@ -1282,7 +1407,7 @@ function setupUserActionButtons() {
 }
 
 // Load Groups Data with improved error handling
-function loadGroups() {
+function loadGroups(cursor) {
     console.log("Loading groups data...");
     const tableBody = document.querySelector('#groups-table tbody');
     if (!tableBody) {
@@ -1290,12 +1415,22 @@ function loadGroups() {
         return;
     }
     
-    const loadingRow = document.createElement('tr');
-    loadingRow.innerHTML = `<td colspan="4" class="loading-message">Loading groups data...</td>`;
-    tableBody.innerHTML = '';
-    tableBody.appendChild(loadingRow);
+    // Without a cursor the table is reloaded, with one the next page is appended
+    if (cursor) {
+        setLoadMoreRowMessage(tableBody, 4, 'Loading more groups...');
+    } else {
+        const loadingRow = document.createElement('tr');
+        loadingRow.innerHTML = `<td colspan="4" class="loading-message">Loading groups data...</td>`;
+        tableBody.innerHTML = '';
+        tableBody.appendChild(loadingRow);
+    }
+    
+    let url = '/api/ad/groups?limit=100';
+    if (cursor) {
+        url += `&cursor=${encodeURIComponent(cursor)}`;
+    }
     
-    fetch('/api/ad/groups')
+    fetch(url)
         .then(response => {
             console.log("Groups API response status:", response.status);
             if (!response.ok) {
@@ -1304,8 +1439,12 @@ function loadGroups() {
             return response.json();
         })
         .then(data => {
-            console.log(`Received ${data.groups ? data.groups.length : 0} groups from API`);
-            tableBody.innerHTML = '';
+            console.log(`Received ${data.groups ? data.groups.length : 0} of ${data.total} groups from API`);
+            if (cursor) {
+                removeLoadMoreRow(tableBody);
+            } else {
+                tableBody.innerHTML = '';
+            }
             
             if (data.success && data.groups && data.groups.length > 0) {
                 data.groups.forEach(group => {
@@ -1325,18 +1464,18 @@ function loadGroups() {
                         </td>
                     `;
                     
-                    tableBody.appendChild(row);
-                });
-                
-                // Add event listeners to view members buttons
-                console.log("Setting up group view buttons...");
-                document.querySelectorAll('#groups-table .action-btn.view').forEach(button => {
-                    button.addEventListener('click', function() {
+                    row.querySelector('.action-btn.view').addEventListener('click', function() {
                         const groupName = this.getAttribute('data-group');
                         viewGroupMembers(groupName);
                     });
+                    
+                    tableBody.appendChild(row);
                 });
-            } else {
+                
+                if (data.nextCursor) {
+                    appendLoadMoreRow(tableBody, 4, `Load more groups (${data.total} total)`, () => loadGroups(data.nextCursor));
+                }
+            } else if (!cursor) {
                 tableBody.innerHTML = `
                     <tr>
                         <td colspan="4" class="text-center">No groups found or unable to retrieve group data.</td>
@@ -1346,6 +1485,10 @@ function loadGroups() {
         })
         .catch(error => {
             console.error('Error loading groups:', error);
+            if (cursor) {
+                setLoadMoreRowMessage(tableBody, 4, `Error loading more groups: ${error.message}`);
+                return;
+            }
             tableBody.innerHTML = `
                 <tr>
                     <td colspan="4" class="text-center error">Error loading group data: ${error.message}</td>
@@ -1354,6 +1497,30 @@ function loadGroups() {
         });
 }
 
+// Add a "load more" row at the end of a paged table
+function appendLoadMoreRow(tableBody, colspan, label, onClick) {
+    const row = document.createElement('tr');
+    row.className = 'load-more-row';
+    row.innerHTML = `<td colspan="${colspan}" class="text-center"><button class="action-btn view">${label}</button></td>`;
+    row.querySelector('button').addEventListener('click', onClick);
+    tableBody.appendChild(row);
+}
+
+function setLoadMoreRowMessage(tableBody, colspan, message) {
+    const row = tableBody.querySelector('.load-more-row');
+    if (row) {
+        row.innerHTML = `<td colspan="${colspan}" class="loading-message">${message}</td>`;
+    }
+}
+
+function removeLoadMoreRow(tableBody) {
+    const row = tableBody.querySelector('.load-more-row');
+    if (row) {
+        row.remove();
+    }
+}
+
+
 // Load Computers Data
 function loadComputers() {
     const tableBody = document.querySelector('#computers-table tbody');
@@ -1409,6 +1576,28 @@ function loadComputers() {
         });
 }
 
+// Show an error for dashboard sections that failed or timed out on the server
+function markFailedSections(sections) {
+    const elements = {
+        users: ['user-count', 'users-preview'],
+        groups: ['group-count', 'groups-preview'],
+        computers: ['computer-count', 'computers-preview'],
+        domainControllers: ['domain-controller-count', null]
+    };
+    
+    Object.keys(elements).forEach(name => {
+        const section = sections[name];
+        if (!section || section.status === 'ok') {
+            return;
+        }
+        const [countId, previewId] = elements[name];
+        updateElementWithError(countId, 'Error');
+        if (previewId) {
+            updatePreviewTableError(previewId, section.message || 'Failed to load data');
+        }
+    });
+}
+
 // Load Dashboard Data
 function loadDashboardData() {
     console.log("Fetching dashboard data from API...");
@@ -1444,6 +1633,11 @@ function loadDashboardData() {
             updatePreviewTable('users-preview', data.userDetails || []);
             updatePreviewTable('groups-preview', data.groupDetails || []);
             updatePreviewTable('computers-preview', data.computerDetails || []);
+            
+            // Mark sections the server could not read this time
+            if (data.sections) {
+                markFailedSections(data.sections);
+            }
         })
         .catch(error => {
             console.error('Error fetching dashboard data:', error);
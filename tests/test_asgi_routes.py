@@ -0,0 +1,130 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from ldap3 import MOCK_SYNC, SIMPLE, Connection
+
+# Keep the files the app writes on import out of the working tree
+STATE_DIR = tempfile.mkdtemp()
+os.environ.setdefault('AD_IMPORT_DATABASE', os.path.join(STATE_DIR, 'import_jobs.db'))
+os.environ.setdefault('AD_LOG_FILE', os.path.join(STATE_DIR, 'app.log'))
+os.environ.setdefault('AD_TRACE_FILE', os.path.join(STATE_DIR, 'traces.jsonl'))
+os.environ.setdefault('AD_PROFILE_DIR', os.path.join(STATE_DIR, 'profiles'))
+
+import ad_async  # noqa: E402
+from ad_asgi import application  # noqa: E402
+from ad_conn import LDAPConnectionPool, dn_cache, register_connection_pool  # noqa: E402
+from app import app  # noqa: E402
+
+HOST = 'dc-asgi.test.local'
+DOMAIN = 'test.local'
+BASE_DN = 'DC=test,DC=local'
+ADMIN = f'CN=Administrator,CN=Users,{BASE_DN}'
+PASSWORD = 'Test-Passw0rd'
+WORKERS = 2
+REQUESTS = 40
+
+
+async def call(path, cookie=None, method='GET'):
+    """Send one request through the ASGI app; returns (status, headers, decoded JSON body)."""
+    headers = [(b'cookie', cookie.encode())] if cookie else []
+    scope = {'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http', 'path': path,
+             'raw_path': path.encode(), 'root_path': '', 'query_string': b'', 'headers': headers,
+             'client': ('127.0.0.1', 5000), 'server': ('testserver', 80)}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    start = messages[0]
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return start['status'], {name.decode(): value.decode() for name, value in start['headers']}, json.loads(body)
+
+
+class AsyncRoutesTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, {'AD_DOMAIN_CONTROLLER': HOST, 'AD_DOMAIN': DOMAIN,
+                                               'AD_USERNAME': ADMIN, 'AD_PASSWORD': PASSWORD})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = LDAPConnectionPool(HOST, ADMIN, PASSWORD, size=WORKERS, use_ssl=False,
+                                       authentication=SIMPLE, client_strategy=MOCK_SYNC)
+        loader = Connection(self.pool.server, user=ADMIN, password=PASSWORD, client_strategy=MOCK_SYNC)
+        loader.strategy.add_entry(ADMIN, {'objectClass': ['top', 'person'], 'cn': 'Administrator',
+                                          'userPassword': PASSWORD})
+        loader.strategy.add_entry(f'CN=Jane Doe,OU=Staff,{BASE_DN}', {
+            'objectClass': ['top', 'person', 'user'], 'objectCategory': 'person', 'cn': 'Jane Doe',
+            'sAMAccountName': 'jdoe', 'userAccountControl': '512'})
+        register_connection_pool(self.pool)
+        dn_cache.clear()
+        self.addCleanup(dn_cache.clear)
+
+        executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='ad-async-test')
+        self.addCleanup(executor.shutdown)
+        patcher = mock.patch.object(ad_async, '_executor', executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        serializer = app.session_interface.get_signing_serializer(app)
+        self.cookie = f"{app.config['SESSION_COOKIE_NAME']}={serializer.dumps({'user_id': 1})}"
+
+    def slow_searches(self, delay=0.02):
+        """Make every search wait on the 'DC'; returns the list of concurrent search counts seen."""
+        seen, active, lock = [], [0], threading.Lock()
+        search = Connection.search
+
+        def slow(conn, *args, **kwargs):
+            with lock:
+                active[0] += 1
+                seen.append(active[0])
+            try:
+                time.sleep(delay)
+                return search(conn, *args, **kwargs)
+            finally:
+                with lock:
+                    active[0] -= 1
+        Connection.search = slow
+        self.addCleanup(setattr, Connection, 'search', search)
+        return seen
+
+    def test_concurrent_lookups_share_a_bounded_number_of_connections(self):
+        seen = self.slow_searches()
+
+        async def lookups():
+            return await asyncio.gather(*(call('/api/ad/user/jdoe', self.cookie) for _ in range(REQUESTS)))
+
+        responses = asyncio.run(lookups())
+
+        self.assertEqual([status for status, _, _ in responses], [200] * REQUESTS)
+        self.assertTrue(all(body['user']['sAMAccountName'] == 'jdoe' for _, _, body in responses))
+        self.assertEqual(responses[0][1]['x-ad-domain-controller'], HOST)
+        self.assertEqual(max(seen), WORKERS)
+        self.assertLessEqual(self.pool.stats()['created'], WORKERS)
+
+    def test_lookup_answers(self):
+        status, _, body = asyncio.run(call('/api/ad/user/nobody', self.cookie))
+        self.assertEqual((status, body['message']), (404, 'User not found'))
+        status, _, body = asyncio.run(call('/api/ad/group/Missing/members', self.cookie))
+        self.assertEqual((status, body['message']), (404, 'Group Missing not found'))
+        status, _, _ = asyncio.run(call('/api/ad/user/jdoe'))
+        self.assertEqual(status, 401)
+
+    def test_other_routes_are_served_by_flask(self):
+        status, _, body = asyncio.run(call('/api/ad/user/jdoe', method='DELETE'))
+        self.assertEqual((status, body['message']), (401, 'Unauthorized'))
+        status, _, body = asyncio.run(call('/api/ad/user/jdoe/effective-groups'))
+        self.assertEqual((status, body['message']), (401, 'Unauthorized'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+
+from flask import Flask
+from ldap3 import MOCK_SYNC, SIMPLE, Connection
+from ldap3.core.exceptions import LDAPSocketReceiveError
+
+from ad_conn import ActiveDirectoryManager, LDAPConnectionPool, dn_cache, register_connection_pool
+
+HOST = 'dc-batch.test.local'
+DOMAIN = 'test.local'
+BASE_DN = 'DC=test,DC=local'
+ADMIN = f'CN=Administrator,CN=Users,{BASE_DN}'
+PASSWORD = 'Test-Passw0rd'
+USERS = 12
+
+
+def user_dn(i):
+    return f'CN=User {i},OU=Staff,{BASE_DN}'
+
+
+class BatchUserOperationsTest(unittest.TestCase):
+    def setUp(self):
+        self.app_context = Flask(__name__).app_context()
+        self.app_context.push()
+        self.addCleanup(self.app_context.pop)
+        self.pool = LDAPConnectionPool(HOST, ADMIN, PASSWORD, size=2, use_ssl=False, authentication=SIMPLE,
+                                       client_strategy=MOCK_SYNC)
+        self.loader = Connection(self.pool.server, user=ADMIN, password=PASSWORD, client_strategy=MOCK_SYNC)
+        self.loader.strategy.add_entry(ADMIN, {'objectClass': ['top', 'person'], 'cn': 'Administrator',
+                                               'userPassword': PASSWORD})
+        for i in range(USERS):
+            self.loader.strategy.add_entry(user_dn(i), {'objectClass': ['top', 'person', 'user'],
+                                                        'cn': f'User {i}', 'sAMAccountName': f'user{i}',
+                                                        'userAccountControl': '512'})
+        self.loader.bind()
+        register_connection_pool(self.pool)
+        dn_cache.clear()
+        self.addCleanup(dn_cache.clear)
+        self.manager = ActiveDirectoryManager(HOST, DOMAIN, ADMIN, PASSWORD)
+        self.addCleanup(self.manager.disconnect)
+
+    def record_calls(self, name, fail_at=None):
+        """Record (connection, first argument) of every Connection.<name>; the call number ``fail_at`` dies."""
+        calls = []
+        original = getattr(Connection, name)
+
+        def recording(conn, *args, **kwargs):
+            calls.append((conn, args[0] if args else None))
+            if len(calls) == fail_at:
+                raise LDAPSocketReceiveError('connection reset by peer')
+            return original(conn, *args, **kwargs)
+        setattr(Connection, name, recording)
+        self.addCleanup(setattr, Connection, name, original)
+        return calls
+
+    def uac(self, i):
+        self.loader.search(user_dn(i), '(objectClass=*)', attributes=['userAccountControl'])
+        return int(self.loader.entries[0].userAccountControl.value)
+
+    def test_users_are_read_with_one_search_per_chunk(self):
+        searches = self.record_calls('search')
+        modifies = self.record_calls('modify')
+        operations = [{'username': f'user{i}', 'action': 'disable'} for i in range(USERS)]
+        operations.append({'username': 'user0', 'action': 'reset_password', 'password': 'N3w-Passw0rd'})
+
+        results = self.manager.batch_user_operations(operations, workers=2)
+
+        self.assertTrue(all(result['success'] for result in results), results)
+        self.assertEqual(len(searches), 2)  # two workers, one chunk each
+        self.assertEqual(len(modifies), len(operations))
+        self.assertTrue(all(self.uac(i) & 2 for i in range(USERS)))
+
+    def test_dead_connection_is_dropped_and_rest_runs_on_a_fresh_one(self):
+        modifies = self.record_calls('modify', fail_at=3)
+        operations = [{'username': f'user{i}', 'action': 'disable'} for i in range(USERS)]
+
+        results = self.manager.batch_user_operations(operations, workers=1)
+
+        failed = [result['index'] for result in results if not result['success']]
+        self.assertEqual(failed, [2])
+        self.assertIn('connection reset', results[2]['message'])
+        dead = modifies[2][0]
+        self.assertTrue(all(conn is not dead for conn, _ in modifies[3:]))
+        self.assertNotIn(dead, [conn for conn, _ in self.pool._idle])
+
+    def test_single_call_lets_connection_errors_reach_the_pool(self):
+        self.record_calls('modify', fail_at=1)
+        with self.assertRaises(LDAPSocketReceiveError):
+            self.manager.disable_user('user1')
+        self.assertEqual(self.pool.stats()['idle'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import socket
+import unittest
+
+from ldap3 import MOCK_SYNC, SIMPLE, Connection
+from ldap3.core.exceptions import LDAPCommunicationError, LDAPMaximumRetriesError
+
+from ad_conn import DomainControllerPool, LDAPConnectionPool
+
+ADMIN = 'CN=Administrator,CN=Users,DC=test,DC=local'
+PASSWORD = 'Test-Passw0rd'
+
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def dead_pool():
+    """A RESTARTABLE pool whose DC refuses connections (so it gives up with LDAPMaximumRetriesError)."""
+    return LDAPConnectionPool('127.0.0.1', ADMIN, PASSWORD, port=closed_port(), use_ssl=False,
+                              authentication=SIMPLE, connect_timeout=1, restart_tries=1, restart_sleep=0)
+
+
+def mock_pool(host):
+    pool = LDAPConnectionPool(host, ADMIN, PASSWORD, use_ssl=False, authentication=SIMPLE,
+                              client_strategy=MOCK_SYNC)
+    loader = Connection(pool.server, user=ADMIN, password=PASSWORD, client_strategy=MOCK_SYNC)
+    loader.strategy.add_entry(ADMIN, {'objectClass': ['top', 'person'], 'cn': 'Administrator',
+                                      'userPassword': PASSWORD})
+    return pool
+
+
+class DomainControllerFailoverTest(unittest.TestCase):
+    def test_dead_dc_first_fails_over_and_backs_off(self):
+        dead, alive = dead_pool(), mock_pool('dc2.test.local')
+        dc_pool = DomainControllerPool([dead, alive])
+        self.assertIs(dc_pool.candidates()[0], dead)
+
+        with dc_pool.connection() as conn:
+            self.assertIs(conn.server, alive.server)
+
+        self.assertFalse(dead.available)
+        self.assertIsNotNone(dead.last_error)
+        self.assertTrue(alive.available)
+        # The dead DC is backing off, so the next borrow goes to the live one first
+        self.assertIs(dc_pool.candidates()[0], alive)
+
+    def test_no_reachable_dc(self):
+        dc_pool = DomainControllerPool([dead_pool(), dead_pool()])
+        with self.assertRaises(LDAPCommunicationError):
+            with dc_pool.connection():
+                pass
+
+    def test_retries_exhausted_in_use_marks_dc_down_and_discards(self):
+        alive = mock_pool('dc1.test.local')
+        dc_pool = DomainControllerPool([alive])
+        with self.assertRaises(LDAPMaximumRetriesError):
+            with dc_pool.connection():
+                raise LDAPMaximumRetriesError('restartable connection strategy failed')
+        self.assertFalse(alive.available)
+        self.assertEqual(alive.stats()['idle'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import threading
+import unittest
+
+from flask import Flask
+from ldap3 import MODIFY_REPLACE, MOCK_SYNC, SIMPLE, Connection
+
+from ad_conn import ActiveDirectoryManager, LDAPConnectionPool, dn_cache, register_connection_pool
+from ad_sync import DirectorySync, SyncInProgress
+
+HOST = 'dc-sync.test.local'
+DOMAIN = 'test.local'
+BASE_DN = 'DC=test,DC=local'
+ADMIN = f'CN=Administrator,CN=Users,{BASE_DN}'
+PASSWORD = 'Test-Passw0rd'
+USER_DN = f'CN=Jane Doe,OU=Staff,{BASE_DN}'
+MOVED_USER_DN = f'CN=Jane Doe,OU=Former,{BASE_DN}'
+STAFF_DN = f'CN=Staff,OU=Groups,{BASE_DN}'
+EVERYONE_DN = f'CN=Everyone,OU=Groups,{BASE_DN}'
+
+
+class DirectorySyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app_context = Flask(__name__).app_context()
+        self.app_context.push()
+        self.addCleanup(self.app_context.pop)
+        pool = LDAPConnectionPool(HOST, ADMIN, PASSWORD, use_ssl=False, authentication=SIMPLE,
+                                  client_strategy=MOCK_SYNC)
+        self.loader = Connection(pool.server, user=ADMIN, password=PASSWORD, client_strategy=MOCK_SYNC)
+        self.loader.strategy.add_entry(ADMIN, {'objectClass': ['top', 'person'], 'cn': 'Administrator',
+                                               'userPassword': PASSWORD})
+        self.loader.strategy.add_entry(USER_DN, {
+            'objectClass': ['top', 'person', 'user'], 'objectCategory': 'person', 'cn': 'Jane Doe',
+            'sAMAccountName': 'jdoe', 'userAccountControl': '512', 'objectGUID': 'guid-jdoe', 'uSNChanged': '1'})
+        self.loader.strategy.add_entry(STAFF_DN, {
+            'objectClass': ['top', 'group'], 'cn': 'Staff', 'member': [USER_DN], 'objectGUID': 'guid-staff',
+            'uSNChanged': '2'})
+        self.loader.strategy.add_entry(EVERYONE_DN, {
+            'objectClass': ['top', 'group'], 'cn': 'Everyone', 'member': [STAFF_DN], 'objectGUID': 'guid-everyone',
+            'uSNChanged': '3'})
+        self.loader.bind()
+        register_connection_pool(pool)
+        dn_cache.clear()
+        self.addCleanup(dn_cache.clear)
+        self.manager = ActiveDirectoryManager(HOST, DOMAIN, ADMIN, PASSWORD)
+        self.addCleanup(self.manager.disconnect)
+
+        # The mock has no rootDSE and no tombstones
+        self.usn = 3
+        self.manager.get_sync_watermark = lambda: {'server': HOST, 'invocationId': HOST, 'usn': self.usn}
+        self.manager.iter_deleted_objects = lambda since_usn, page_size=None: iter(())
+        self.sync = DirectorySync()
+
+    def members(self, cn):
+        groups, _, _ = self.sync.query('groups', filters={'prefix': cn})
+        return groups[0]['members']
+
+
+class InitialSyncTest(DirectorySyncTestCase):
+    def test_first_request_does_not_wait_for_the_initial_sync(self):
+        release = threading.Event()
+        watermark = self.manager.get_sync_watermark
+        self.manager.get_sync_watermark = lambda: release.wait(5) and watermark()
+
+        for _ in range(2):
+            with self.assertRaises(SyncInProgress):
+                self.sync.ensure_fresh(self.manager, 30)
+        self.assertEqual([thread.name for thread in threading.enumerate()].count('directory-sync'), 1)
+
+        release.set()
+        self.sync._initial_sync.join(5)
+        self.sync.ensure_fresh(self.manager, 30)
+        self.assertEqual(self.sync.last_mode, 'full')
+        self.assertEqual(self.members('Staff'), [USER_DN])
+
+
+class MovedObjectSyncTest(DirectorySyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.assertEqual(self.sync.sync(self.manager), 'full')
+
+    def move_user(self):
+        """Move jdoe like a DC does: only the user's uSNChanged moves, member values follow silently."""
+        self.loader.modify_dn(USER_DN, 'CN=Jane Doe', new_superior=f'OU=Former,{BASE_DN}')
+        self.usn += 1
+        self.loader.modify(MOVED_USER_DN, {'uSNChanged': [(MODIFY_REPLACE, [str(self.usn)])]})
+        self.loader.modify(STAFF_DN, {'member': [(MODIFY_REPLACE, [MOVED_USER_DN])]})
+
+    def test_group_members_follow_a_moved_member(self):
+        self.move_user()
+        self.assertEqual(self.sync.sync(self.manager), 'incremental')
+
+        self.assertEqual(self.members('Staff'), [MOVED_USER_DN])
+        self.assertEqual(self.sync.dn_table.lookup(USER_DN), None)
+
+    def test_group_changed_in_the_same_run_shares_the_moved_members_id(self):
+        self.move_user()
+        self.usn += 1
+        self.loader.modify(STAFF_DN, {'description': [(MODIFY_REPLACE, ['Everyone on staff'])],
+                                      'uSNChanged': [(MODIFY_REPLACE, [str(self.usn)])]})
+        self.sync.sync(self.manager)
+
+        self.assertEqual(self.members('Staff'), [MOVED_USER_DN])
+        self.assertEqual(self.sync.dns['guid-jdoe'], self.sync.dn_table.lookup(MOVED_USER_DN))
+        self.assertEqual(len(self.sync.dn_table), 3)
+
+    def test_member_reference_seen_before_the_move_is_merged(self):
+        # The group's change lands in one run, the user's own change in the next
+        self.loader.modify_dn(USER_DN, 'CN=Jane Doe', new_superior=f'OU=Former,{BASE_DN}')
+        self.usn += 1
+        self.loader.modify(STAFF_DN, {'member': [(MODIFY_REPLACE, [MOVED_USER_DN])],
+                                      'uSNChanged': [(MODIFY_REPLACE, [str(self.usn)])]})
+        self.sync.sync(self.manager)
+        self.usn += 1
+        self.loader.modify(MOVED_USER_DN, {'uSNChanged': [(MODIFY_REPLACE, [str(self.usn)])]})
+        self.sync.sync(self.manager)
+
+        staff = self.sync.objects['groups']['guid-staff']
+        self.assertEqual(list(staff.member_ids), [self.sync.dns['guid-jdoe']])
+        self.assertEqual(self.members('Staff'), [MOVED_USER_DN])
+
+    def test_membership_closure_after_moving_a_member(self):
+        self.sync.membership().effective_groups('jdoe')  # cached closure of the old graph
+        self.move_user()
+        self.sync.sync(self.manager)
+        membership = self.sync.membership()
+
+        groups = membership.effective_groups('jdoe')
+        self.assertEqual([(group['name'], group['depth']) for group in groups], [('Everyone', 2), ('Staff', 1)])
+        members = membership.effective_members('Everyone')
+        self.assertEqual([(member['dn'], member['depth']) for member in members],
+                         [(STAFF_DN, 1), (MOVED_USER_DN, 2)])
+
+    def test_membership_closure_after_moving_a_nested_group(self):
+        moved_staff_dn = f'CN=Staff,OU=Teams,{BASE_DN}'
+        self.loader.modify_dn(STAFF_DN, 'CN=Staff', new_superior=f'OU=Teams,{BASE_DN}')
+        self.usn += 1
+        self.loader.modify(moved_staff_dn, {'uSNChanged': [(MODIFY_REPLACE, [str(self.usn)])]})
+        self.loader.modify(EVERYONE_DN, {'member': [(MODIFY_REPLACE, [moved_staff_dn])]})
+        self.sync.sync(self.manager)
+        membership = self.sync.membership()
+
+        self.assertEqual([group['dn'] for group in membership.effective_groups('jdoe')],
+                         [EVERYONE_DN, moved_staff_dn])
+        self.assertEqual([member['dn'] for member in membership.effective_members('Everyone')],
+                         [moved_staff_dn, USER_DN])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+
+from flask import Flask
+from ldap3 import MOCK_SYNC, SIMPLE, Connection
+
+from ad_conn import ActiveDirectoryManager, LDAPConnectionPool, dn_cache, register_connection_pool
+
+HOST = 'dc-cache.test.local'
+DOMAIN = 'test.local'
+BASE_DN = 'DC=test,DC=local'
+ADMIN = f'CN=Administrator,CN=Users,{BASE_DN}'
+PASSWORD = 'Test-Passw0rd'
+USER_DN = f'CN=Jane Doe,OU=Staff,{BASE_DN}'
+GROUP_DN = f'CN=Staff,OU=Groups,{BASE_DN}'
+
+
+class DNCacheWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.app_context = Flask(__name__).app_context()
+        self.app_context.push()
+        pool = LDAPConnectionPool(HOST, ADMIN, PASSWORD, use_ssl=False, authentication=SIMPLE,
+                                  client_strategy=MOCK_SYNC)
+        self.loader = Connection(pool.server, user=ADMIN, password=PASSWORD, client_strategy=MOCK_SYNC)
+        self.loader.strategy.add_entry(ADMIN, {'objectClass': ['top', 'person'], 'cn': 'Administrator',
+                                               'userPassword': PASSWORD})
+        self.loader.strategy.add_entry(USER_DN, {'objectClass': ['top', 'person', 'user'], 'cn': 'Jane Doe',
+                                                 'sAMAccountName': 'jdoe', 'userAccountControl': '512'})
+        self.loader.strategy.add_entry(GROUP_DN, {'objectClass': ['top', 'group'], 'cn': 'Staff'})
+        self.loader.bind()
+        register_connection_pool(pool)
+        dn_cache.clear()
+        self.manager = ActiveDirectoryManager(HOST, DOMAIN, ADMIN, PASSWORD)
+
+    def tearDown(self):
+        self.manager.disconnect()
+        dn_cache.clear()
+        self.app_context.pop()
+
+    def count_searches(self):
+        searches = []
+        search = Connection.search
+
+        def counting(conn, *args, **kwargs):
+            searches.append(args[0] if args else kwargs.get('search_base'))
+            return search(conn, *args, **kwargs)
+        Connection.search = counting
+        self.addCleanup(setattr, Connection, 'search', search)
+        return searches
+
+    def test_cache_hit_writes_straight_to_dn(self):
+        dn_cache.put('user', 'jdoe', USER_DN)
+        dn_cache.put('group', 'Staff', GROUP_DN)
+        searches = self.count_searches()
+
+        self.assertEqual(self.manager.reset_password('jdoe', 'N3w-Passw0rd')[0], True)
+        self.assertEqual(self.manager.add_user_to_group('jdoe', 'Staff')[0], True)
+        self.assertEqual(searches, [])
+
+    def test_stale_dn_is_dropped_and_write_retried(self):
+        dn_cache.put('user', 'jdoe', USER_DN)
+        dn_cache.put('group', 'Staff', GROUP_DN)
+        # Both moved elsewhere, behind the cache's back
+        self.loader.modify_dn(USER_DN, 'CN=Jane Doe', new_superior=f'OU=Former,{BASE_DN}')
+        self.loader.modify_dn(GROUP_DN, 'CN=Staff', new_superior=f'OU=Teams,{BASE_DN}')
+        moved_user_dn = f'CN=Jane Doe,OU=Former,{BASE_DN}'
+        moved_group_dn = f'CN=Staff,OU=Teams,{BASE_DN}'
+
+        success, message = self.manager.reset_password('jdoe', 'N3w-Passw0rd')
+        self.assertTrue(success, message)
+        self.assertEqual(dn_cache.get('user', 'jdoe')[0].lower(), moved_user_dn.lower())
+
+        success, message = self.manager.add_user_to_group('jdoe', 'Staff')
+        self.assertTrue(success, message)
+        self.assertEqual(dn_cache.get('group', 'Staff')[0].lower(), moved_group_dn.lower())
+        self.loader.search(moved_group_dn, '(objectClass=*)', attributes=['member'])
+        self.assertEqual([dn.lower() for dn in self.loader.entries[0].member.values], [moved_user_dn.lower()])
+
+    def test_missing_user_is_reported(self):
+        dn_cache.put('user', 'jdoe', USER_DN)
+        self.loader.delete(USER_DN)
+        self.assertEqual(self.manager.reset_password('jdoe', 'N3w-Passw0rd'), (False, "User jdoe not found"))
+        self.assertIsNone(dn_cache.get('user', 'jdoe'))
+
+    def test_invalidate_dn_drops_every_name_for_it(self):
+        dn_cache.put('user', 'jdoe', USER_DN)
+        dn_cache.put('user', 'jane.doe', USER_DN)
+        dn_cache.put('group', 'Staff', GROUP_DN)
+        dn_cache.invalidate_dn(USER_DN.upper())
+        self.assertIsNone(dn_cache.get('user', 'jdoe'))
+        self.assertIsNone(dn_cache.get('user', 'jane.doe'))
+        self.assertIsNotNone(dn_cache.get('group', 'Staff'))
+
+
+if __name__ == '__main__':
+    unittest.main()
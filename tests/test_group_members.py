@@ -0,0 +1,79 @@
+import unittest
+
+from flask import Flask
+from ldap3 import MOCK_SYNC, SIMPLE, Connection
+from ldap3.strategy.mockBase import MockBaseStrategy
+
+from ad_conn import ActiveDirectoryManager, LDAPConnectionPool, dn_cache, register_connection_pool
+
+HOST = 'dc-members.test.local'
+DOMAIN = 'test.local'
+BASE_DN = 'DC=test,DC=local'
+ADMIN = f'CN=Administrator,CN=Users,{BASE_DN}'
+PASSWORD = 'Test-Passw0rd'
+GROUP_DN = f'CN=Big,OU=Groups,{BASE_DN}'
+MEMBER_DNS = [f'CN=User {i},OU=Staff,{BASE_DN}' for i in range(5)]
+# The DC's MaxValRange, scaled down: the first answer holds 3 values
+RANGE_SIZE = 3
+
+
+def ranged_member_search(execute_search):
+    """Answer reads of GROUP_DN's member attribute like a DC does above MaxValRange."""
+    requests = []
+
+    def search(strategy, request):
+        attributes = [str(attribute).lower() for attribute in request['attributes']]
+        if str(request['base']).lower() != GROUP_DN.lower() or not attributes[0].startswith('member'):
+            return execute_search(strategy, request)
+        requests.append(attributes[0])
+        low = int(attributes[0].split('=', 1)[1].split('-')[0]) if ';range=' in attributes[0] else 0
+        high = low + RANGE_SIZE - 1
+        if high >= len(MEMBER_DNS) - 1:
+            name, values = f'member;range={low}-*', MEMBER_DNS[low:]
+        else:
+            name, values = f'member;range={low}-{high}', MEMBER_DNS[low:high + 1]
+        entry = {'object': GROUP_DN, 'attributes': [{'type': name, 'vals': [dn.encode() for dn in values]}]}
+        return [entry], {'resultCode': 0, 'matchedDN': '', 'diagnosticMessage': '', 'referral': None}
+
+    return search, requests
+
+
+class RangedGroupMembersTest(unittest.TestCase):
+    def setUp(self):
+        self.app_context = Flask(__name__).app_context()
+        self.app_context.push()
+        self.addCleanup(self.app_context.pop)
+        pool = LDAPConnectionPool(HOST, ADMIN, PASSWORD, use_ssl=False, authentication=SIMPLE,
+                                  client_strategy=MOCK_SYNC)
+        loader = Connection(pool.server, user=ADMIN, password=PASSWORD, client_strategy=MOCK_SYNC)
+        loader.strategy.add_entry(ADMIN, {'objectClass': ['top', 'person'], 'cn': 'Administrator',
+                                          'userPassword': PASSWORD})
+        loader.strategy.add_entry(GROUP_DN, {'objectClass': ['top', 'group'], 'cn': 'Big'})
+        for i, dn in enumerate(MEMBER_DNS):
+            loader.strategy.add_entry(dn, {'objectClass': ['top', 'person', 'user'], 'cn': f'User {i}',
+                                           'distinguishedName': dn, 'sAMAccountName': f'user{i}'})
+        register_connection_pool(pool)
+        dn_cache.clear()
+        self.manager = ActiveDirectoryManager(HOST, DOMAIN, ADMIN, PASSWORD)
+        self.addCleanup(self.manager.disconnect)
+
+        execute_search = MockBaseStrategy._execute_search
+        MockBaseStrategy._execute_search, self.requests = ranged_member_search(execute_search)
+        self.addCleanup(setattr, MockBaseStrategy, '_execute_search', execute_search)
+
+    def test_members_beyond_max_val_range(self):
+        pages = list(self.manager.iter_group_members('Big', page_size=2))
+
+        self.assertEqual(self.requests, ['member', f'member;range={RANGE_SIZE}-*'])
+        usernames = [member['sAMAccountName'] for page in pages for member in page]
+        self.assertEqual(sorted(usernames), [f'user{i}' for i in range(len(MEMBER_DNS))])
+
+    def test_connection_options_are_restored(self):
+        list(self.manager.iter_group_members('Big'))
+        with self.manager._connection() as conn:
+            self.assertTrue(conn.auto_range)
+            self.assertTrue(conn.empty_attributes)
+
+
+if __name__ == '__main__':
+    unittest.main()
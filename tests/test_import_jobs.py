@@ -0,0 +1,81 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from flask import Flask
+from ldap3 import MOCK_SYNC, SIMPLE, Connection
+
+import import_jobs
+from ad_conn import ActiveDirectoryManager, LDAPConnectionPool, register_connection_pool
+
+HOST = 'dc-import.test.local'
+DOMAIN = 'test.local'
+BASE_DN = 'DC=test,DC=local'
+ADMIN = f'CN=Administrator,CN=Users,{BASE_DN}'
+PASSWORD = 'Test-Passw0rd'
+HEADER = 'username,first_name,last_name,password,ou\n'
+
+
+def upload(*lines):
+    return io.BytesIO((HEADER + ''.join(line + '\n' for line in lines)).encode())
+
+
+class ImportOUTest(unittest.TestCase):
+    def test_ou_must_be_a_dn_inside_the_base_dn(self):
+        rows, invalid = import_jobs.parse_csv(upload(
+            'inside,In,Side,Passw0rd!,"OU=Staff,DC=test,DC=local"',
+            'default,De,Fault,Passw0rd!,',
+            'outside,Out,Side,Passw0rd!,"OU=Staff,DC=other,DC=local"',
+            'suffix,Suf,Fix,Passw0rd!,"OU=Staff,DC=test,DC=local,DC=evil"',
+            'garbage,Gar,Bage,Passw0rd!,Staff',
+        ), BASE_DN)
+
+        self.assertEqual([fields['username'] for _, fields in rows], ['inside', 'default'])
+        self.assertEqual([(username, message) for _, username, message in invalid], [
+            ('outside', f'OU is outside {BASE_DN}'),
+            ('suffix', f'OU is outside {BASE_DN}'),
+            ('garbage', 'OU is not a valid DN: Staff'),
+        ])
+
+    def test_base_dn_is_matched_case_insensitively(self):
+        rows, invalid = import_jobs.parse_csv(upload('lower,Lo,Wer,Passw0rd!,"ou=Staff,dc=TEST,dc=local"'), BASE_DN)
+        self.assertEqual((len(rows), invalid), (1, []))
+
+
+class RunImportJobTest(unittest.TestCase):
+    def setUp(self):
+        handle, path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        for patcher in (mock.patch.object(import_jobs, 'IMPORT_DATABASE', path),
+                        mock.patch.dict(os.environ, {'AD_DOMAIN_CONTROLLER': HOST, 'AD_DOMAIN': DOMAIN,
+                                                     'AD_USERNAME': ADMIN, 'AD_PASSWORD': PASSWORD})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        import_jobs.init_import_db()
+        app_context = Flask(__name__).app_context()
+        app_context.push()
+        self.addCleanup(app_context.pop)
+        pool = LDAPConnectionPool(HOST, ADMIN, PASSWORD, use_ssl=False, authentication=SIMPLE,
+                                  client_strategy=MOCK_SYNC)
+        Connection(pool.server, user=ADMIN, password=PASSWORD, client_strategy=MOCK_SYNC).strategy.add_entry(
+            ADMIN, {'objectClass': ['top', 'person'], 'cn': 'Administrator', 'userPassword': PASSWORD})
+        register_connection_pool(pool)
+
+    def test_rows_outside_the_base_dn_are_not_created(self):
+        job_id, _ = import_jobs.create_import_job(upload('inside,In,Side,Passw0rd!,'))
+        # Rows reaching the job by another way than parse_csv() are checked again
+        rows = [(2, {'username': 'inside', 'first_name': 'In', 'last_name': 'Side', 'password': 'Passw0rd!',
+                     'ou': 'OU=Staff,DC=other,DC=local'})]
+        with mock.patch.object(ActiveDirectoryManager, 'create_user') as create_user:
+            import_jobs.run_import_job(job_id, rows, workers=1)
+
+        create_user.assert_not_called()
+        job = import_jobs.get_import_job(job_id, rows='all')
+        self.assertEqual((job['failed'], job['rows'][0]['message']), (1, f'OU is outside {BASE_DN}'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from ad_cache import SQLiteCacheBackend
+
+
+class SQLiteCacheBackendTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def last_used(self, key):
+        db = sqlite3.connect(self.path)
+        try:
+            return db.execute('SELECT last_used FROM response_cache WHERE key = ?', (key,)).fetchone()[0]
+        finally:
+            db.close()
+
+    def entry(self, value, ttl=60):
+        now = time.time()
+        return value, now + ttl, now + 2 * ttl
+
+    def test_hits_are_written_in_batches(self):
+        backend = SQLiteCacheBackend(self.path, 10, touch_interval=3600)
+        backend.set('users', 'a', self.entry([1]), 0)
+        stored = self.last_used('a')
+
+        self.assertEqual(backend.get('users', 'a')[0], [1])
+        self.assertEqual(self.last_used('a'), stored)
+
+        # The next write carries the collected recency along
+        backend.set('users', 'b', self.entry([2]), 0)
+        self.assertGreater(self.last_used('a'), stored)
+
+    def test_recency_of_hits_decides_eviction(self):
+        backend = SQLiteCacheBackend(self.path, 2, touch_interval=3600)
+        backend.set('users', 'a', self.entry([1]), 0)
+        backend.set('users', 'b', self.entry([2]), 0)
+        backend.get('users', 'a')
+        backend.set('users', 'c', self.entry([3]), 0)
+
+        self.assertIsNotNone(backend.get('users', 'a'))
+        self.assertIsNone(backend.get('users', 'b'))
+        self.assertIsNotNone(backend.get('users', 'c'))
+
+    def test_expired_entries_are_dropped(self):
+        backend = SQLiteCacheBackend(self.path, 10)
+        backend.set('users', 'old', self.entry([1], ttl=-60), 0)
+        backend.set('users', 'new', self.entry([2]), 0)
+
+        self.assertIsNone(backend.get('users', 'old'))
+        self.assertEqual(len(backend), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()